@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generation import (
+    MODEL_REGISTRY, get_model_spec, load_tokenizer, load_model,
+    BatchGenerationEngine, ContinuousBatchingEngine
+)
+
+
+def prefix_consistent(a, b):
+    """Greedy outputs with different token budgets must agree on their common prefix"""
+    n = min(len(a), len(b))
+    return a[:n] == b[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare static and continuous batching throughput")
+    parser.add_argument('-m', '--model', type=str, required=True, choices=sorted(MODEL_REGISTRY))
+    parser.add_argument('-i', '--input_file', type=str, default='./test_filtered.jsonl')
+    parser.add_argument('-n', '--num_samples', type=int, default=256)
+    parser.add_argument('-b', '--batch_size', type=int, default=None)
+    parser.add_argument('--max_length', type=int, default=1024)
+    parser.add_argument('-o', '--output_file', type=str, default=None,
+                        help='Optional JSON file for the benchmark results')
+    args = parser.parse_args()
+
+    spec = get_model_spec(args.model)
+    with open(args.input_file, 'r') as f_in:
+        texts = [json.loads(line)["input"] for _, line in zip(range(args.num_samples), f_in)]
+
+    tokenizer = load_tokenizer(spec, model_max_length=args.max_length)
+    model = load_model(spec)
+
+    results = {}
+    outputs = {}
+    for name, engine_cls in [("static", BatchGenerationEngine), ("continuous", ContinuousBatchingEngine)]:
+        engine = engine_cls(model, tokenizer, spec, args.batch_size, args.max_length)
+        outputs[name] = dict(engine.generate(texts))
+        stats = engine.stats
+        results[name] = dict(stats, tokens_per_second=stats["generated_tokens"] / stats["elapsed"])
+        print(f"[{name}] {stats['generated_tokens']} tokens in {stats['elapsed']:.1f}s "
+              f"({results[name]['tokens_per_second']:.1f} tokens/s, {stats['forward_steps']} forward steps)")
+
+    results["speedup"] = results["continuous"]["tokens_per_second"] / results["static"]["tokens_per_second"]
+    results["consistent_outputs"] = sum(
+        prefix_consistent(outputs["static"][k], outputs["continuous"][k]) for k in outputs["static"]
+    )
+    results["num_samples"] = len(texts)
+    print(f"Speedup: {results['speedup']:.2f}x, "
+          f"consistent outputs: {results['consistent_outputs']}/{len(texts)}")
+
+    if args.output_file:
+        with open(args.output_file, 'w') as f_out:
+            json.dump(results, f_out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
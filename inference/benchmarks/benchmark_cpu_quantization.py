@@ -0,0 +1,114 @@
+import os
+import sys
+import copy
+import json
+import time
+import argparse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generation import (
+    MODEL_REGISTRY, get_model_spec, load_tokenizer, load_model, BatchGenerationEngine,
+    configure_cpu_threads, quantize_for_cpu, merge_adapter_for_cpu
+)
+from generation.cpu_backend import QUANTIZATION_MODES
+
+
+def common_prefix_ratio(reference, candidate):
+    if not reference and not candidate:
+        return 1.0
+    prefix = 0
+    for a, b in zip(reference, candidate):
+        if a != b:
+            break
+        prefix += 1
+    return prefix / max(len(reference), len(candidate))
+
+
+def run_path(model, tokenizer, spec, texts, batch_size, max_length):
+    # Batch-1 latency: one request at a time, as the verification loop does
+    latency_engine = BatchGenerationEngine(model, tokenizer, spec, batch_size=1, max_length=max_length)
+    latencies = []
+    outputs = [None] * len(texts)
+    for k, text in enumerate(texts):
+        start_time = time.perf_counter()
+        for _, response in latency_engine.generate([text], show_progress=False):
+            outputs[k] = response
+        latencies.append(time.perf_counter() - start_time)
+
+    # Batched throughput over the whole prompt set
+    batch_engine = BatchGenerationEngine(model, tokenizer, spec, batch_size=batch_size, max_length=max_length)
+    for _ in batch_engine.generate(texts, show_progress=False):
+        pass
+    stats = batch_engine.stats
+
+    latencies.sort()
+    return outputs, {
+        "latency_mean": sum(latencies) / len(latencies),
+        "latency_p50": latencies[len(latencies) // 2],
+        "latency_max": latencies[-1],
+        "batched_elapsed": stats["elapsed"],
+        "batched_generated_tokens": stats["generated_tokens"],
+        "batched_tokens_per_second": stats["generated_tokens"] / stats["elapsed"] if stats["elapsed"] else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CPU inference: fp32 vs int8-quantized linear layers")
+    parser.add_argument('-m', '--model', type=str, required=True, choices=sorted(MODEL_REGISTRY))
+    parser.add_argument('-i', '--input_file', type=str, default='./test_filtered.jsonl')
+    parser.add_argument('-n', '--num_samples', type=int, default=16,
+                        help='Number of prompts taken from the head of the input file')
+    parser.add_argument('-q', '--quantization', type=str, default='int8_dynamic',
+                        choices=[mode for mode in QUANTIZATION_MODES if mode])
+    parser.add_argument('-b', '--batch_size', type=int, default=8)
+    parser.add_argument('-t', '--num_threads', type=int, default=None)
+    parser.add_argument('--max_length', type=int, default=1024)
+    parser.add_argument('-o', '--output_file', type=str, default=None,
+                        help='Optional JSON file for the benchmark results')
+    args = parser.parse_args()
+
+    num_threads = configure_cpu_threads(args.num_threads)
+    spec = get_model_spec(args.model)
+    with open(args.input_file, 'r') as f_in:
+        texts = [json.loads(line)["input"] for _, line in zip(range(args.num_samples), f_in)]
+
+    tokenizer = load_tokenizer(spec, model_max_length=args.max_length)
+    fp32_model = merge_adapter_for_cpu(load_model(spec, device="cpu")).float().eval()
+    quantized_model = quantize_for_cpu(copy.deepcopy(fp32_model), args.quantization)
+
+    fp32_outputs, fp32_results = run_path(fp32_model, tokenizer, spec, texts, args.batch_size, args.max_length)
+    quantized_outputs, quantized_results = run_path(
+        quantized_model, tokenizer, spec, texts, args.batch_size, args.max_length
+    )
+
+    prefix_ratios = [common_prefix_ratio(a, b) for a, b in zip(fp32_outputs, quantized_outputs)]
+    results = {
+        "model": args.model,
+        "quantization": args.quantization,
+        "num_threads": num_threads,
+        "num_samples": len(texts),
+        "fp32": fp32_results,
+        args.quantization: quantized_results,
+        "latency_speedup": fp32_results["latency_mean"] / quantized_results["latency_mean"],
+        "throughput_speedup": (quantized_results["batched_tokens_per_second"]
+                               / max(fp32_results["batched_tokens_per_second"], 1e-9)),
+        "exact_match": sum(a == b for a, b in zip(fp32_outputs, quantized_outputs)),
+        "mean_common_prefix_ratio": sum(prefix_ratios) / len(prefix_ratios)
+    }
+
+    for name in ("fp32", args.quantization):
+        r = results[name]
+        print(f"{name}: batch-1 latency mean {r['latency_mean']:.2f}s / p50 {r['latency_p50']:.2f}s, "
+              f"batched {r['batched_tokens_per_second']:.1f} tokens/s")
+    print(f"Latency speedup: {results['latency_speedup']:.2f}x, "
+          f"throughput speedup: {results['throughput_speedup']:.2f}x")
+    print(f"Exact match with fp32: {results['exact_match']}/{len(texts)}, "
+          f"mean common prefix: {results['mean_common_prefix_ratio']:.2%}")
+
+    if args.output_file:
+        with open(args.output_file, 'w') as f_out:
+            json.dump(results, f_out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
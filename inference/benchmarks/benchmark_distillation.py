@@ -0,0 +1,87 @@
+import io
+import os
+import gc
+import sys
+import json
+import tempfile
+import argparse
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generation import MODEL_REGISTRY, get_model_spec, load_tokenizer, load_model
+from steps.code_cleaning_step import CodeCleaningStep
+from steps.code_execution_step import CodeExecutionStep
+from benchmark_cpu_quantization import run_path
+
+
+def executes(response):
+    # Same check as the pipeline: clean the response, run it, and require an exported STL
+    with tempfile.TemporaryDirectory() as output_dir:
+        code = CodeCleaningStep().run(response, "output.stl")
+        return code is not None and CodeExecutionStep(output_dir).run(code, "output.stl") is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Execution rate vs latency of a teacher model and its students")
+    parser.add_argument('--teacher', type=str, default='deepseek-16b', choices=sorted(MODEL_REGISTRY))
+    parser.add_argument('--students', type=str,
+                        default='codegpt-small-distill,gpt2-medium-distill,codegpt-small,gpt2-medium',
+                        help='Comma-separated registry models compared against the teacher '
+                             '(distilled and directly fine-tuned)')
+    parser.add_argument('-i', '--input_file', type=str, default='./test_filtered.jsonl')
+    parser.add_argument('-n', '--num_samples', type=int, default=64,
+                        help='Number of prompts taken from the head of the input file')
+    parser.add_argument('-b', '--batch_size', type=int, default=8)
+    parser.add_argument('--max_length', type=int, default=1024)
+    parser.add_argument('--device', type=str, default='cuda')
+    parser.add_argument('--workers', type=int, default=8, help='Programs executed in parallel')
+    parser.add_argument('-o', '--output_file', type=str, default=None,
+                        help='Optional JSON file for the benchmark results')
+    args = parser.parse_args()
+
+    with open(args.input_file, 'r') as f_in:
+        texts = [json.loads(line)["input"] for _, line in zip(range(args.num_samples), f_in)]
+
+    results = {"teacher": args.teacher, "num_samples": len(texts), "models": {}}
+    names = [args.teacher] + [name for name in args.students.split(',') if name and name != args.teacher]
+    for name in names:
+        spec = get_model_spec(name)
+        if not spec["adapter_path"] and spec["model_path"].startswith(".") and not os.path.isdir(spec["model_path"]):
+            print(f"{name}: {spec['model_path']} not found, skipped (train it with DISTILL = True)")
+            continue
+        tokenizer = load_tokenizer(spec, model_max_length=args.max_length)
+        model = load_model(spec, device=args.device)
+        outputs, timing = run_path(model, tokenizer, spec, texts, args.batch_size, args.max_length)
+        del model
+        gc.collect()
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+
+        with ThreadPoolExecutor(args.workers) as pool, contextlib.redirect_stdout(io.StringIO()):
+            successes = list(pool.map(executes, outputs))
+        results["models"][name] = dict(timing, exec_rate=sum(successes) / len(successes))
+        r = results["models"][name]
+        print(f"{name}: exec rate {r['exec_rate']:.1%}, batch-1 latency mean {r['latency_mean']:.2f}s / "
+              f"p50 {r['latency_p50']:.2f}s, batched {r['batched_tokens_per_second']:.1f} tokens/s")
+
+    teacher = results["models"].get(args.teacher)
+    if teacher:
+        for name, r in results["models"].items():
+            r["latency_speedup_vs_teacher"] = teacher["latency_mean"] / r["latency_mean"]
+            r["exec_rate_vs_teacher"] = r["exec_rate"] / teacher["exec_rate"] if teacher["exec_rate"] else None
+        for name, r in results["models"].items():
+            if name != args.teacher:
+                retained = f"{r['exec_rate_vs_teacher']:.0%}" if r["exec_rate_vs_teacher"] is not None else "n/a"
+                print(f"{name} vs {args.teacher}: {r['latency_speedup_vs_teacher']:.1f}x lower latency, "
+                      f"{retained} of the teacher's exec rate")
+
+    if args.output_file:
+        with open(args.output_file, 'w') as f_out:
+            json.dump(results, f_out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import json
+import time
+import argparse
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generation import (
+    MODEL_REGISTRY, get_model_spec, build_prompt, load_tokenizer, load_model,
+    NgramDrafter, NgramSpeculativeDecoder, build_ngram_index
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="N-gram drafting from the CadQuery training corpus vs plain greedy")
+    parser.add_argument('-m', '--model', type=str, required=True, choices=sorted(MODEL_REGISTRY))
+    parser.add_argument('-t', '--train_file', type=str, default='./data_train.jsonl',
+                        help='Training JSONL whose outputs build the n-gram index')
+    parser.add_argument('-i', '--input_file', type=str, default='./test_filtered.jsonl')
+    parser.add_argument('-n', '--num_samples', type=int, default=64)
+    parser.add_argument('--max_index_samples', type=int, default=20000)
+    parser.add_argument('--num_draft_tokens', type=int, default=8)
+    parser.add_argument('--no_index', action='store_true',
+                        help='Only look up drafts in the current sequence (prompt lookup baseline)')
+    parser.add_argument('--max_length', type=int, default=1024)
+    parser.add_argument('-o', '--output_file', type=str, default=None,
+                        help='Optional JSON file for the benchmark results')
+    args = parser.parse_args()
+
+    spec = get_model_spec(args.model)
+    with open(args.input_file, 'r') as f_in:
+        texts = [json.loads(line)["input"] for _, line in zip(range(args.num_samples), f_in)]
+
+    tokenizer = load_tokenizer(spec, model_max_length=args.max_length)
+    model = load_model(spec)
+
+    index = None
+    if not args.no_index:
+        start_time = time.perf_counter()
+        index = build_ngram_index(args.train_file, tokenizer, args.max_index_samples, cache_dir='./ngram_cache')
+        print(f"N-gram index ready in {time.perf_counter() - start_time:.1f}s ({len(index.tokens)} tokens)")
+    decoder = NgramSpeculativeDecoder(model, NgramDrafter(index), args.num_draft_tokens)
+
+    greedy_time = 0.0
+    identical = 0
+    for text in texts:
+        inputs = tokenizer(build_prompt(spec, text), return_tensors="pt", truncation=True).to(model.device)
+        kwargs = dict(
+            max_new_tokens=max(1, args.max_length - inputs["input_ids"].shape[1]),
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.eos_token_id,
+            do_sample=False
+        )
+        with torch.inference_mode():
+            start_time = time.perf_counter()
+            greedy = model.generate(**inputs, **kwargs)
+            greedy_time += time.perf_counter() - start_time
+        drafted = decoder.generate(**inputs, **kwargs)
+        identical += int(torch.equal(greedy.cpu(), drafted.cpu()))
+
+    results = decoder.report()
+    results["greedy_elapsed"] = greedy_time
+    results["speedup"] = greedy_time / results["elapsed"]
+    results["identical_outputs"] = identical
+    results["num_samples"] = len(texts)
+
+    print(f"Accepted draft tokens per step: {results['accepted_tokens_per_step']:.2f} "
+          f"(acceptance rate {results['acceptance_rate']:.2%})")
+    print(f"Tokens per target forward: {results['tokens_per_target_forward']:.2f}")
+    print(f"Greedy {greedy_time:.1f}s vs n-gram drafting {results['elapsed']:.1f}s: {results['speedup']:.2f}x")
+    print(f"Identical to greedy: {identical}/{len(texts)}")
+
+    if args.output_file:
+        with open(args.output_file, 'w') as f_out:
+            json.dump(results, f_out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
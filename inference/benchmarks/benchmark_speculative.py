@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import argparse
+import torch
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generation import (
+    MODEL_REGISTRY, get_model_spec, build_prompt, load_tokenizer, load_model, SpeculativeDecoder
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speculative decoding with a small drafter vs plain greedy")
+    parser.add_argument('-m', '--model', type=str, required=True, choices=sorted(MODEL_REGISTRY),
+                        help='Target model')
+    parser.add_argument('-d', '--draft_model', type=str, required=True, choices=sorted(MODEL_REGISTRY),
+                        help='Draft model')
+    parser.add_argument('-i', '--input_file', type=str, default='./test_filtered.jsonl')
+    parser.add_argument('-n', '--num_samples', type=int, default=32)
+    parser.add_argument('--num_assistant_tokens', type=int, default=None)
+    parser.add_argument('--max_length', type=int, default=1024)
+    parser.add_argument('-o', '--output_file', type=str, default=None,
+                        help='Optional JSON file for the benchmark results')
+    args = parser.parse_args()
+
+    spec = get_model_spec(args.model)
+    draft_spec = get_model_spec(args.draft_model)
+    with open(args.input_file, 'r') as f_in:
+        texts = [json.loads(line)["input"] for _, line in zip(range(args.num_samples), f_in)]
+
+    tokenizer = load_tokenizer(spec, model_max_length=args.max_length)
+    model = load_model(spec)
+    speculative = SpeculativeDecoder(
+        model, tokenizer, load_model(draft_spec), load_tokenizer(draft_spec), args.num_assistant_tokens
+    )
+
+    greedy_time = 0.0
+    identical = 0
+    for text in texts:
+        inputs = tokenizer(build_prompt(spec, text), return_tensors="pt", truncation=True).to(model.device)
+        kwargs = dict(
+            max_new_tokens=max(1, args.max_length - inputs["input_ids"].shape[1]),
+            eos_token_id=tokenizer.eos_token_id,
+            pad_token_id=tokenizer.eos_token_id,
+            do_sample=False
+        )
+        with torch.inference_mode():
+            start_time = time.perf_counter()
+            greedy = model.generate(**inputs, **kwargs)
+            greedy_time += time.perf_counter() - start_time
+            assisted = speculative.generate(**inputs, **kwargs)
+        identical += int(torch.equal(greedy.cpu(), assisted.cpu()))
+
+    results = speculative.report()
+    results["greedy_elapsed"] = greedy_time
+    results["speedup"] = greedy_time / results["elapsed"]
+    results["identical_outputs"] = identical
+    results["num_samples"] = len(texts)
+
+    print(f"Acceptance rate: {results['acceptance_rate']:.2%} "
+          f"({results['accepted_draft_tokens']}/{results['draft_tokens']} draft tokens, "
+          f"{results['draft_forwards']} draft forwards)")
+    print(f"Tokens per target forward: {results['tokens_per_target_forward']:.2f}")
+    print(f"Greedy {greedy_time:.1f}s vs speculative {results['elapsed']:.1f}s: {results['speedup']:.2f}x")
+    print(f"Identical to greedy: {identical}/{len(texts)}")
+
+    if args.output_file:
+        with open(args.output_file, 'w') as f_out:
+            json.dump(results, f_out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,15 @@
 BASE_MODEL_ID = "deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct"
 PEFT_MODEL_ID = "../train/lora_deepseek16b_best"
 
+# 多适配器：同一个常驻基础模型上按名称注册多个LoRA适配器，每个请求通过 adapter 参数选择，
+# A/B对比多个checkpoint时不需要再加载一份基础模型。None表示只加载 PEFT_MODEL_ID（名称为 "default"）
+# 注册多个适配器时不使用合并缓存，CPU上也不合并、不量化（合并或量化后无法再切换适配器）
+PEFT_ADAPTERS = None  # 例如 {"best": "../train/lora_deepseek16b_best", "step1200": "../train/checkpoint-1200"}
+
+# 合并LoRA后的模型缓存（由 merge_lora.py 生成），存在时InferenceStep直接加载
+MERGED_MODEL_CACHE_DIR = './merged_models'
+MERGED_MODEL_DTYPE = "bfloat16"
+
 # 输出目录
 OUTPUT_DIR = './output'
 
@@ -19,6 +28,31 @@ IMAGE_RESOLUTION = [800, 600]  # 渲染图片分辨率
 # 推理配置
 MAX_NEW_TOKENS = 1024
 DO_SAMPLE = False
+STOP_ON_EXPORT = False  # 设为True时，生成出完整的STL导出语句或结束标记后提前停止
+
+# 投机解码配置：用同一语料上微调的小模型起草token，大模型验证，贪心输出不变
+DRAFT_MODEL_ID = None  # 例如 "ricemonster/gpt2-medium-sft"，None表示不使用
+NUM_ASSISTANT_TOKENS = None  # 每轮起草的token数，None使用transformers的自适应策略
+
+# 推理设备配置：没有GPU的验证机使用CPU量化后端
+INFERENCE_DEVICE = "auto"  # "auto" 有GPU时用cuda否则用cpu，也可以指定 "cuda" / "cpu"
+CPU_QUANTIZATION = "int8_dynamic"  # CPU上线性层的量化方式: "int8_dynamic" / "int8_weight_only" / None
+CPU_NUM_THREADS = None  # CPU推理线程数，None使用全部核心
+INFERENCE_BATCH_SIZE = 8  # InferenceStep.run_batch 的批大小
+
+# 把设计描述中拼写的数字换成数字字面量（"zero point one one four nine" -> "0.1149"），prompt更短、生成预算更多
+# 只用于训练时同样开启了 NORMALIZE_NUMBERS 的模型，现有的微调模型都是在原始描述上训练的
+NORMALIZE_NUMBERS = False
+
+# 常驻推理服务（python inference_server.py 启动）：服务可用时InferenceStep以客户端模式连接，不再加载模型
+INFERENCE_SERVER_URL = None  # None表示总是在本进程加载模型，使用服务时设为服务地址，例如 "http://127.0.0.1:8765"
+INFERENCE_SERVER_PORT = 8765
+INFERENCE_BATCH_WINDOW = 0.05  # 服务端合并并发请求的时间窗口（秒）
+INFERENCE_SERVER_TIMEOUT = 600  # 客户端单次请求超时时间（秒）
+
+# 生成结果缓存：贪心解码下同一模型/适配器/模板/prompt/解码参数的输出固定，命中时不再经过模型
+RESULT_CACHE_PATH = None  # None表示不使用缓存，开启时设为缓存文件路径，例如 './cache/results.sqlite'
+RESULT_CACHE_MAX_MB = 512  # 缓存大小上限，超出后淘汰最久未访问的结果
 
 # 执行配置
 EXECUTION_TIMEOUT = 60  # 代码执行超时时间（秒）
@@ -0,0 +1,47 @@
+# Generation package for batched CadQuery code generation
+from .registry import MODEL_REGISTRY, get_model_spec, build_prompt, extract_response
+from .model_loader import load_tokenizer, load_model, loaded_model_spec
+from .batch_engine import BatchGenerationEngine
+from .continuous_engine import ContinuousBatchingEngine
+from .manifest import RunManifest, parse_shard
+from .merged_cache import find_merged_model, merge_and_materialize, load_merged_model
+from .speculative import SpeculativeDecoder
+from .ngram_drafter import NgramIndex, NgramDrafter, NgramSpeculativeDecoder, build_ngram_index
+from .cpu_backend import configure_cpu_threads, quantize_for_cpu, merge_adapter_for_cpu
+from .server import MicroBatcher, InferenceServer, InferenceClient
+from .result_cache import ResultCache, generation_namespace
+from .number_words import normalize_numbers
+from .jsonl_reader import iter_jsonl, iter_chunks
+
+__all__ = [
+    'MODEL_REGISTRY',
+    'get_model_spec',
+    'build_prompt',
+    'extract_response',
+    'load_tokenizer',
+    'load_model',
+    'loaded_model_spec',
+    'BatchGenerationEngine',
+    'ContinuousBatchingEngine',
+    'RunManifest',
+    'parse_shard',
+    'find_merged_model',
+    'merge_and_materialize',
+    'load_merged_model',
+    'SpeculativeDecoder',
+    'NgramIndex',
+    'NgramDrafter',
+    'NgramSpeculativeDecoder',
+    'build_ngram_index',
+    'configure_cpu_threads',
+    'quantize_for_cpu',
+    'merge_adapter_for_cpu',
+    'MicroBatcher',
+    'InferenceServer',
+    'InferenceClient',
+    'ResultCache',
+    'generation_namespace',
+    'normalize_numbers',
+    'iter_jsonl',
+    'iter_chunks'
+]
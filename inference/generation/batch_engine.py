@@ -0,0 +1,158 @@
+"""
+批量生成引擎
+按prompt的token长度排序后组批，尽量减少padding
+"""
+
+import time
+import torch
+from tqdm import tqdm
+from transformers import StoppingCriteriaList
+
+from .registry import build_prompt, extract_response
+from .stopping import CadStoppingCriteria
+from .model_loader import loaded_model_spec
+from .result_cache import generation_namespace
+
+
+class BatchGenerationEngine:
+    """批量生成引擎类"""
+
+    def __init__(self, model, tokenizer, spec, batch_size=None, max_length=1024, stop_on_export=False,
+                 speculative=None, result_cache=None):
+        """
+        初始化批量生成引擎
+
+        Args:
+            model: 已加载的模型
+            tokenizer: 左侧padding的tokenizer
+            spec: 模型配置
+            batch_size: 批大小，默认使用模型配置中的设置
+            max_length: prompt与生成内容的总长度上限
+            stop_on_export: 生成完整导出语句或结束标记后是否提前停止
+            speculative: 投机解码器（SpeculativeDecoder 或 NgramSpeculativeDecoder）
+            result_cache: 生成结果缓存（ResultCache），命中的prompt不再经过模型
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.spec = spec
+        self.batch_size = batch_size or spec["batch_size"]
+        self.speculative = speculative
+        if speculative is not None and self.batch_size != 1:
+            # 两种投机解码都只支持单条序列
+            print(f"投机解码只支持batch size为1，忽略batch size {self.batch_size}")
+            self.batch_size = 1
+        self.max_length = max_length
+        self.stop_on_export = stop_on_export
+        self.stats = {"generated_tokens": 0, "forward_steps": 0, "elapsed": 0.0, "saved_tokens": 0}
+        # 每个输入下标因提前停止而节省的token数
+        self.saved_tokens = {}
+
+        # 批内padding和组批方式会改变低精度下的贪心输出，批大小参与命名空间；
+        # 投机解码只在batch size为1（不加padding）时与贪心解码一致，不参与命名空间
+        self.result_cache = result_cache
+        self.cache_namespace = generation_namespace(
+            loaded_model_spec(spec, model), engine="static", batch_size=self.batch_size, max_length=max_length,
+            stop_on_export=stop_on_export
+        ) if result_cache is not None else None
+
+    def sort_by_length(self, prompts):
+        """
+        按token长度对prompt排序
+
+        Args:
+            prompts: prompt列表
+
+        Returns:
+            list: 排序后的原始下标
+        """
+        lengths = [
+            len(ids) for ids in self.tokenizer(prompts, truncation=True)["input_ids"]
+        ]
+        return sorted(range(len(prompts)), key=lambda k: lengths[k])
+
+    @torch.inference_mode()
+    def generate_batch(self, prompts):
+        """
+        生成一个批次
+
+        Args:
+            prompts: 已套用模板的prompt列表
+
+        Returns:
+            tuple: (解码后的完整文本列表, 每行因提前停止节省的token数)
+        """
+        inputs = self.tokenizer(
+            prompts, return_tensors="pt", padding=True, truncation=True
+        ).to(self.model.device)
+
+        input_lengths = inputs["input_ids"].shape[1]
+        max_new_tokens = max(1, self.max_length - input_lengths)
+
+        stopping_criteria = StoppingCriteriaList()
+        if self.stop_on_export:
+            stopping_criteria.append(CadStoppingCriteria(self.tokenizer, input_lengths))
+
+        generate = self.speculative.generate if self.speculative is not None else self.model.generate
+        start_time = time.perf_counter()
+        outputs = generate(
+            **inputs,
+            max_new_tokens=max_new_tokens,
+            eos_token_id=self.tokenizer.eos_token_id,
+            pad_token_id=self.tokenizer.eos_token_id,
+            do_sample=False,
+            stopping_criteria=stopping_criteria
+        )
+        self.stats["elapsed"] += time.perf_counter() - start_time
+
+        # 只统计每行第一个eos（含）之前的有效token，之后的都是padding
+        new_tokens = outputs[:, input_lengths:]
+        self.stats["forward_steps"] += new_tokens.shape[1]
+        for row in new_tokens.tolist():
+            if self.tokenizer.eos_token_id in row:
+                row = row[:row.index(self.tokenizer.eos_token_id) + 1]
+            self.stats["generated_tokens"] += len(row)
+
+        saved_tokens = [0] * len(prompts)
+        if self.stop_on_export:
+            saved_tokens = stopping_criteria[0].saved_tokens(max_new_tokens) or saved_tokens
+            self.stats["saved_tokens"] += sum(saved_tokens)
+
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True), saved_tokens
+
+    def generate(self, texts, show_progress=True):
+        """
+        为一组设计描述生成代码，按长度顺序逐条产出结果
+
+        Args:
+            texts: 设计描述列表
+            show_progress: 是否显示进度条
+
+        Yields:
+            tuple: (输入下标, 生成的代码)
+        """
+        prompts = [build_prompt(self.spec, text) for text in texts]
+        todo = list(range(len(prompts)))
+        if self.result_cache is not None:
+            todo = []
+            for k, prompt in enumerate(prompts):
+                response = self.result_cache.get(self.cache_namespace, prompt)
+                if response is None:
+                    todo.append(k)
+                else:
+                    self.saved_tokens[k] = 0
+                    yield k, response
+        order = [todo[j] for j in self.sort_by_length([prompts[k] for k in todo])] if todo else []
+
+        batch_starts = range(0, len(order), self.batch_size)
+        if show_progress:
+            batch_starts = tqdm(batch_starts)
+
+        for start in batch_starts:
+            batch_indices = order[start:start + self.batch_size]
+            decoded_outputs, saved_tokens = self.generate_batch([prompts[k] for k in batch_indices])
+            for k, output, saved in zip(batch_indices, decoded_outputs, saved_tokens):
+                self.saved_tokens[k] = saved
+                response = extract_response(self.spec, output)
+                if self.result_cache is not None:
+                    self.result_cache.put(self.cache_namespace, prompts[k], response)
+                yield k, response
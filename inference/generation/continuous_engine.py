@@ -0,0 +1,273 @@
+"""
+连续批处理生成引擎
+序列生成结束后立即移出批次，空出的位置由新的prompt补上
+"""
+
+import time
+import torch
+import torch.nn.functional as F
+from tqdm import tqdm
+from transformers import DynamicCache
+
+from .registry import build_prompt, extract_response
+from .stopping import CadStopChecker
+from .model_loader import loaded_model_spec
+from .result_cache import generation_namespace
+
+
+def cache_to_tensors(cache):
+    """
+    将模型返回的KV缓存转换为每层 (key, value) 张量列表
+
+    Args:
+        cache: DynamicCache 或旧版元组格式的缓存
+
+    Returns:
+        list: [(key, value), ...]，形状为 [batch, heads, seq, dim]
+    """
+    if hasattr(cache, "layers"):
+        return [(layer.keys, layer.values) for layer in cache.layers]
+    if hasattr(cache, "key_cache"):
+        return list(zip(cache.key_cache, cache.value_cache))
+    return [tuple(layer) for layer in cache]
+
+
+def tensors_to_cache(layers):
+    """
+    将每层 (key, value) 张量列表转换回DynamicCache
+
+    Args:
+        layers: [(key, value), ...]
+
+    Returns:
+        DynamicCache
+    """
+    if hasattr(DynamicCache, "from_legacy_cache"):
+        return DynamicCache.from_legacy_cache(tuple(layers))
+    return DynamicCache(layers)
+
+
+class ContinuousBatchingEngine:
+    """连续批处理生成引擎类（贪心解码）"""
+
+    def __init__(self, model, tokenizer, spec, batch_size=None, max_length=1024, stop_on_export=False,
+                 result_cache=None):
+        """
+        初始化连续批处理引擎
+
+        Args:
+            model: 已加载的模型
+            tokenizer: 左侧padding的tokenizer
+            spec: 模型配置
+            batch_size: 同时解码的序列数，默认使用模型配置中的设置
+            max_length: 单条序列prompt与生成内容的总长度上限
+            stop_on_export: 生成完整导出语句或结束标记后是否提前停止
+            result_cache: 生成结果缓存（ResultCache），命中的prompt不再经过模型
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.spec = spec
+        self.batch_size = batch_size or spec["batch_size"]
+        self.max_length = max_length
+        self.eos_token_id = tokenizer.eos_token_id
+        self.stop_checker = CadStopChecker(tokenizer) if stop_on_export else None
+        self.stats = {"generated_tokens": 0, "forward_steps": 0, "elapsed": 0.0, "saved_tokens": 0}
+        # 每个输入下标因提前停止而节省的token数
+        self.saved_tokens = {}
+
+        self.result_cache = result_cache
+        self.cache_namespace = generation_namespace(
+            loaded_model_spec(spec, model), engine="continuous", batch_size=self.batch_size, max_length=max_length,
+            stop_on_export=stop_on_export
+        ) if result_cache is not None else None
+
+        # 当前批次的状态，每行对应一个正在解码的序列
+        self.cache = None
+        self.attention_mask = None
+        self.next_tokens = None
+        self.slots = []
+
+    def _prefill(self, requests):
+        """
+        对新加入的序列做prefill，得到它们各自的KV缓存和第一个生成token
+
+        Args:
+            requests: [(输入下标, prompt token ids), ...]
+
+        Returns:
+            tuple: (每层KV张量, attention_mask, 下一个token)
+        """
+        device = self.model.device
+        seq_len = max(len(ids) for _, ids in requests)
+        input_ids = torch.full((len(requests), seq_len), self.eos_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(requests), seq_len), dtype=torch.long)
+        for row, (_, ids) in enumerate(requests):
+            input_ids[row, seq_len - len(ids):] = torch.tensor(ids, dtype=torch.long)
+            attention_mask[row, seq_len - len(ids):] = 1
+        input_ids = input_ids.to(device)
+        attention_mask = attention_mask.to(device)
+        position_ids = (attention_mask.cumsum(-1) - 1).clamp(min=0)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True
+        )
+        self.stats["forward_steps"] += 1
+        next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+        return cache_to_tensors(outputs.past_key_values), attention_mask, next_tokens
+
+    def _merge(self, layers, attention_mask, next_tokens):
+        """将新序列的KV缓存左侧对齐后拼接到当前批次"""
+        if self.cache is None:
+            self.cache, self.attention_mask, self.next_tokens = layers, attention_mask, next_tokens
+            return
+
+        new_len = attention_mask.shape[1]
+        cur_len = self.attention_mask.shape[1]
+        total = max(new_len, cur_len)
+
+        def left_pad(t, length, dim):
+            if length == total:
+                return t
+            pad = [0, 0] * (t.dim() - 1 - dim) + [total - length, 0]
+            return F.pad(t, pad)
+
+        self.cache = [
+            (
+                torch.cat([left_pad(k, cur_len, 2), left_pad(nk, new_len, 2)], dim=0),
+                torch.cat([left_pad(v, cur_len, 2), left_pad(nv, new_len, 2)], dim=0),
+            )
+            for (k, v), (nk, nv) in zip(self.cache, layers)
+        ]
+        self.attention_mask = torch.cat(
+            [left_pad(self.attention_mask, cur_len, 1), left_pad(attention_mask, new_len, 1)], dim=0
+        )
+        self.next_tokens = torch.cat([self.next_tokens, next_tokens], dim=0)
+
+    def _evict(self, keep):
+        """移出已结束的序列，并裁掉所有序列都不再需要的左侧padding列"""
+        if not keep:
+            self.cache, self.attention_mask, self.next_tokens = None, None, None
+            return
+
+        index = torch.tensor(keep, device=self.attention_mask.device)
+        attention_mask = self.attention_mask.index_select(0, index)
+        first = int(attention_mask.any(dim=0).nonzero()[0])
+        self.attention_mask = attention_mask[:, first:]
+        self.cache = [
+            (k.index_select(0, index)[:, :, first:], v.index_select(0, index)[:, :, first:])
+            for k, v in self.cache
+        ]
+        self.next_tokens = self.next_tokens.index_select(0, index)
+
+    def _decode_step(self):
+        """所有在批序列前进一个token"""
+        self.attention_mask = F.pad(self.attention_mask, [0, 1], value=1)
+        position_ids = (self.attention_mask.sum(dim=-1, keepdim=True) - 1)
+
+        outputs = self.model(
+            input_ids=self.next_tokens.unsqueeze(-1),
+            attention_mask=self.attention_mask,
+            position_ids=position_ids,
+            past_key_values=tensors_to_cache(self.cache),
+            use_cache=True
+        )
+        self.stats["forward_steps"] += 1
+        self.cache = cache_to_tensors(outputs.past_key_values)
+        self.next_tokens = outputs.logits[:, -1, :].argmax(dim=-1)
+
+    def _collect(self):
+        """
+        记录每个序列新生成的token，返回已结束的序列
+
+        Returns:
+            list: 已结束序列的slot
+        """
+        finished, keep = [], []
+        for row, (slot, token) in enumerate(zip(self.slots, self.next_tokens.tolist())):
+            slot["generated"].append(token)
+            self.stats["generated_tokens"] += 1
+            if token == self.eos_token_id or len(slot["generated"]) >= slot["budget"]:
+                finished.append(slot)
+            elif self.stop_checker is not None and self.stop_checker.should_stop(slot["generated"]):
+                saved = slot["budget"] - len(slot["generated"])
+                self.saved_tokens[slot["index"]] = saved
+                self.stats["saved_tokens"] += saved
+                finished.append(slot)
+            else:
+                keep.append(row)
+
+        if finished:
+            self.slots = [self.slots[row] for row in keep]
+            self._evict(keep)
+        return finished
+
+    def _admit(self, pending):
+        """用等待队列中的prompt填满空闲位置"""
+        free = self.batch_size - len(self.slots)
+        if free <= 0 or not pending:
+            return
+        requests = [pending.pop() for _ in range(min(free, len(pending)))]
+        layers, attention_mask, next_tokens = self._prefill(requests)
+        self._merge(layers, attention_mask, next_tokens)
+        for index, ids in requests:
+            self.slots.append({
+                "index": index,
+                "prompt_ids": ids,
+                "generated": [],
+                "budget": max(1, self.max_length - len(ids)),
+            })
+
+    def _finish(self, slot):
+        """解码单条序列并提取生成代码"""
+        output = self.tokenizer.decode(slot["prompt_ids"] + slot["generated"], skip_special_tokens=True)
+        return slot["index"], extract_response(self.spec, output)
+
+    def generate(self, texts, show_progress=True):
+        """
+        为一组设计描述生成代码，序列结束后立即产出结果
+
+        Args:
+            texts: 设计描述列表
+            show_progress: 是否显示进度条
+
+        Yields:
+            tuple: (输入下标, 生成的代码)
+        """
+        prompts = [build_prompt(self.spec, text) for text in texts]
+        todo = list(range(len(prompts)))
+        if self.result_cache is not None:
+            todo = []
+            for k, prompt in enumerate(prompts):
+                response = self.result_cache.get(self.cache_namespace, prompt)
+                if response is None:
+                    todo.append(k)
+                else:
+                    self.saved_tokens[k] = 0
+                    yield k, response
+        prompt_ids = self.tokenizer([prompts[k] for k in todo], truncation=True)["input_ids"] if todo else []
+        # 等待队列按长度降序存放，pop() 每次取出最短的prompt
+        pending = sorted(zip(todo, prompt_ids), key=lambda item: len(item[1]), reverse=True)
+
+        progress = tqdm(total=len(todo)) if show_progress else None
+        start_time = time.perf_counter()
+
+        self.cache, self.attention_mask, self.next_tokens, self.slots = None, None, None, []
+        with torch.inference_mode():
+            while pending or self.slots:
+                self._admit(pending)
+                for slot in self._collect():
+                    k, response = self._finish(slot)
+                    if self.result_cache is not None:
+                        self.result_cache.put(self.cache_namespace, prompts[k], response)
+                    yield k, response
+                    if progress is not None:
+                        progress.update(1)
+                if self.slots:
+                    self._decode_step()
+
+        self.stats["elapsed"] += time.perf_counter() - start_time
+        if progress is not None:
+            progress.close()
@@ -0,0 +1,75 @@
+"""
+CPU推理后端
+在没有GPU的验证机上运行：固定线程数，对合并后模型的线性层做int8量化
+"""
+
+import os
+import torch
+
+QUANTIZATION_MODES = (None, "int8_dynamic", "int8_weight_only")
+
+
+def configure_cpu_threads(num_threads=None, num_interop_threads=None):
+    """
+    固定PyTorch的线程数，避免与其他进程争抢CPU导致延迟抖动
+
+    Args:
+        num_threads: 算子内并行线程数，默认使用全部CPU核心
+        num_interop_threads: 算子间并行线程数，默认为1
+
+    Returns:
+        int: 实际使用的线程数
+    """
+    num_threads = num_threads or os.cpu_count()
+    torch.set_num_threads(num_threads)
+    try:
+        # 只能在第一次并行计算之前设置
+        torch.set_num_interop_threads(num_interop_threads or 1)
+    except RuntimeError:
+        pass
+    return num_threads
+
+
+def quantize_for_cpu(model, mode="int8_dynamic"):
+    """
+    对模型的线性层做int8量化
+
+    Args:
+        model: fp32模型（LoRA需要先合并）
+        mode: "int8_dynamic" 权重int8、激活按batch动态量化；
+              "int8_weight_only" 只量化权重（需要安装torchao）；None 不量化
+
+    Returns:
+        model: 量化后的模型
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(f"未知量化方式: {mode}，可选: {QUANTIZATION_MODES}")
+    if mode is None:
+        return model
+
+    model = model.float()
+    if mode == "int8_dynamic":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    else:
+        try:
+            from torchao.quantization import quantize_, int8_weight_only
+        except ImportError:
+            raise ImportError("int8_weight_only 量化需要安装 torchao: pip install torchao")
+        quantize_(model, int8_weight_only())
+    model.eval()
+    return model
+
+
+def merge_adapter_for_cpu(model):
+    """
+    LoRA模型在量化前先合并，量化作用在合并后的线性层上
+
+    Args:
+        model: PeftModel 或普通模型
+
+    Returns:
+        model: 合并后的模型
+    """
+    if hasattr(model, "merge_and_unload"):
+        return model.merge_and_unload()
+    return model
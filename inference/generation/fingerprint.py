@@ -0,0 +1,99 @@
+"""
+模型指纹
+为基础模型和LoRA适配器计算稳定的哈希，用作各类缓存的键
+"""
+
+import os
+import json
+import hashlib
+
+# 适配器目录中参与哈希的文件
+ADAPTER_FILES = ("adapter_config.json", "adapter_model.safetensors", "adapter_model.bin")
+
+
+def _hash_file(hasher, path, chunk_size=1 << 20):
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+
+
+def resolve_local_path(path_or_id):
+    """
+    将本地路径或HuggingFace仓库ID解析为本地目录
+
+    Args:
+        path_or_id: 本地目录或仓库ID
+
+    Returns:
+        str: 本地目录
+    """
+    if os.path.isdir(path_or_id):
+        return path_or_id
+    from huggingface_hub import snapshot_download
+    return snapshot_download(path_or_id, allow_patterns=list(ADAPTER_FILES))
+
+
+def model_fingerprint(model_id):
+    """
+    基础模型指纹：本地目录使用config.json内容和权重文件大小，
+    仓库ID使用本地缓存中的commit哈希，不读取几十GB的权重内容
+
+    Args:
+        model_id: 本地目录或仓库ID
+
+    Returns:
+        str: 十六进制哈希
+    """
+    hasher = hashlib.sha256(model_id.encode("utf-8"))
+    if os.path.isdir(model_id):
+        config_path = os.path.join(model_id, "config.json")
+        if os.path.exists(config_path):
+            _hash_file(hasher, config_path)
+        for name in sorted(os.listdir(model_id)):
+            if name.endswith((".safetensors", ".bin")):
+                size = os.path.getsize(os.path.join(model_id, name))
+                hasher.update(f"{name}:{size}".encode("utf-8"))
+    else:
+        try:
+            from huggingface_hub import try_to_load_from_cache
+            config_path = try_to_load_from_cache(model_id, "config.json")
+        except ImportError:
+            config_path = None
+        if isinstance(config_path, str):
+            # .../snapshots/<commit>/config.json
+            hasher.update(os.path.basename(os.path.dirname(config_path)).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+def adapter_fingerprint(adapter_path):
+    """
+    LoRA适配器指纹：哈希适配器配置和权重的内容
+
+    Args:
+        adapter_path: 适配器本地目录或仓库ID
+
+    Returns:
+        str: 十六进制哈希
+    """
+    local_path = resolve_local_path(adapter_path)
+    hasher = hashlib.sha256()
+    for name in ADAPTER_FILES:
+        path = os.path.join(local_path, name)
+        if os.path.exists(path):
+            hasher.update(name.encode("utf-8"))
+            _hash_file(hasher, path)
+    return hasher.hexdigest()
+
+
+def combined_key(**parts):
+    """
+    将多个指纹和参数组合成一个缓存键
+
+    Args:
+        **parts: 参与计算的各项
+
+    Returns:
+        str: 十六进制哈希
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
@@ -0,0 +1,43 @@
+"""
+JSONL流式读取
+逐行读取输入文件并按块交给生成引擎，内存占用与数据集大小无关
+"""
+
+import json
+from itertools import islice
+
+
+def iter_jsonl(path, limit=None):
+    """
+    逐行读取JSONL文件
+
+    Args:
+        path: JSONL文件路径
+        limit: 只读取前limit行，None表示全部
+
+    Yields:
+        tuple: (行号, 解析后的记录)，行号从0开始，空行跳过
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for index, line in enumerate(islice(f, limit)):
+            if line.strip():
+                yield index, json.loads(line)
+
+
+def iter_chunks(items, chunk_size):
+    """
+    把可迭代对象切成固定大小的块
+
+    Args:
+        items: 任意可迭代对象
+        chunk_size: 每块的元素数
+
+    Yields:
+        list: 一块元素，最后一块可能不足chunk_size
+    """
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
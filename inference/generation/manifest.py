@@ -0,0 +1,113 @@
+"""
+生成任务清单
+记录已完成的样本下标，支持断点续跑和按分片切分数据集
+"""
+
+import os
+import glob
+import json
+
+
+def parse_shard(value):
+    """
+    解析形如 "k/N" 的分片参数
+
+    Args:
+        value: 分片字符串，k从0开始
+
+    Returns:
+        tuple: (k, N)
+    """
+    try:
+        shard_index, num_shards = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(f"分片格式应为 k/N，实际为: {value}")
+    if num_shards < 1 or not 0 <= shard_index < num_shards:
+        raise ValueError(f"分片编号越界: {value}")
+    return shard_index, num_shards
+
+
+def write_atomic(path, text):
+    """先写临时文件再重命名，保证不会留下写了一半的文件"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class RunManifest:
+    """生成任务清单类"""
+
+    def __init__(self, output_dir, model_name, shard_index=0, num_shards=1):
+        """
+        初始化任务清单
+
+        Args:
+            output_dir: 输出目录，清单文件保存在该目录下
+            model_name: 模型名称，只有同一模型的记录才视为已完成
+            shard_index: 分片编号
+            num_shards: 分片总数
+        """
+        self.output_dir = output_dir
+        self.model_name = model_name
+        # 每个分片写自己的清单文件，多进程/多节点共享目录时不会互相覆盖
+        self.path = os.path.join(output_dir, f"manifest.shard{shard_index}-of-{num_shards}.jsonl")
+        self.completed = self._load()
+        self._terminate_partial_line()
+
+    def _terminate_partial_line(self):
+        """崩溃留下的半行记录补上换行，避免新记录接在它后面"""
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return
+        with open(self.path, "rb+") as f:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+
+    def _load(self):
+        """
+        读取目录下所有分片的清单，重新分片后已完成的样本同样会被跳过
+
+        Returns:
+            set: 已完成的样本下标
+        """
+        completed = set()
+        for path in glob.glob(os.path.join(self.output_dir, "manifest.shard*.jsonl")):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 进程崩溃时最后一行可能没写完
+                        continue
+                    if record.get("model") != self.model_name:
+                        continue
+                    if os.path.exists(os.path.join(self.output_dir, record["file"])):
+                        completed.add(record["index"])
+        return completed
+
+    def is_done(self, index):
+        """判断样本是否已经完成"""
+        return index in self.completed
+
+    def record(self, index, response, extra=None):
+        """
+        保存生成结果并记录到清单：先原子写入输出文件，再追加清单记录
+
+        Args:
+            index: 样本下标
+            response: 生成的代码
+            extra: 需要一并记录的附加信息（如提前停止节省的token数）
+        """
+        filename = f"{index}.txt"
+        write_atomic(os.path.join(self.output_dir, filename), response)
+
+        record = {"index": index, "file": filename, "model": self.model_name}
+        record.update(extra or {})
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.completed.add(index)
@@ -0,0 +1,131 @@
+"""
+合并LoRA模型缓存
+将LoRA适配器一次性合并进基础模型权重，以目标精度保存为可mmap加载的safetensors
+"""
+
+import os
+import json
+import time
+import shutil
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from .fingerprint import model_fingerprint, adapter_fingerprint, combined_key
+
+
+def merged_model_dir(cache_dir, base_model_id, adapter_path, dtype):
+    """
+    计算合并模型在缓存中的目录，目录名由基础模型、适配器和精度的哈希决定
+
+    Args:
+        cache_dir: 缓存根目录
+        base_model_id: 基础模型路径
+        adapter_path: LoRA适配器路径
+        dtype: 目标精度名称，如 "bfloat16"
+
+    Returns:
+        str: 合并模型目录
+    """
+    key = combined_key(
+        base=model_fingerprint(base_model_id),
+        adapter=adapter_fingerprint(adapter_path),
+        dtype=dtype
+    )
+    return os.path.join(cache_dir, key[:16])
+
+
+def find_merged_model(cache_dir, base_model_id, adapter_path, dtype):
+    """
+    查找已合并的模型
+
+    Returns:
+        str: 合并模型目录，不存在时返回None
+    """
+    if not cache_dir or not os.path.isdir(cache_dir):
+        return None
+    try:
+        path = merged_model_dir(cache_dir, base_model_id, adapter_path, dtype)
+    except Exception as e:
+        print(f"计算合并模型缓存键失败: {e}")
+        return None
+    # merge_info.json 最后写入，存在即说明合并完整
+    if os.path.exists(os.path.join(path, "merge_info.json")):
+        return path
+    return None
+
+
+def merge_and_materialize(cache_dir, base_model_id, adapter_path, dtype="bfloat16", overwrite=False):
+    """
+    合并LoRA适配器并保存到缓存
+
+    Args:
+        cache_dir: 缓存根目录
+        base_model_id: 基础模型路径
+        adapter_path: LoRA适配器路径
+        dtype: 目标精度名称
+        overwrite: 已存在时是否重新合并
+
+    Returns:
+        str: 合并模型目录
+    """
+    from peft import PeftModel
+
+    target_dir = merged_model_dir(cache_dir, base_model_id, adapter_path, dtype)
+    if os.path.exists(os.path.join(target_dir, "merge_info.json")) and not overwrite:
+        print(f"合并模型已存在: {target_dir}")
+        return target_dir
+
+    start_time = time.perf_counter()
+    print(f"加载基础模型: {base_model_id} ({dtype})")
+    base_model = AutoModelForCausalLM.from_pretrained(
+        base_model_id,
+        trust_remote_code=True,
+        torch_dtype=getattr(torch, dtype),
+        low_cpu_mem_usage=True
+    )
+    print(f"合并LoRA适配器: {adapter_path}")
+    model = PeftModel.from_pretrained(base_model, adapter_path).merge_and_unload()
+    tokenizer = AutoTokenizer.from_pretrained(base_model_id, trust_remote_code=True)
+
+    # 先写到临时目录，完成后再整体重命名
+    tmp_dir = f"{target_dir}.tmp.{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    model.save_pretrained(tmp_dir, safe_serialization=True)
+    tokenizer.save_pretrained(tmp_dir)
+    with open(os.path.join(tmp_dir, "merge_info.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "base_model_id": base_model_id,
+            "adapter_path": adapter_path,
+            "dtype": dtype,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }, f, indent=2, ensure_ascii=False)
+
+    shutil.rmtree(target_dir, ignore_errors=True)
+    os.makedirs(cache_dir, exist_ok=True)
+    os.replace(tmp_dir, target_dir)
+    print(f"合并完成，用时 {time.perf_counter() - start_time:.1f}s: {target_dir}")
+    return target_dir
+
+
+def load_merged_model(path, device_map="auto"):
+    """
+    加载合并后的模型，safetensors权重通过mmap读取
+
+    Args:
+        path: 合并模型目录
+        device_map: 设备映射
+
+    Returns:
+        tuple: (tokenizer, model)
+    """
+    with open(os.path.join(path, "merge_info.json"), "r", encoding="utf-8") as f:
+        dtype = json.load(f)["dtype"]
+    tokenizer = AutoTokenizer.from_pretrained(path, trust_remote_code=True)
+    model = AutoModelForCausalLM.from_pretrained(
+        path,
+        trust_remote_code=True,
+        torch_dtype=getattr(torch, dtype),
+        device_map=device_map
+    )
+    model.eval()
+    return tokenizer, model
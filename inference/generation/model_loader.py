@@ -0,0 +1,88 @@
+"""
+模型加载
+按注册表配置加载tokenizer和模型（含LoRA适配器）
+"""
+
+import torch
+from transformers import AutoTokenizer, AutoModelForCausalLM
+
+from .merged_cache import find_merged_model, load_merged_model
+
+
+def load_tokenizer(spec, model_max_length=1024):
+    """
+    加载tokenizer，与训练时保持一致：左侧padding，pad_token使用eos_token
+
+    Args:
+        spec: 模型配置
+        model_max_length: 最大序列长度
+
+    Returns:
+        tokenizer
+    """
+    tokenizer = AutoTokenizer.from_pretrained(
+        spec["model_path"],
+        trust_remote_code=True,
+        use_fast=False,
+        model_max_length=model_max_length
+    )
+    tokenizer.pad_token = tokenizer.eos_token
+    tokenizer.padding_side = "left"
+    return tokenizer
+
+
+def load_model(spec, device="cuda", merged_cache_dir=None, merged_dtype="bfloat16"):
+    """
+    加载模型，LoRA模型优先使用已合并的缓存，否则挂载适配器
+
+    Args:
+        spec: 模型配置
+        device: 推理设备
+        merged_cache_dir: 合并模型缓存目录（由 merge_lora.py 生成）
+        merged_dtype: 合并模型的精度
+
+    Returns:
+        model: eval模式的模型
+    """
+    torch_dtype = getattr(torch, spec["torch_dtype"]) if spec["torch_dtype"] else None
+
+    if spec["adapter_path"] and merged_cache_dir:
+        merged_path = find_merged_model(merged_cache_dir, spec["model_path"], spec["adapter_path"], merged_dtype)
+        if merged_path:
+            print(f"加载已合并的模型: {merged_path}")
+            _, model = load_merged_model(merged_path)
+            return model
+
+    if spec["adapter_path"]:
+        from peft import PeftModel
+
+        base_model = AutoModelForCausalLM.from_pretrained(
+            spec["model_path"],
+            trust_remote_code=True,
+            torch_dtype=torch_dtype
+        )
+        model = PeftModel.from_pretrained(base_model, spec["adapter_path"]).to(device)
+    else:
+        model = AutoModelForCausalLM.from_pretrained(
+            spec["model_path"],
+            trust_remote_code=True,
+            torch_dtype=torch_dtype,
+            device_map="auto"
+        )
+    model.eval()
+    return model
+
+
+def loaded_model_spec(spec, model):
+    """
+    补充模型实际加载的状态：load_model 可能换成合并缓存中的模型，精度也可能与注册表中的不同
+
+    Args:
+        spec: 模型配置
+        model: 已加载的模型
+
+    Returns:
+        dict: 模型配置，torch_dtype 为实际精度，merged 表示LoRA是否已合并进权重
+    """
+    merged = bool(spec.get("adapter_path")) and not hasattr(model, "peft_config")
+    return dict(spec, torch_dtype=str(model.dtype).replace("torch.", ""), merged=merged)
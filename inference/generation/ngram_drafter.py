@@ -0,0 +1,279 @@
+"""
+N-gram起草
+从训练集的CadQuery代码建立n-gram索引，不需要起草模型即可提出多token草稿，
+由目标模型一次前向验证
+"""
+
+import os
+import json
+import time
+import pickle
+from array import array
+import torch
+
+from .fingerprint import combined_key
+
+
+class NgramIndex:
+    """训练代码的n-gram索引：n-gram -> 在拼接后的token数组中第一次出现的位置"""
+
+    def __init__(self, min_ngram=2, max_ngram=4):
+        """
+        初始化索引
+
+        Args:
+            min_ngram: 最短匹配长度
+            max_ngram: 最长匹配长度
+        """
+        self.min_ngram = min_ngram
+        self.max_ngram = max_ngram
+        self.tokens = array("l")
+        self.tables = {n: {} for n in range(min_ngram, max_ngram + 1)}
+
+    def add(self, token_ids, separator):
+        """
+        加入一段代码的token
+
+        Args:
+            token_ids: token id列表
+            separator: 段落之间的分隔token（eos），避免草稿跨越两段代码
+        """
+        start = len(self.tokens)
+        self.tokens.extend(token_ids)
+        self.tokens.append(separator)
+        for n, table in self.tables.items():
+            for i in range(start, len(self.tokens) - n):
+                key = tuple(self.tokens[i:i + n])
+                if key not in table:
+                    table[key] = i + n
+
+    def lookup(self, context, num_tokens):
+        """
+        用上下文末尾最长的n-gram查找后续token
+
+        Args:
+            context: 当前token序列
+            num_tokens: 草稿长度
+
+        Returns:
+            list: 草稿token，找不到时为空
+        """
+        for n in range(self.max_ngram, self.min_ngram - 1, -1):
+            if len(context) < n:
+                continue
+            position = self.tables[n].get(tuple(context[-n:]))
+            if position is not None:
+                return list(self.tokens[position:position + num_tokens])
+        return []
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(path):
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def build_ngram_index(train_file, tokenizer, max_samples=20000, min_ngram=2, max_ngram=4, cache_dir=None):
+    """
+    从训练集的output字段建立n-gram索引，可缓存到磁盘
+
+    Args:
+        train_file: 训练集JSONL（如 data_train.jsonl）
+        tokenizer: 目标模型的tokenizer
+        max_samples: 最多使用的样本数，限制索引的内存占用
+        min_ngram: 最短匹配长度
+        max_ngram: 最长匹配长度
+        cache_dir: 索引缓存目录，None表示不缓存
+
+    Returns:
+        NgramIndex
+    """
+    cache_path = None
+    if cache_dir:
+        key = combined_key(
+            train_file=os.path.abspath(train_file),
+            mtime=os.path.getmtime(train_file),
+            tokenizer=tokenizer.name_or_path,
+            vocab_size=len(tokenizer),
+            max_samples=max_samples,
+            ngram=[min_ngram, max_ngram]
+        )
+        cache_path = os.path.join(cache_dir, f"ngram_index_{key[:16]}.pkl")
+        if os.path.exists(cache_path):
+            return NgramIndex.load(cache_path)
+
+    index = NgramIndex(min_ngram, max_ngram)
+    outputs = []
+    with open(train_file, "r", encoding="utf-8") as f:
+        for line in f:
+            if max_samples is not None and len(outputs) >= max_samples:
+                break
+            outputs.append(json.loads(line)["output"])
+    for start in range(0, len(outputs), 256):
+        batch = tokenizer(outputs[start:start + 256], add_special_tokens=False)["input_ids"]
+        for ids in batch:
+            index.add(ids, tokenizer.eos_token_id)
+
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        index.save(cache_path)
+    return index
+
+
+class NgramDrafter:
+    """草稿来源：先在当前序列中查找（变量名、重复的变换块），再查训练集索引"""
+
+    def __init__(self, index=None, min_ngram=2, max_ngram=4):
+        """
+        初始化起草器
+
+        Args:
+            index: NgramIndex，None时只在当前序列中查找
+            min_ngram: 最短匹配长度
+            max_ngram: 最长匹配长度
+        """
+        self.index = index
+        self.min_ngram = min_ngram
+        self.max_ngram = max_ngram
+
+    def _self_lookup(self, context, n, num_tokens):
+        pattern = context[-n:]
+        # 从后往前找最近一次出现（不含末尾本身）
+        for i in range(len(context) - n - 1, -1, -1):
+            if context[i:i + n] == pattern:
+                return context[i + n:i + n + num_tokens]
+        return []
+
+    def propose(self, context, num_tokens):
+        """
+        提出草稿
+
+        Args:
+            context: 当前token序列（prompt + 已生成）
+            num_tokens: 草稿长度
+
+        Returns:
+            list: 草稿token
+        """
+        if num_tokens <= 0:
+            return []
+        for n in range(self.max_ngram, self.min_ngram - 1, -1):
+            if len(context) <= n:
+                continue
+            draft = self._self_lookup(context, n, num_tokens)
+            if draft:
+                return draft
+        if self.index is not None:
+            return self.index.lookup(context, num_tokens)
+        return []
+
+
+class NgramSpeculativeDecoder:
+    """N-gram草稿的贪心验证解码，接口与 SpeculativeDecoder.generate 一致（batch size为1）"""
+
+    def __init__(self, model, drafter, num_draft_tokens=8):
+        """
+        初始化解码器
+
+        Args:
+            model: 目标模型
+            drafter: NgramDrafter
+            num_draft_tokens: 每步最多验证的草稿token数
+        """
+        self.model = model
+        self.drafter = drafter
+        self.num_draft_tokens = num_draft_tokens
+        self.stats = {
+            "generated_tokens": 0,
+            "target_forwards": 0,
+            "draft_tokens": 0,
+            "accepted_draft_tokens": 0,
+            "elapsed": 0.0,
+        }
+
+    @staticmethod
+    def _crop(cache, length):
+        if hasattr(cache, "crop"):
+            cache.crop(length)
+            return cache
+        return tuple((k[:, :, :length], v[:, :, :length]) for k, v in cache)
+
+    @torch.inference_mode()
+    def generate(self, input_ids, max_new_tokens, eos_token_id, stopping_criteria=None, **kwargs):
+        """
+        贪心解码：每步把上一个token和草稿一起送入模型，接受与模型argmax一致的最长前缀
+
+        Args:
+            input_ids: 输入token，形状为 [1, seq]
+            max_new_tokens: 最多生成的token数
+            eos_token_id: 结束token
+            stopping_criteria: 额外的停止条件
+            **kwargs: 与 model.generate 兼容的其他参数（忽略）
+
+        Returns:
+            torch.Tensor: prompt与生成token，形状为 [1, seq + new]
+        """
+        if input_ids.shape[0] != 1:
+            raise ValueError("N-gram起草只支持batch size为1")
+
+        start_time = time.perf_counter()
+        prompt = input_ids[0].tolist()
+        outputs = self.model(input_ids=input_ids, use_cache=True)
+        self.stats["target_forwards"] += 1
+        cache = outputs.past_key_values
+        generated = [int(outputs.logits[0, -1].argmax())]
+
+        def finished():
+            if generated[-1] == eos_token_id or len(generated) >= max_new_tokens:
+                return True
+            if stopping_criteria:
+                ids = torch.tensor([prompt + generated], device=input_ids.device)
+                return bool(stopping_criteria(ids, None).all())
+            return False
+
+        while not finished():
+            # 缓存中已有 prompt + generated[:-1]，最后一个token还没有送入模型
+            num_tokens = min(self.num_draft_tokens, max_new_tokens - len(generated) - 1)
+            draft = self.drafter.propose(prompt + generated, num_tokens)
+            candidate = torch.tensor([[generated[-1]] + draft], device=input_ids.device)
+            outputs = self.model(input_ids=candidate, past_key_values=cache, use_cache=True)
+            self.stats["target_forwards"] += 1
+            predictions = outputs.logits[0].argmax(dim=-1).tolist()
+
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == predictions[accepted]:
+                accepted += 1
+            self.stats["draft_tokens"] += len(draft)
+            self.stats["accepted_draft_tokens"] += accepted
+
+            # 只保留被接受部分的缓存
+            cache = self._crop(outputs.past_key_values, len(prompt) + len(generated) + accepted)
+            for token in draft[:accepted] + [predictions[accepted]]:
+                generated.append(token)
+                if finished():
+                    break
+
+        self.stats["generated_tokens"] += len(generated)
+        self.stats["elapsed"] += time.perf_counter() - start_time
+        return torch.tensor([prompt + generated], device=input_ids.device)
+
+    def report(self):
+        """
+        汇总统计
+
+        Returns:
+            dict: 统计结果，accepted_tokens_per_step 为每次验证前向平均接受的草稿token数
+        """
+        stats = dict(self.stats)
+        steps = max(1, stats["target_forwards"] - 1)
+        stats["accepted_tokens_per_step"] = stats["accepted_draft_tokens"] / steps
+        stats["acceptance_rate"] = (
+            stats["accepted_draft_tokens"] / stats["draft_tokens"] if stats["draft_tokens"] else 0.0
+        )
+        stats["tokens_per_target_forward"] = (
+            stats["generated_tokens"] / stats["target_forwards"] if stats["target_forwards"] else 0.0
+        )
+        return stats
@@ -0,0 +1,178 @@
+"""
+数字规范化
+测试集的设计描述把数字逐词拼写出来（"zero point one one four nine meters"），
+换成数字字面量（"0.1149 meters"）可以大幅缩短prompt，为生成留出更多token
+"""
+
+import re
+
+_SMALL = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9,
+    "ten": 10, "eleven": 11, "twelve": 12, "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19
+}
+_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50, "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90
+}
+_SCALES = {"thousand": 1000, "million": 1000000}
+_SIGNS = {"negative", "minus"}
+
+_WORD_RE = re.compile(r"[A-Za-z]+")
+# 同一个数字内的单词之间只允许空白或连字符（"twenty-five"）
+_JOIN_RE = re.compile(r"[ \t]*-?[ \t]*")
+
+
+def _is_number_word(word):
+    return word in _SMALL or word in _TENS
+
+
+class _Words:
+    """文本中的单词及其位置，判断相邻两个单词能否属于同一个数字"""
+
+    def __init__(self, text):
+        self.text = text
+        self.matches = list(_WORD_RE.finditer(text))
+        self.words = [m.group().lower() for m in self.matches]
+
+    def __len__(self):
+        return len(self.words)
+
+    def joined(self, k):
+        """第k个和第k+1个单词之间是否只隔着空白或连字符"""
+        if k + 1 >= len(self.words):
+            return False
+        gap = self.text[self.matches[k].end():self.matches[k + 1].start()]
+        return gap != "" and _JOIN_RE.fullmatch(gap) is not None
+
+    def next_is(self, k, predicate):
+        return self.joined(k) and predicate(self.words[k + 1])
+
+
+def _parse_integer(words, start):
+    """
+    从start开始解析整数部分（"one hundred and twenty five"、"two thousand"）
+
+    Returns:
+        tuple: (数值, 结束位置, 使用的单词数)，start处不是数字时数值为None
+    """
+    total, current, last, k = 0, 0, None, start
+    while k < len(words):
+        if k > start and not words.joined(k - 1):
+            break
+        word = words.words[k]
+        if word in _SMALL:
+            value = _SMALL[word]
+            if word == "zero" and last is not None:
+                break
+            if last == "tens" and value >= 10 or last in ("small", "zero"):
+                break
+            if last not in (None, "tens", "hundred", "scale", "and"):
+                break
+            current += value
+            last = "zero" if word == "zero" else "small"
+        elif word in _TENS:
+            if last not in (None, "hundred", "scale", "and"):
+                break
+            current += _TENS[word]
+            last = "tens"
+        elif word == "hundred":
+            if last != "small" or current % 100 == 0:
+                break
+            current *= 100
+            last = "hundred"
+        elif word in _SCALES:
+            if last not in ("small", "tens", "hundred") or (total and total < _SCALES[word] * 1000):
+                break
+            total += current * _SCALES[word]
+            current = 0
+            last = "scale"
+        elif word == "and":
+            if last not in ("hundred", "scale") or not words.next_is(k, _is_number_word):
+                break
+            last = "and"
+        else:
+            break
+        k += 1
+    if last is None:
+        return None, start, 0
+    return total + current, k, k - start
+
+
+def _parse_fraction(words, start):
+    """
+    解析 "point" 之后逐位拼写的小数部分（"one one four nine" -> "1149"）
+
+    Returns:
+        tuple: (小数位字符串, 结束位置)
+    """
+    digits, k = "", start
+    while k < len(words) and (k == start or words.joined(k - 1)):
+        word = words.words[k]
+        if word in _TENS:
+            value = _TENS[word]
+            if words.next_is(k, lambda w: w in _SMALL and 0 < _SMALL[w] < 10):
+                k += 1
+                value += _SMALL[words.words[k]]
+            digits += str(value)
+        elif word in _SMALL:
+            digits += str(_SMALL[word])
+        else:
+            break
+        k += 1
+    return digits, k
+
+
+def _parse_number(words, start):
+    """
+    从start开始解析一个拼写的数字
+
+    Returns:
+        tuple: (数字字面量, 结束位置)，不需要替换时为 (None, start)
+    """
+    sign, k = "", start
+    if words.words[k] in _SIGNS and words.next_is(k, lambda w: _is_number_word(w) or w == "point"):
+        sign, k = "-", k + 1
+    value, k, num_words = _parse_integer(words, k)
+    fraction = ""
+    # "point" 紧跟在整数部分之后，或者没有整数部分（"point five"）
+    point_follows = k < len(words) and (num_words == 0 or words.joined(k - 1)) and words.words[k] == "point"
+    if point_follows and words.next_is(k, _is_number_word):
+        fraction, k = _parse_fraction(words, k + 1)
+    if not fraction and value is None:
+        return None, start
+    # 单独的 "one" 到 "nine" 保持原样：本身就是一个token，而且常作代词或计数（"one side"、"two holes"）
+    if not fraction and not sign and num_words == 1 and value < 10:
+        return None, start
+    literal = sign + str(value or 0)
+    if fraction:
+        literal += "." + fraction
+    return literal, k
+
+
+def normalize_numbers(text):
+    """
+    将文本中拼写的数字换成数字字面量
+
+    "zero point one one four nine" -> "0.1149"，"twenty-five" -> "25"，
+    "one hundred and twenty" -> "120"，"negative zero point five" -> "-0.5"。
+    单独出现的 "one" 到 "nine" 不替换。
+
+    Args:
+        text: 设计描述
+
+    Returns:
+        str: 规范化后的文本
+    """
+    words = _Words(text)
+    pieces, position, k = [], 0, 0
+    while k < len(words):
+        literal, end = _parse_number(words, k)
+        if literal is None:
+            k += 1
+            continue
+        pieces.append(text[position:words.matches[k].start()])
+        pieces.append(literal)
+        position = words.matches[end - 1].end()
+        k = end
+    pieces.append(text[position:])
+    return "".join(pieces)
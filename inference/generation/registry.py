@@ -0,0 +1,143 @@
+"""
+模型注册表
+集中管理各个微调模型的路径、prompt模板、回复分隔符和精度
+"""
+
+# 每个条目对应 step1_generate_CadQuery 下原来的一个推理脚本
+#   model_path:         模型路径（LoRA模型为基础模型路径）
+#   adapter_path:       LoRA适配器路径，全量微调模型为None
+#   prompt_template:    prompt模板，{input} 会被替换为设计描述
+#   response_delimiter: 回复分隔符，解码结果中该标记之后的内容为生成代码
+#   torch_dtype:        加载精度，None表示使用默认的fp32
+#   batch_size:         默认批大小
+#   output_dir:         默认输出目录
+MODEL_REGISTRY = {
+    "codegpt-small": {
+        "model_path": "ricemonster/codegpt-small-sft",
+        "adapter_path": None,
+        "prompt_template": "{input}",
+        "response_delimiter": None,
+        "torch_dtype": "bfloat16",
+        "batch_size": 64,
+        "output_dir": "./txt",
+    },
+    "gpt2-medium": {
+        "model_path": "ricemonster/gpt2-medium-sft",
+        "adapter_path": None,
+        "prompt_template": "{input}",
+        "response_delimiter": None,
+        "torch_dtype": "bfloat16",
+        "batch_size": 64,
+        "output_dir": "./txt",
+    },
+    "gpt2-large": {
+        "model_path": "ricemonster/gpt2-large-sft",
+        "adapter_path": None,
+        "prompt_template": "{input}",
+        "response_delimiter": None,
+        "torch_dtype": "bfloat16",
+        "batch_size": 64,
+        "output_dir": "./txt",
+    },
+    # 在 deepseek-16b 可执行的生成结果上蒸馏的小模型（train/build_distill_set.py，训练脚本中 DISTILL = True）
+    "codegpt-small-distill": {
+        "model_path": "../train/codegpt-small-distill",
+        "adapter_path": None,
+        "prompt_template": "{input}",
+        "response_delimiter": None,
+        "torch_dtype": "bfloat16",
+        "batch_size": 64,
+        "output_dir": "./txt_distill",
+    },
+    "gpt2-medium-distill": {
+        "model_path": "../train/gpt2-medium-distill",
+        "adapter_path": None,
+        "prompt_template": "{input}",
+        "response_delimiter": None,
+        "torch_dtype": "bfloat16",
+        "batch_size": 64,
+        "output_dir": "./txt_distill",
+    },
+    "gemma-1b": {
+        "model_path": "ricemonster/gemma-1B-SFT",
+        "adapter_path": None,
+        "prompt_template": "<start_of_turn>user\n{input}\n<end_of_turn>\n<start_of_turn>model\n",
+        "response_delimiter": "<start_of_turn>model",
+        "torch_dtype": "bfloat16",
+        "batch_size": 50,
+        "output_dir": "./txt",
+    },
+    "qwen-3b": {
+        "model_path": "ricemonster/qwen2.5-3B-SFT",
+        "adapter_path": None,
+        "prompt_template": "### Instruction:\n{input}\n\n### Response:\n",
+        "response_delimiter": "### Response:",
+        "torch_dtype": "bfloat16",
+        "batch_size": 5,
+        "output_dir": "./txt",
+    },
+    "mistral-7b": {
+        "model_path": "mistralai/Mistral-7B-Instruct-v0.3",
+        "adapter_path": "ricemonster/Mistral-7B-lora",
+        "prompt_template": "<s>[INST] {input} [/INST]",
+        "response_delimiter": "[/INST]",
+        "torch_dtype": None,
+        "batch_size": 50,
+        "output_dir": "./txt",
+    },
+    "deepseek-16b": {
+        "model_path": "deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct",
+        "adapter_path": "../train/lora_deepseek16b_best",
+        "prompt_template": "<s>[INST] {input} [/INST]",
+        "response_delimiter": "[/INST]",
+        "torch_dtype": None,
+        "batch_size": 5,
+        "output_dir": "./txt_deepseek",
+    },
+}
+
+
+def get_model_spec(name):
+    """
+    获取模型配置
+
+    Args:
+        name: 注册表中的模型名称
+
+    Returns:
+        dict: 模型配置（副本）
+    """
+    if name not in MODEL_REGISTRY:
+        raise KeyError(f"未知模型: {name}，可用模型: {list(MODEL_REGISTRY.keys())}")
+    return dict(MODEL_REGISTRY[name])
+
+
+def build_prompt(spec, text):
+    """
+    按模型的prompt模板构建输入
+
+    Args:
+        spec: 模型配置
+        text: 设计描述
+
+    Returns:
+        str: 完整prompt
+    """
+    return spec["prompt_template"].format(input=text)
+
+
+def extract_response(spec, output):
+    """
+    从解码结果中提取生成的代码
+
+    Args:
+        spec: 模型配置
+        output: 解码后的完整文本
+
+    Returns:
+        str: 生成的代码
+    """
+    delimiter = spec["response_delimiter"]
+    if delimiter and delimiter in output:
+        output = output.split(delimiter, 1)[1]
+    return output.strip()
@@ -0,0 +1,144 @@
+"""
+生成结果缓存
+所有解码都是贪心的，同一模型、适配器、模板、prompt和解码参数总是得到相同的代码，
+结果持久化在sqlite中，按最近访问时间淘汰以限制大小
+"""
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+from .fingerprint import model_fingerprint, adapter_fingerprint, combined_key
+
+
+def generation_namespace(spec, **decode_params):
+    """
+    计算一组生成结果共享的命名空间：模型和适配器指纹、prompt模板、解码参数
+
+    Args:
+        spec: 模型配置（model_path、adapter_path、prompt_template，可选torch_dtype、quantization、merged）
+        **decode_params: 影响输出的解码参数
+
+    Returns:
+        str: 十六进制哈希
+    """
+    return combined_key(
+        model=model_fingerprint(spec["model_path"]),
+        adapter=adapter_fingerprint(spec["adapter_path"]) if spec.get("adapter_path") else None,
+        prompt_template=spec["prompt_template"],
+        response_delimiter=spec.get("response_delimiter"),
+        torch_dtype=spec.get("torch_dtype"),
+        quantization=spec.get("quantization"),
+        merged=spec.get("merged"),
+        decode=decode_params
+    )
+
+
+class ResultCache:
+    """基于sqlite的生成结果缓存类，可在多个线程和进程间共享"""
+
+    def __init__(self, path, max_size_mb=512):
+        """
+        初始化结果缓存
+
+        Args:
+            path: sqlite数据库文件路径
+            max_size_mb: 缓存输出的总大小上限（MB），超出后淘汰最久未访问的结果
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, output TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_last_access ON results(last_access)")
+
+    @staticmethod
+    def key(namespace, prompt):
+        """单条结果的键：命名空间加上套用模板后的prompt"""
+        return hashlib.sha256(f"{namespace}\0{prompt}".encode("utf-8")).hexdigest()
+
+    def get(self, namespace, prompt):
+        """
+        查询缓存
+
+        Args:
+            namespace: generation_namespace 计算的命名空间
+            prompt: 套用模板后的prompt
+
+        Returns:
+            str: 缓存的生成结果，未命中时返回None
+        """
+        key = self.key(namespace, prompt)
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT output FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats["misses"] += 1
+                return None
+            self.conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+        self.stats["hits"] += 1
+        return row[0]
+
+    def put(self, namespace, prompt, output):
+        """
+        写入缓存，超出大小上限时淘汰
+
+        Args:
+            namespace: generation_namespace 计算的命名空间
+            prompt: 套用模板后的prompt
+            output: 生成结果
+        """
+        key = self.key(namespace, prompt)
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO results (key, output, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, output, len(output.encode("utf-8")), time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        """淘汰最久未访问的结果，直到总大小降到上限的90%以下，避免每次写入都触发淘汰"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_size:
+            return
+        target = total - int(self.max_size * 0.9)
+        evicted, freed = [], 0
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY last_access"):
+            evicted.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self.conn.executemany("DELETE FROM results WHERE key = ?", evicted)
+        self.stats["evictions"] += len(evicted)
+
+    def report(self):
+        """
+        缓存统计
+
+        Returns:
+            dict: 命中、未命中、淘汰数，命中率，条目数和总大小
+        """
+        with self.lock:
+            entries, total = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return dict(
+            self.stats,
+            hit_rate=self.stats["hits"] / lookups if lookups else 0.0,
+            entries=entries,
+            size_mb=total / (1024 * 1024)
+        )
+
+    def close(self):
+        """关闭数据库连接"""
+        with self.lock:
+            self.conn.close()
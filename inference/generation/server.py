@@ -0,0 +1,218 @@
+"""
+常驻推理服务
+模型只加载一次，时间窗口内到达的并发请求合并成一次批量生成
+"""
+
+import json
+import queue
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Request:
+    """等待生成结果的单条请求"""
+
+    def __init__(self, prompt, adapter=None):
+        self.prompt = prompt
+        self.adapter = adapter
+        self.output = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    """请求合并器：所有生成都在同一个工作线程中完成"""
+
+    def __init__(self, generate_batch, batch_window=0.05, max_batch_size=8):
+        """
+        初始化请求合并器
+
+        Args:
+            generate_batch: 批量生成函数，输入prompt列表和同长度的适配器名称列表，返回同顺序的输出列表
+            batch_window: 第一条请求到达后等待更多请求的时间（秒）
+            max_batch_size: 单次批量生成的最大请求数
+        """
+        self.generate_batch = generate_batch
+        self.batch_window = batch_window
+        self.max_batch_size = max_batch_size
+        self.queue = queue.Queue()
+        self.stats = {"requests": 0, "batches": 0, "errors": 0}
+        self.worker = threading.Thread(target=self._work, daemon=True)
+        self.worker.start()
+
+    def submit(self, prompts, adapters=None):
+        """
+        提交一组prompt并等待结果
+
+        Args:
+            prompts: prompt列表
+            adapters: 与prompt同长度的适配器名称列表，None表示都使用默认适配器
+
+        Returns:
+            list: 与输入顺序一致的输出列表
+        """
+        requests = [_Request(prompt, adapter) for prompt, adapter in zip(prompts, adapters or [None] * len(prompts))]
+        for request in requests:
+            self.queue.put(request)
+        for request in requests:
+            request.done.wait()
+            if request.error is not None:
+                raise RuntimeError(request.error)
+        return [request.output for request in requests]
+
+    def _collect(self):
+        """阻塞等待第一条请求，然后在时间窗口内继续收集"""
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.batch_window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            batch = self._collect()
+            try:
+                outputs = self.generate_batch([request.prompt for request in batch],
+                                              [request.adapter for request in batch])
+                for request, output in zip(batch, outputs):
+                    request.output = output
+            except Exception as e:
+                self.stats["errors"] += 1
+                for request in batch:
+                    request.error = f"{type(e).__name__}: {e}"
+            finally:
+                self.stats["requests"] += len(batch)
+                self.stats["batches"] += 1
+                for request in batch:
+                    request.done.set()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """HTTP接口: GET /health, POST /generate {"prompts": [...], "adapters": [...]（可选）}"""
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self._send_json(404, {"error": f"未知路径: {self.path}"})
+            return
+        self._send_json(200, {"status": "ok", "info": self.server.info, "stats": self.server.batcher.stats})
+
+    def do_POST(self):
+        if self.path != "/generate":
+            self._send_json(404, {"error": f"未知路径: {self.path}"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length).decode("utf-8"))
+            prompts = payload["prompts"]
+            adapters = payload.get("adapters")
+        except (ValueError, KeyError) as e:
+            self._send_json(400, {"error": f"请求格式错误: {e}"})
+            return
+        # 未知的适配器在这里拒绝，不让它和其他请求合并后导致整批失败
+        served = self.server.info.get("adapters")
+        if adapters is not None and (len(adapters) != len(prompts)
+                                     or (served and any(a is not None and a not in served for a in adapters))):
+            self._send_json(400, {"error": f"适配器与prompt数量不一致或未注册: {adapters}"})
+            return
+        try:
+            outputs = self.server.batcher.submit(prompts, adapters)
+        except RuntimeError as e:
+            self._send_json(500, {"error": str(e)})
+            return
+        self._send_json(200, {"outputs": outputs})
+
+    def log_message(self, format, *args):
+        pass
+
+
+class InferenceServer(ThreadingHTTPServer):
+    """本地HTTP推理服务，每个连接一个线程，生成统一交给MicroBatcher"""
+
+    daemon_threads = True
+
+    def __init__(self, generate_batch, host="127.0.0.1", port=8765, batch_window=0.05, max_batch_size=8,
+                 info=None):
+        """
+        初始化推理服务
+
+        Args:
+            generate_batch: 批量生成函数
+            host: 监听地址，默认只监听本机
+            port: 监听端口
+            batch_window: 合并请求的时间窗口（秒）
+            max_batch_size: 单次批量生成的最大请求数
+            info: 通过 /health 返回的模型信息，客户端据此判断服务是否可用
+        """
+        super().__init__((host, port), _Handler)
+        self.batcher = MicroBatcher(generate_batch, batch_window, max_batch_size)
+        self.info = info or {}
+
+
+class InferenceClient:
+    """推理服务客户端"""
+
+    def __init__(self, url, timeout=600):
+        """
+        初始化客户端
+
+        Args:
+            url: 服务地址，例如 http://127.0.0.1:8765
+            timeout: 单次请求超时时间（秒）
+        """
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def health(self):
+        """
+        检查服务状态
+
+        Returns:
+            dict: 服务信息，服务不可用时返回None
+        """
+        try:
+            with urllib.request.urlopen(f"{self.url}/health", timeout=2) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except (urllib.error.URLError, OSError, ValueError):
+            return None
+
+    def generate(self, prompts, adapters=None):
+        """
+        请求服务生成
+
+        Args:
+            prompts: 设计需求列表
+            adapters: 与prompt同长度的适配器名称列表，None表示都使用服务的默认适配器
+
+        Returns:
+            list: 与输入顺序一致的输出列表
+        """
+        payload = {"prompts": prompts}
+        if adapters is not None:
+            payload["adapters"] = adapters
+        request = urllib.request.Request(
+            f"{self.url}/generate",
+            data=json.dumps(payload, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))["outputs"]
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(f"推理服务返回错误 {e.code}: {e.read().decode('utf-8')}")
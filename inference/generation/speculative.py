@@ -0,0 +1,150 @@
+"""
+投机解码
+用同一语料上微调的小模型起草token，由大模型一次前向验证，贪心输出与直接解码一致
+"""
+
+import time
+
+
+class ForwardCounter:
+    """统计模型前向调用次数"""
+
+    def __init__(self, model):
+        """
+        在模型上注册前向钩子
+
+        Args:
+            model: 要统计的模型，PeftModel会挂到其内部的基础模型上
+        """
+        target = model.get_base_model() if hasattr(model, "get_base_model") else model
+        self.count = 0
+        self.handle = target.register_forward_hook(self._hook)
+
+    def _hook(self, module, inputs, outputs):
+        self.count += 1
+
+    def remove(self):
+        self.handle.remove()
+
+
+class ProposalCounter:
+    """统计起草模型提出的草稿token数"""
+
+    def __init__(self, draft_model):
+        """
+        包装起草模型的 generate，assisted generation 每轮调用一次来提出草稿
+
+        Args:
+            draft_model: 起草模型
+        """
+        self.draft_model = draft_model
+        self.count = 0
+        original_generate = draft_model.generate
+
+        def generate(*args, **kwargs):
+            input_ids = kwargs["input_ids"] if "input_ids" in kwargs else args[0]
+            outputs = original_generate(*args, **kwargs)
+            sequences = outputs.sequences if hasattr(outputs, "sequences") else outputs
+            self.count += sequences.shape[1] - input_ids.shape[1]
+            return outputs
+
+        draft_model.generate = generate
+
+    def remove(self):
+        # 删除实例属性后恢复为类上的 generate
+        del self.draft_model.generate
+
+
+class SpeculativeDecoder:
+    """投机解码类，封装 model.generate 的 assisted generation 参数并统计接受率"""
+
+    def __init__(self, model, tokenizer, draft_model, draft_tokenizer, num_assistant_tokens=None):
+        """
+        初始化投机解码
+
+        Args:
+            model: 目标（大）模型
+            tokenizer: 目标模型的tokenizer
+            draft_model: 起草（小）模型
+            draft_tokenizer: 起草模型的tokenizer
+            num_assistant_tokens: 每轮起草的token数，None时使用transformers的自适应策略
+        """
+        self.model = model
+        self.tokenizer = tokenizer
+        self.draft_model = draft_model
+        self.draft_tokenizer = draft_tokenizer
+        self.num_assistant_tokens = num_assistant_tokens
+        # 词表不同（如gpt2起草、qwen/deepseek验证）时需要transformers在两套tokenizer间转换
+        self.same_vocab = tokenizer.get_vocab() == draft_tokenizer.get_vocab()
+        self.stats = {
+            "generated_tokens": 0,
+            "target_forwards": 0,
+            "draft_forwards": 0,
+            "draft_tokens": 0,
+            "elapsed": 0.0,
+        }
+
+    def generate_kwargs(self):
+        """
+        传给 model.generate 的额外参数
+
+        Returns:
+            dict: assisted generation 参数
+        """
+        kwargs = {"assistant_model": self.draft_model}
+        if not self.same_vocab:
+            kwargs["tokenizer"] = self.tokenizer
+            kwargs["assistant_tokenizer"] = self.draft_tokenizer
+        if self.num_assistant_tokens is not None:
+            kwargs["num_assistant_tokens"] = self.num_assistant_tokens
+            kwargs["num_assistant_tokens_schedule"] = "constant"
+        return kwargs
+
+    def generate(self, **generate_kwargs):
+        """
+        执行一次投机解码，assisted generation 只支持 batch size 为1
+
+        Args:
+            **generate_kwargs: model.generate 的参数
+
+        Returns:
+            torch.Tensor: 生成结果
+        """
+        input_length = generate_kwargs["input_ids"].shape[1]
+        target_counter = ForwardCounter(self.model)
+        draft_counter = ForwardCounter(self.draft_model)
+        proposal_counter = ProposalCounter(self.draft_model)
+        start_time = time.perf_counter()
+        try:
+            outputs = self.model.generate(**generate_kwargs, **self.generate_kwargs())
+        finally:
+            target_counter.remove()
+            draft_counter.remove()
+            proposal_counter.remove()
+
+        self.stats["elapsed"] += time.perf_counter() - start_time
+        self.stats["generated_tokens"] += outputs.shape[1] - input_length
+        self.stats["target_forwards"] += target_counter.count
+        self.stats["draft_forwards"] += draft_counter.count
+        self.stats["draft_tokens"] += proposal_counter.count
+        return outputs
+
+    def report(self):
+        """
+        汇总接受率统计
+
+        每次目标模型前向都会产出 "被接受的起草token + 1个目标模型自己的token"，
+        因此被接受的起草token数约为 生成token数 - 目标模型前向次数；接受率为被接受数除以提出的草稿token数
+        （词表不同时草稿token按起草模型的词表计数）
+
+        Returns:
+            dict: 统计结果
+        """
+        stats = dict(self.stats)
+        accepted = max(0, stats["generated_tokens"] - stats["target_forwards"])
+        stats["accepted_draft_tokens"] = accepted
+        stats["acceptance_rate"] = accepted / stats["draft_tokens"] if stats["draft_tokens"] else 0.0
+        stats["tokens_per_target_forward"] = (
+            stats["generated_tokens"] / stats["target_forwards"] if stats["target_forwards"] else 0.0
+        )
+        return stats
@@ -0,0 +1,102 @@
+"""
+CAD代码停止条件
+生成出完整的导出语句或文本结束标记后立即停止，不再为会被清理掉的token付出解码开销
+"""
+
+import re
+import torch
+from transformers import StoppingCriteria
+
+# 与 CodeCleaningStep 中的导出语句正则一致：清理时只保留第一个导出语句的导出对象，
+# 其后的导出语句都会被删掉
+EXPORT_PATTERN = re.compile(r"(cq\.)?exporters\.export\s*\(\s*([^,]+),\s*['\"].*?\.stl['\"].*?\)")
+
+# gpt2系列的notebook会在 <|endoftext|> 处截断，mistral/deepseek的输出以 </s> 结尾
+END_OF_TEXT_MARKERS = ("<|endoftext|>", "</s>", "<end_of_turn>")
+
+
+class CadStopChecker:
+    """判断一条序列是否已经生成完有效代码"""
+
+    def __init__(self, tokenizer, window=96):
+        """
+        初始化停止判断
+
+        Args:
+            tokenizer: 模型的tokenizer
+            window: 每次检查时解码的末尾token数，需要覆盖一条完整的导出语句
+        """
+        self.tokenizer = tokenizer
+        self.window = window
+
+    def should_stop(self, generated_ids):
+        """
+        检查已生成的token
+
+        Args:
+            generated_ids: 当前序列已生成的token id列表
+
+        Returns:
+            bool: 是否应该停止
+        """
+        if not generated_ids:
+            return False
+
+        # 导出语句以 ")" 结尾，结束标记以 ">" 结尾，其余token不需要解码整个窗口
+        last = self.tokenizer.decode(generated_ids[-1:], skip_special_tokens=False)
+        if ")" not in last and ">" not in last:
+            return False
+
+        tail = self.tokenizer.decode(generated_ids[-self.window:], skip_special_tokens=False)
+        if any(marker in tail for marker in END_OF_TEXT_MARKERS):
+            return True
+        return EXPORT_PATTERN.search(tail) is not None
+
+
+class CadStoppingCriteria(StoppingCriteria):
+    """用于 model.generate 的停止条件，记录每行在第几个新token处停止"""
+
+    def __init__(self, tokenizer, prompt_length, window=96):
+        """
+        初始化停止条件
+
+        Args:
+            tokenizer: 模型的tokenizer
+            prompt_length: 输入（含左侧padding）的长度
+            window: 每次检查时解码的末尾token数
+        """
+        self.checker = CadStopChecker(tokenizer, window)
+        self.eos_token_id = tokenizer.eos_token_id
+        self.prompt_length = prompt_length
+        self.stop_steps = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.stop_steps is None:
+            self.stop_steps = [None] * input_ids.shape[0]
+
+        num_generated = input_ids.shape[1] - self.prompt_length
+        is_done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        for row in range(input_ids.shape[0]):
+            if self.stop_steps[row] is None:
+                generated_ids = input_ids[row, self.prompt_length:].tolist()
+                # 已经生成eos的行由generate自己结束，不计入本条件
+                if self.eos_token_id in generated_ids:
+                    continue
+                if self.checker.should_stop(generated_ids):
+                    self.stop_steps[row] = num_generated
+            is_done[row] = self.stop_steps[row] is not None
+        return is_done
+
+    def saved_tokens(self, max_new_tokens):
+        """
+        每行因提前停止而不必解码的token数
+
+        Args:
+            max_new_tokens: 本批次的生成上限
+
+        Returns:
+            list: 每行节省的token数，未被本条件停止的行为0
+        """
+        if self.stop_steps is None:
+            return []
+        return [0 if step is None else max_new_tokens - step for step in self.stop_steps]
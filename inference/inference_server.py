@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+常驻推理服务
+模型只加载一次，流水线和调试脚本中的InferenceStep自动以客户端模式连接
+"""
+
+import argparse
+from config import INFERENCE_SERVER_PORT, INFERENCE_BATCH_WINDOW, INFERENCE_BATCH_SIZE
+from steps import InferenceStep
+from generation.server import InferenceServer
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="启动常驻推理服务")
+    parser.add_argument('--base_model_id', type=str, default=None, help='基础模型路径')
+    parser.add_argument('--peft_model_id', type=str, default=None, help='LoRA适配器路径')
+    parser.add_argument('--adapters', type=str, default=None,
+                        help='在同一个基础模型上挂载多个LoRA适配器，逗号分隔的 名称=路径，第一个为默认适配器，'
+                             '例如 best=../train/lora_deepseek16b_best,step1200=../train/checkpoints/checkpoint-1200')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='监听地址，默认只监听本机')
+    parser.add_argument('--port', type=int, default=INFERENCE_SERVER_PORT, help='监听端口')
+    parser.add_argument('--batch_window', type=float, default=INFERENCE_BATCH_WINDOW,
+                        help='合并并发请求的时间窗口（秒）')
+    parser.add_argument('--max_batch_size', type=int, default=INFERENCE_BATCH_SIZE, help='单次批量生成的最大请求数')
+    args = parser.parse_args()
+
+    adapters = dict(item.split('=', 1) for item in args.adapters.split(',') if item) if args.adapters else None
+    step = InferenceStep(args.base_model_id, args.peft_model_id, use_server=False, adapters=adapters)
+    server = InferenceServer(
+        step.run_batch,
+        host=args.host,
+        port=args.port,
+        batch_window=args.batch_window,
+        max_batch_size=args.max_batch_size,
+        info={"base_model_id": step.base_model_id, "peft_model_id": step.peft_model_id, "adapters": step.adapters}
+    )
+    print(f"推理服务已启动: http://{args.host}:{args.port}（合并窗口 {args.batch_window}s，"
+          f"适配器 {', '.join(step.adapters)}）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n推理服务已停止")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+LoRA合并脚本
+将LoRA适配器一次性合并进基础模型，保存到合并模型缓存中供InferenceStep和批量生成直接加载
+"""
+
+import sys
+import argparse
+from config import BASE_MODEL_ID, PEFT_MODEL_ID, MERGED_MODEL_CACHE_DIR, MERGED_MODEL_DTYPE
+from generation import MODEL_REGISTRY, get_model_spec, merge_and_materialize
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="合并LoRA适配器并保存为safetensors")
+    parser.add_argument('-m', '--model', type=str, default=None,
+                        choices=sorted(name for name, spec in MODEL_REGISTRY.items() if spec["adapter_path"]),
+                        help='注册表中的LoRA模型，不指定时使用config.py中的BASE_MODEL_ID/PEFT_MODEL_ID')
+    parser.add_argument('--base_model_id', type=str, default=None, help='基础模型路径')
+    parser.add_argument('--peft_model_id', type=str, default=None, help='LoRA适配器路径')
+    parser.add_argument('--cache_dir', type=str, default=MERGED_MODEL_CACHE_DIR, help='合并模型缓存目录')
+    parser.add_argument('--dtype', type=str, default=MERGED_MODEL_DTYPE,
+                        choices=['float32', 'float16', 'bfloat16'], help='保存精度')
+    parser.add_argument('--overwrite', action='store_true', help='已存在时重新合并')
+    args = parser.parse_args()
+
+    if args.model:
+        spec = get_model_spec(args.model)
+        base_model_id, peft_model_id = spec["model_path"], spec["adapter_path"]
+    else:
+        base_model_id, peft_model_id = BASE_MODEL_ID, PEFT_MODEL_ID
+    base_model_id = args.base_model_id or base_model_id
+    peft_model_id = args.peft_model_id or peft_model_id
+
+    path = merge_and_materialize(args.cache_dir, base_model_id, peft_model_id, args.dtype, args.overwrite)
+    print(f"合并模型路径: {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
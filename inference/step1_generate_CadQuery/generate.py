@@ -0,0 +1,134 @@
+import os
+import sys
+import argparse
+from itertools import chain
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generation import (
+    MODEL_REGISTRY, get_model_spec, load_tokenizer, load_model,
+    BatchGenerationEngine, ContinuousBatchingEngine,
+    RunManifest, parse_shard, SpeculativeDecoder,
+    NgramDrafter, NgramSpeculativeDecoder, build_ngram_index, ResultCache, normalize_numbers,
+    iter_jsonl, iter_chunks
+)
+
+ENGINES = {
+    'static': BatchGenerationEngine,
+    'continuous': ContinuousBatchingEngine,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batched CadQuery generation for all fine-tuned models")
+    parser.add_argument('-m', '--model', type=str, required=True, choices=sorted(MODEL_REGISTRY),
+                        help='Model name in the generation registry')
+    parser.add_argument('-i', '--input_file', type=str, default='./test_filtered.jsonl',
+                        help='JSONL file with an "input" field per line')
+    parser.add_argument('-o', '--output_dir', type=str, default=None,
+                        help='Directory for {index}.txt outputs (default: registry setting)')
+    parser.add_argument('-b', '--batch_size', type=int, default=None,
+                        help='Batch size (default: registry setting)')
+    parser.add_argument('-e', '--engine', type=str, default='static', choices=sorted(ENGINES),
+                        help='static: length-sorted model.generate batches; '
+                             'continuous: evict finished sequences and refill their slots')
+    parser.add_argument('--max_length', type=int, default=1024,
+                        help='Token budget for prompt plus generated code')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Only generate the first N samples')
+    parser.add_argument('--chunk_size', type=int, default=4096,
+                        help='Input lines read and length-sorted at a time; bounds memory for large input files')
+    parser.add_argument('--shard', type=parse_shard, default=(0, 1), metavar='K/N',
+                        help='Only generate samples whose index %% N == K (K counts from 0)')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip samples already recorded in the output manifest')
+    parser.add_argument('--merged_cache_dir', type=str, default='./merged_models',
+                        help='Load LoRA models from this merged-model cache when available (see merge_lora.py)')
+    parser.add_argument('--merged_dtype', type=str, default='bfloat16',
+                        help='Dtype of the merged model to look up in the cache')
+    parser.add_argument('--draft_model', type=str, default=None, choices=sorted(MODEL_REGISTRY),
+                        help='Small fine-tuned model that drafts tokens for speculative decoding '
+                             '(static engine only, batch size 1)')
+    parser.add_argument('--num_assistant_tokens', type=int, default=None,
+                        help='Draft tokens per round (default: transformers adaptive schedule)')
+    parser.add_argument('--ngram_corpus', type=str, default=None,
+                        help='Training JSONL (e.g. data_train.jsonl) whose outputs feed an n-gram drafter '
+                             '(static engine only, batch size 1)')
+    parser.add_argument('--num_draft_tokens', type=int, default=8,
+                        help='Maximum n-gram draft tokens verified per forward pass')
+    parser.add_argument('--stop_on_export', action='store_true',
+                        help='Stop a sequence once a complete STL export statement '
+                             'or an end-of-text marker has been generated')
+    parser.add_argument('--normalize_numbers', action='store_true',
+                        help='Replace spelled-out numbers in the inputs with numeric literals '
+                             '(only for models trained with NORMALIZE_NUMBERS)')
+    parser.add_argument('--result_cache', type=str, default=None,
+                        help='SQLite file caching greedy outputs across runs (e.g. ./cache/results.sqlite)')
+    parser.add_argument('--result_cache_max_mb', type=float, default=512,
+                        help='Evict least recently used cached outputs beyond this size')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if (args.draft_model or args.ngram_corpus) and args.engine != 'static':
+        raise ValueError("Speculative decoding is only supported by the static engine")
+    if args.draft_model and args.ngram_corpus:
+        raise ValueError("Use either --draft_model or --ngram_corpus, not both")
+    spec = get_model_spec(args.model)
+    output_dir = args.output_dir or spec["output_dir"]
+    os.makedirs(output_dir, exist_ok=True)
+
+    shard_index, num_shards = args.shard
+    manifest = RunManifest(output_dir, args.model, shard_index, num_shards)
+    # Input lines are read lazily, chunk by chunk, so memory does not grow with the input file
+    selected = ((index, record["input"]) for index, record in iter_jsonl(args.input_file, args.limit)
+                if index % num_shards == shard_index and not (args.resume and manifest.is_done(index)))
+    chunks = iter_chunks(selected, args.chunk_size)
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        print(f"Shard {shard_index}/{num_shards}: nothing to generate")
+        return
+    print(f"Shard {shard_index}/{num_shards}: streaming {args.input_file} in chunks of {args.chunk_size} samples")
+
+    tokenizer = load_tokenizer(spec, model_max_length=args.max_length)
+    model = load_model(spec, merged_cache_dir=args.merged_cache_dir, merged_dtype=args.merged_dtype)
+    kwargs = {"stop_on_export": args.stop_on_export}
+    if args.draft_model:
+        draft_spec = get_model_spec(args.draft_model)
+        kwargs["speculative"] = SpeculativeDecoder(
+            model, tokenizer, load_model(draft_spec), load_tokenizer(draft_spec), args.num_assistant_tokens
+        )
+    if args.ngram_corpus:
+        index = build_ngram_index(args.ngram_corpus, tokenizer, cache_dir='./ngram_cache')
+        kwargs["speculative"] = NgramSpeculativeDecoder(model, NgramDrafter(index), args.num_draft_tokens)
+    if args.result_cache:
+        kwargs["result_cache"] = ResultCache(args.result_cache, args.result_cache_max_mb)
+    engine = ENGINES[args.engine](model, tokenizer, spec, args.batch_size, args.max_length, **kwargs)
+
+    num_generated = 0
+    for chunk in chain([first_chunk], chunks):
+        indices = [index for index, _ in chunk]
+        inputs = [text for _, text in chunk]
+        if args.normalize_numbers:
+            inputs = [normalize_numbers(text) for text in inputs]
+        for k, response in engine.generate(inputs):
+            extra = {"saved_tokens": engine.saved_tokens.get(k, 0)} if args.stop_on_export else None
+            manifest.record(indices[k], response, extra)
+        num_generated += len(chunk)
+    print(f"Generated {num_generated} samples")
+
+    if args.draft_model or args.ngram_corpus:
+        report = kwargs["speculative"].report()
+        print(f"Speculative decoding: acceptance rate {report['acceptance_rate']:.2%}, "
+              f"{report['tokens_per_target_forward']:.2f} tokens per target forward")
+    if args.stop_on_export:
+        print(f"Early stopping saved {engine.stats['saved_tokens']} decode tokens "
+              f"({engine.stats['saved_tokens'] / num_generated:.1f} per sample)")
+    if args.result_cache:
+        report = kwargs["result_cache"].report()
+        print(f"Result cache: {report['hits']} hits, {report['misses']} misses ({report['hit_rate']:.2%}), "
+              f"{report['evictions']} evictions, {report['entries']} entries / {report['size_mb']:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,83 +5,370 @@
 
 from config import *
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM
+from transformers import AutoTokenizer, AutoModelForCausalLM, StoppingCriteriaList
 from peft import PeftModel
 import os
 import sys
 
 # 添加父目录到路径以导入config
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from generation.stopping import CadStoppingCriteria
+from generation.merged_cache import find_merged_model, load_merged_model
+from generation.model_loader import loaded_model_spec
+from generation.speculative import SpeculativeDecoder
+from generation.registry import build_prompt, extract_response
+from generation.batch_engine import BatchGenerationEngine
+from generation.cpu_backend import configure_cpu_threads, quantize_for_cpu, merge_adapter_for_cpu
+from generation.server import InferenceClient
+from generation.result_cache import ResultCache, generation_namespace
+from generation.number_words import normalize_numbers
+
+# InferenceStep使用的prompt模板，与微调时的格式一致
+PROMPT_SPEC = {
+    "prompt_template": "<s>[INST] {input} [/INST]",
+    "response_delimiter": "[/INST]",
+    "batch_size": INFERENCE_BATCH_SIZE
+}
+
+# 只有一个适配器时使用的名称，与PEFT的默认适配器名称一致
+DEFAULT_ADAPTER = "default"
 
 
 class InferenceStep:
     """模型推理步骤类"""
 
-    def __init__(self, base_model_id=None, peft_model_id=None):
+    def __init__(self, base_model_id=None, peft_model_id=None, use_server=True, adapters=None):
         """
         初始化推理步骤
 
         Args:
             base_model_id: 基础模型路径
             peft_model_id: PEFT模型路径
+            use_server: 常驻推理服务可用时是否以客户端模式连接
+            adapters: 适配器名称到路径的字典，全部挂载在同一个基础模型上，第一个为默认适配器；
+                None时使用 config.py 中的 PEFT_ADAPTERS（指定了peft_model_id时只加载它）
         """
         self.base_model_id = base_model_id or BASE_MODEL_ID
-        self.peft_model_id = peft_model_id or PEFT_MODEL_ID
-
-        print("初始化推理模型...")
-        self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_id, trust_remote_code=True)
-        self.base_model = AutoModelForCausalLM.from_pretrained(
-            self.base_model_id,
-            trust_remote_code=True,
-            device_map="auto"
-        )
-        self.model = PeftModel.from_pretrained(self.base_model, self.peft_model_id, device_map="auto")
-        self.model.eval()
+        if adapters is None and PEFT_ADAPTERS and not peft_model_id:
+            adapters = PEFT_ADAPTERS
+        self.adapters = dict(adapters or {DEFAULT_ADAPTER: peft_model_id or PEFT_MODEL_ID})
+        self.default_adapter = next(iter(self.adapters))
+        self.peft_model_id = self.adapters[self.default_adapter]
+
+        self.client = self.connect_server() if use_server else None
+        if self.client:
+            return
+
+        self.device = self.resolve_device(INFERENCE_DEVICE)
+
+        print(f"初始化推理模型（{self.device}）...")
+        # 合并后的模型只包含一个适配器
+        merged_path = None
+        if len(self.adapters) == 1:
+            merged_path = find_merged_model(
+                MERGED_MODEL_CACHE_DIR, self.base_model_id, self.peft_model_id, MERGED_MODEL_DTYPE
+            )
+        if self.device == "cpu":
+            self.load_cpu_model(merged_path)
+        elif merged_path:
+            # LoRA已合并进权重，推理时没有适配器的额外开销
+            print(f"加载已合并的模型: {merged_path}")
+            self.tokenizer, self.model = load_merged_model(merged_path)
+        else:
+            print("未找到合并后的模型，加载基础模型并挂载LoRA（可运行 python merge_lora.py 预先合并）")
+            self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_id, trust_remote_code=True)
+            self.base_model = AutoModelForCausalLM.from_pretrained(
+                self.base_model_id,
+                trust_remote_code=True,
+                device_map="auto"
+            )
+            self.model = self.attach_adapters(self.base_model, device_map="auto")
+            self.model.eval()
+
+        # 批量推理需要左侧padding
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+
+        self.speculative = None
+        if DRAFT_MODEL_ID:
+            print(f"加载起草模型: {DRAFT_MODEL_ID}")
+            draft_tokenizer = AutoTokenizer.from_pretrained(DRAFT_MODEL_ID, trust_remote_code=True)
+            draft_model = AutoModelForCausalLM.from_pretrained(
+                DRAFT_MODEL_ID,
+                trust_remote_code=True,
+                torch_dtype=self.model.dtype
+            ).to(self.device)
+            draft_model.eval()
+            self.speculative = SpeculativeDecoder(
+                self.model, self.tokenizer, draft_model, draft_tokenizer, NUM_ASSISTANT_TOKENS
+            )
+
+        # 采样解码的输出不固定，不使用结果缓存
+        self.result_cache = None
+        if RESULT_CACHE_PATH and not DO_SAMPLE:
+            self.result_cache = ResultCache(RESULT_CACHE_PATH, RESULT_CACHE_MAX_MB)
+        # 每个适配器一个生成引擎，结果缓存按各自的适配器区分（实际精度和LoRA是否合并由引擎记录）
+        quantization = CPU_QUANTIZATION if self.device == "cpu" and len(self.adapters) == 1 else None
+        specs = {
+            name: dict(PROMPT_SPEC, model_path=self.base_model_id, adapter_path=path, quantization=quantization)
+            for name, path in self.adapters.items()
+        }
+        self.engines = {
+            name: BatchGenerationEngine(
+                self.model, self.tokenizer, spec,
+                max_length=MAX_NEW_TOKENS,
+                stop_on_export=STOP_ON_EXPORT,
+                speculative=self.speculative,
+                result_cache=self.result_cache
+            )
+            for name, spec in specs.items()
+        }
+        # run 单条生成不加padding，run_batch 左侧padding组批，两者的贪心输出可能不同，使用各自的命名空间
+        self.run_namespaces = {
+            name: generation_namespace(
+                loaded_model_spec(spec, self.model), engine="single", max_length=MAX_NEW_TOKENS,
+                stop_on_export=STOP_ON_EXPORT
+            )
+            for name, spec in specs.items()
+        } if self.result_cache is not None else {}
+        if len(self.adapters) > 1:
+            print(f"已在同一个基础模型上挂载 {len(self.adapters)} 个适配器: {', '.join(self.adapters)}，"
+                  f"默认 {self.default_adapter}")
         print("推理模型初始化完成")
 
+    def connect_server(self):
+        """
+        连接常驻推理服务，服务未启动或加载的模型不一致时返回None
+
+        Returns:
+            InferenceClient: 推理服务客户端
+        """
+        if not INFERENCE_SERVER_URL:
+            return None
+        client = InferenceClient(INFERENCE_SERVER_URL, INFERENCE_SERVER_TIMEOUT)
+        health = client.health()
+        if health is None:
+            return None
+        info = health.get("info", {})
+        served = info.get("adapters") or {DEFAULT_ADAPTER: info.get("peft_model_id")}
+        missing = [name for name, path in self.adapters.items() if served.get(name) != path]
+        if info.get("base_model_id") != self.base_model_id or missing:
+            print(f"推理服务加载的模型与当前配置不一致（{info.get('base_model_id')}，适配器 {', '.join(served)}），"
+                  f"在本进程加载模型")
+            return None
+        print(f"连接到常驻推理服务: {INFERENCE_SERVER_URL}")
+        return client
+
+    @staticmethod
+    def resolve_device(device):
+        """
+        解析推理设备
+
+        Args:
+            device: "auto" / "cuda" / "cpu"
+
+        Returns:
+            str: 实际使用的设备
+        """
+        if device == "auto":
+            return "cuda" if torch.cuda.is_available() else "cpu"
+        if device == "cuda" and not torch.cuda.is_available():
+            print("未检测到可用的GPU，改用CPU推理")
+            return "cpu"
+        return device
+
+    def attach_adapters(self, base_model, **kwargs):
+        """
+        在基础模型上按名称挂载所有注册的适配器，基础模型只有一份
+
+        Args:
+            base_model: 基础模型
+            **kwargs: 传给 PeftModel.from_pretrained 的参数
+
+        Returns:
+            PeftModel: 激活默认适配器的模型
+        """
+        names = list(self.adapters)
+        model = PeftModel.from_pretrained(base_model, self.adapters[names[0]], adapter_name=names[0], **kwargs)
+        for name in names[1:]:
+            print(f"挂载适配器 {name}: {self.adapters[name]}")
+            model.load_adapter(self.adapters[name], adapter_name=name)
+        model.set_adapter(self.default_adapter)
+        return model
+
+    def resolve_adapter(self, adapter=None):
+        """
+        检查适配器名称
+
+        Args:
+            adapter: 适配器名称，None表示默认适配器
+
+        Returns:
+            str: 实际使用的适配器名称
+        """
+        name = adapter or self.default_adapter
+        if name not in self.adapters:
+            raise ValueError(f"未注册的适配器: {name}，可用: {', '.join(self.adapters)}")
+        return name
+
+    def select_adapter(self, name):
+        """
+        切换激活的适配器，只改变参与计算的LoRA权重，不重新加载模型
+
+        Args:
+            name: 已注册的适配器名称
+        """
+        if len(self.adapters) > 1 and self.model.active_adapter != name:
+            self.model.set_adapter(name)
+
+    def load_cpu_model(self, merged_path):
+        """
+        加载CPU推理模型：fp32权重，LoRA合并后对线性层做int8量化；
+        注册了多个适配器时保留未合并的LoRA以便切换，不做量化
+
+        Args:
+            merged_path: 合并后的模型目录，不存在时为None
+        """
+        num_threads = configure_cpu_threads(CPU_NUM_THREADS)
+        print(f"CPU推理线程数: {num_threads}")
+        if merged_path:
+            print(f"加载已合并的模型: {merged_path}")
+            self.tokenizer, self.model = load_merged_model(merged_path, device_map=None)
+        else:
+            self.tokenizer = AutoTokenizer.from_pretrained(self.base_model_id, trust_remote_code=True)
+            base_model = AutoModelForCausalLM.from_pretrained(
+                self.base_model_id,
+                trust_remote_code=True,
+                torch_dtype=torch.float32
+            )
+            if len(self.adapters) > 1:
+                print("注册了多个适配器，保留未合并的LoRA，不做量化")
+                self.model = self.attach_adapters(base_model)
+                self.model.eval()
+                return
+            print("未找到合并后的模型，加载基础模型并在内存中合并LoRA")
+            self.model = merge_adapter_for_cpu(self.attach_adapters(base_model))
+        if CPU_QUANTIZATION:
+            print(f"对线性层做 {CPU_QUANTIZATION} 量化")
+        self.model = quantize_for_cpu(self.model.float(), CPU_QUANTIZATION)
+        self.model.eval()
+
     @torch.inference_mode()
-    def run(self, input_prompt):
+    def run(self, input_prompt, adapter=None):
         """
         执行推理步骤
 
         Args:
             input_prompt: 输入的设计需求
+            adapter: 使用的适配器名称，None表示默认适配器
 
         Returns:
             str: 生成的代码
         """
         print(f"正在推理: {input_prompt[:100]}...")
+        adapter = self.resolve_adapter(adapter)
+
+        if self.client:
+            output = self.client.generate([input_prompt], [adapter])[0]
+            print(f"推理完成，生成代码长度: {len(output)}")
+            return output
+        self.select_adapter(adapter)
 
         # 构建prompt
-        prompt = f"<s>[INST] {input_prompt} [/INST]"
+        if NORMALIZE_NUMBERS:
+            input_prompt = normalize_numbers(input_prompt)
+        prompt = build_prompt(PROMPT_SPEC, input_prompt)
+
+        # 贪心解码的结果固定，缓存命中时直接返回
+        if self.result_cache is not None:
+            output = self.result_cache.get(self.run_namespaces[adapter], prompt)
+            if output is not None:
+                print(f"命中结果缓存，生成代码长度: {len(output)}")
+                return output
 
         # 编码输入
-        inputs = self.tokenizer(prompt, return_tensors="pt", padding=True, truncation=True).to("cuda")
+        inputs = self.tokenizer(prompt, return_tensors="pt", padding=True, truncation=True).to(self.device)
         input_lengths = inputs["input_ids"].shape[1]
         max_new_tokens = max(1, MAX_NEW_TOKENS - input_lengths)
 
+        # 生成出完整的导出语句后提前停止
+        stopping_criteria = StoppingCriteriaList()
+        if STOP_ON_EXPORT:
+            stopping_criteria.append(CadStoppingCriteria(self.tokenizer, input_lengths))
+
         # 生成代码
-        outputs = self.model.generate(
+        generate = self.speculative.generate if self.speculative else self.model.generate
+        outputs = generate(
             **inputs,
             max_new_tokens=max_new_tokens,
             eos_token_id=self.tokenizer.eos_token_id,
             pad_token_id=self.tokenizer.eos_token_id,
-            do_sample=DO_SAMPLE
+            do_sample=DO_SAMPLE,
+            stopping_criteria=stopping_criteria
         )
 
+        if STOP_ON_EXPORT:
+            saved_tokens = stopping_criteria[0].saved_tokens(max_new_tokens)
+            if saved_tokens and saved_tokens[0]:
+                print(f"检测到完整的导出语句，提前停止，节省 {saved_tokens[0]} 个token")
+
+        if self.speculative:
+            report = self.speculative.report()
+            print(f"投机解码累计接受率: {report['acceptance_rate']:.2%}，"
+                  f"每次大模型前向平均产出 {report['tokens_per_target_forward']:.2f} 个token")
+
         # 解码输出
         output = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
 
         # 清理输出
         if "</s>" in output:
             output = output.replace("</s>", "")
-
-        if "[/INST]" in output:
-            output = output.split("[/INST]", 1)[1].strip()
+        output = extract_response(PROMPT_SPEC, output)
+        if self.result_cache is not None:
+            self.result_cache.put(self.run_namespaces[adapter], prompt, output)
 
         print(f"推理完成，生成代码长度: {len(output)}")
         return output
 
+    def run_batch(self, input_prompts, adapters=None):
+        """
+        批量推理，按适配器分组，组内按长度排序组批以减少padding
+
+        Args:
+            input_prompts: 设计需求列表
+            adapters: 适配器名称，字符串表示全部使用同一个适配器，列表则逐条指定；None表示默认适配器
+
+        Returns:
+            list: 与输入顺序一致的生成代码列表
+        """
+        print(f"批量推理 {len(input_prompts)} 条需求...")
+        if adapters is None or isinstance(adapters, str):
+            adapters = [adapters] * len(input_prompts)
+        adapters = [self.resolve_adapter(name) for name in adapters]
+        if self.client:
+            return self.client.generate(input_prompts, adapters)
+
+        if NORMALIZE_NUMBERS:
+            input_prompts = [normalize_numbers(p) for p in input_prompts]
+        groups = {}
+        for k, name in enumerate(adapters):
+            groups.setdefault(name, []).append(k)
+        results = [None] * len(input_prompts)
+        for name, indices in groups.items():
+            self.select_adapter(name)
+            engine = self.engines[name]
+            for k, output in engine.generate([input_prompts[k] for k in indices], show_progress=False):
+                results[indices[k]] = output
+            stats = engine.stats
+            if stats["elapsed"] > 0:
+                print(f"批量推理完成（适配器 {name}，{len(indices)} 条），"
+                      f"吞吐量: {stats['generated_tokens'] / stats['elapsed']:.1f} tokens/s")
+        if self.result_cache is not None:
+            report = self.result_cache.report()
+            print(f"结果缓存: 命中 {report['hits']}，未命中 {report['misses']}，命中率 {report['hit_rate']:.2%}")
+        return results
+
     def save_result(self, result, output_path):
         """
         保存推理结果
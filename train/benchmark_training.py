@@ -0,0 +1,353 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import resource
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+import torch
+import transformers
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, Trainer, TrainerCallback, TrainingArguments
+
+TRAIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Flags that would make a short benchmark run measure something other than training steps
+BENCHMARK_FLAGS = {"EXEC_EVAL_STEPS": "None", "ASYNC_CHECKPOINT": "False"}
+
+# TrainingArguments that a benchmark run always overrides
+DROPPED_ARGS = ("evaluation_strategy", "eval_steps", "save_steps", "load_best_model_at_end", "metric_for_best_model",
+                "greater_is_better", "save_total_limit", "logging_dir", "fp16", "bf16")
+
+SHAPES = ["box({a}, {b}, {c})", "cylinder({a}, {b})", "circle({a}).extrude({b})", "rect({a}, {b}).extrude({c})",
+          "polygon(6, {a}).extrude({b})", "sphere({a})"]
+FEATURES = ["faces('>Z').workplane().hole({a})", "edges('|Z').fillet({d})", "faces('<Z').shell(-{d})",
+            "faces('>Z').workplane().rect({a}, {b}, forConstruction=True).vertices().cboreHole({d}, {a}, {d})",
+            "edges('>Z').chamfer({d})", "translate(({a}, {b}, 0))"]
+NOUNS = ["plate", "bracket", "flange", "housing", "spacer", "bushing", "mount", "cover", "shaft", "washer"]
+
+
+class _BenchmarkDone(Exception):
+    pass
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Run a few training steps of a train/*.py config on a tiny random-init model on CPU")
+    parser.add_argument('script', type=str, help='Training script, e.g. train_mistral-7B_lora.py')
+    parser.add_argument('-n', '--steps', type=int, default=20, help='Optimizer steps to run')
+    parser.add_argument('--warmup_steps', type=int, default=3, help='Steps excluded from the timing statistics')
+    parser.add_argument('--data', type=str, default='synthetic', choices=['synthetic', 'sampled'],
+                        help='Synthetic CadQuery-like examples, or a random sample of the script\'s own data files')
+    parser.add_argument('--num_examples', type=int, default=1024, help='Training examples written for the run')
+    parser.add_argument('--batch_size', type=int, default=None, help='Override per_device_train_batch_size')
+    parser.add_argument('--hidden_size', type=int, default=64)
+    parser.add_argument('--num_layers', type=int, default=2)
+    parser.add_argument('--num_heads', type=int, default=4)
+    parser.add_argument('--set', type=str, action='append', default=[], metavar='FLAG=VALUE',
+                        help='Override a module-level flag of the script, e.g. --set PACKING=False (repeatable)')
+    parser.add_argument('--tokenizer', type=str, default=None,
+                        help='Load the tokenizer from this path instead of the script\'s model id')
+    parser.add_argument('--config', type=str, default=None,
+                        help='Load the model config from this path instead of the script\'s model id')
+    parser.add_argument('--num_threads', type=int, default=None, help='torch CPU threads')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output_file', type=str, default=None,
+                        help='Result JSON (default: benchmark_<script>.json)')
+    parser.add_argument('--baseline', type=str, default=None, help='Earlier result JSON to compare against')
+    return parser.parse_args()
+
+
+def shrink_config(config, hidden_size, num_layers, num_heads):
+    """Scale a model config down to a tiny model of the same architecture."""
+    original_layers = None
+    for name in ("num_hidden_layers", "n_layer", "num_layers"):
+        if hasattr(config, name):
+            original_layers = original_layers or getattr(config, name)
+            setattr(config, name, num_layers)
+    original_heads = next((getattr(config, n) for n in ("num_attention_heads", "n_head") if hasattr(config, n)), None)
+    for name in ("hidden_size", "n_embd", "d_model"):
+        if hasattr(config, name):
+            setattr(config, name, hidden_size)
+    for name in ("num_attention_heads", "n_head"):
+        if hasattr(config, name):
+            setattr(config, name, num_heads)
+    if getattr(config, "num_key_value_heads", None) and original_heads:
+        # Keep grouped-query attention grouped
+        groups = max(1, original_heads // config.num_key_value_heads)
+        config.num_key_value_heads = max(1, num_heads // groups)
+    if getattr(config, "head_dim", None):
+        config.head_dim = hidden_size // num_heads
+    for name in ("intermediate_size", "n_inner", "moe_intermediate_size"):
+        if getattr(config, name, None):
+            setattr(config, name, 4 * hidden_size)
+    # Mixture-of-experts and multi-head latent attention (DeepSeek-V2)
+    for name, value in (("n_routed_experts", 4), ("num_local_experts", 4), ("num_experts", 4),
+                        ("num_experts_per_tok", 2), ("n_shared_experts", 1), ("first_k_dense_replace", 1),
+                        ("kv_lora_rank", 32), ("q_lora_rank", 32), ("qk_rope_head_dim", 8),
+                        ("qk_nope_head_dim", 8), ("v_head_dim", 16), ("topk_group", 1), ("n_group", 1)):
+        if getattr(config, name, None):
+            setattr(config, name, value)
+    # Per-layer lists (layer_types, ...) must match the new depth
+    for name, value in list(vars(config).items()):
+        if isinstance(value, list) and original_layers and len(value) == original_layers:
+            setattr(config, name, value[:num_layers])
+    if hasattr(config, "quantization_config"):
+        del config.quantization_config
+    return config
+
+
+def synthetic_examples(num_examples, rng):
+    """Description/CadQuery pairs with a long-tailed length distribution like the real corpus."""
+    examples = []
+    for _ in range(num_examples):
+        dims = {k: round(rng.uniform(1, 100), 1) for k in "abc"}
+        dims["d"] = round(rng.uniform(0.5, 5), 1)
+        num_features = min(int(rng.lognormvariate(1.2, 0.8)), 40)
+        noun = rng.choice(NOUNS)
+        lines = ["import cadquery as cq", "", f"result = cq.Workplane('XY').{rng.choice(SHAPES).format(**dims)}"]
+        lines += [f"result = result.{rng.choice(FEATURES).format(**dims)}" for _ in range(num_features)]
+        lines += ["", "cq.exporters.export(result, 'output.stl')"]
+        description = (f"A {noun} of {dims['a']} x {dims['b']} x {dims['c']} mm with {num_features} features, "
+                       f"including holes of {dims['d']} mm.")
+        examples.append({"input": description, "output": "\n".join(lines)})
+    return examples
+
+
+def write_data_files(data_files, data, num_examples, rng, work_dir):
+    for name in data_files:
+        count = num_examples if "val" not in name else max(num_examples // 8, 16)
+        if data == "synthetic":
+            examples = synthetic_examples(count, rng)
+        else:
+            with open(os.path.join(TRAIN_DIR, name), 'r') as f:
+                lines = [line for line in f if line.strip()]
+            examples = [json.loads(line) for line in rng.sample(lines, min(count, len(lines)))]
+        with open(os.path.join(work_dir, name), 'w') as f:
+            for example in examples:
+                f.write(json.dumps(example, ensure_ascii=False) + "\n")
+
+
+class BenchmarkCallback(TrainerCallback):
+    """Step times, data wait and supervised/total token counts of a benchmark run."""
+
+    def __init__(self, num_steps, warmup_steps):
+        self.num_steps = num_steps
+        self.warmup_steps = warmup_steps
+        self.step_times = []
+        self.data_wait = []
+        self.effective_tokens = []
+        self.total_tokens = []
+        self.step_effective = 0
+        self.step_total = 0
+        self.step_wait = 0.0
+        self.step_start = None
+        self.handle = None
+
+    def _count(self, module, args, kwargs):
+        if not module.training:
+            return
+        labels, input_ids = kwargs.get("labels"), kwargs.get("input_ids")
+        if labels is not None and input_ids is not None:
+            self.step_effective += int((labels != -100).sum())
+            self.step_total += input_ids.numel()
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        self.handle = model.register_forward_pre_hook(self._count, with_kwargs=True)
+
+    def on_step_begin(self, args, state, control, **kwargs):
+        self.step_start = time.perf_counter()
+
+    def on_step_end(self, args, state, control, **kwargs):
+        self.step_times.append(time.perf_counter() - self.step_start)
+        self.data_wait.append(self.step_wait)
+        self.effective_tokens.append(self.step_effective)
+        self.total_tokens.append(self.step_total)
+        self.step_effective = self.step_total = 0
+        self.step_wait = 0.0
+
+    def on_train_end(self, args, state, control, **kwargs):
+        self.handle.remove()
+
+    def summary(self):
+        k = min(self.warmup_steps, max(len(self.step_times) - 1, 0))
+        step_times = np.array(self.step_times[k:])
+        data_wait = np.array(self.data_wait[k:])
+        effective = sum(self.effective_tokens[k:])
+        total = sum(self.total_tokens[k:])
+        elapsed = step_times.sum() + data_wait.sum()
+        return {
+            "measured_steps": len(step_times),
+            "step_time_mean": float(step_times.mean()),
+            "step_time_p50": float(np.percentile(step_times, 50)),
+            "step_time_p90": float(np.percentile(step_times, 90)),
+            "data_wait_mean": float(data_wait.mean()),
+            "data_wait_fraction": float(data_wait.sum() / elapsed),
+            "effective_tokens_per_second": effective / elapsed,
+            "tokens_per_second": total / elapsed,
+            "padding_ratio": 1 - effective / total if total else 0.0,
+            "tokens_per_step": total / len(step_times)
+        }
+
+
+def patch_transformers(args, callback, model_info):
+    """Redirect the script's model, tokenizer, TrainingArguments and Trainer.train to the benchmark setup."""
+    original_init = TrainingArguments.__init__
+    original_train = Trainer.train
+    original_get_batch_samples = Trainer.get_batch_samples
+    original_tokenizer = AutoTokenizer.from_pretrained
+
+    def tiny_model(model_id, *model_args, trust_remote_code=False, **kwargs):
+        config = AutoConfig.from_pretrained(args.config or model_id, trust_remote_code=trust_remote_code)
+        shrink_config(config, args.hidden_size, args.num_layers, args.num_heads)
+        torch.manual_seed(args.seed)
+        model = AutoModelForCausalLM.from_config(config, trust_remote_code=trust_remote_code, dtype=torch.float32)
+        model_info.update(model_id=model_id, architecture=type(model).__name__,
+                          num_parameters=sum(p.numel() for p in model.parameters()))
+        return model
+
+    def tokenizer(model_id, *tokenizer_args, **kwargs):
+        return original_tokenizer(args.tokenizer or model_id, *tokenizer_args, **kwargs)
+
+    def training_arguments_init(self, *training_args, **kwargs):
+        for name in DROPPED_ARGS:
+            kwargs.pop(name, None)
+        kwargs.update(output_dir=tempfile.mkdtemp(prefix="benchmark_"), max_steps=args.steps, use_cpu=True,
+                      eval_strategy="no", save_strategy="no", logging_steps=args.steps + 1, report_to="none",
+                      disable_tqdm=True, seed=args.seed)
+        if args.batch_size:
+            kwargs["per_device_train_batch_size"] = args.batch_size
+        model_info["training_arguments"] = {k: v for k, v in kwargs.items() if isinstance(v, (int, float, str, bool))}
+        original_init(self, *training_args, **kwargs)
+
+    def get_batch_samples(self, *batch_args, **kwargs):
+        start_time = time.perf_counter()
+        result = original_get_batch_samples(self, *batch_args, **kwargs)
+        callback.step_wait += time.perf_counter() - start_time
+        return result
+
+    def train(self, *train_args, **kwargs):
+        self.add_callback(callback)
+        original_train(self, *train_args, **kwargs)
+        # Skip whatever the script does after training (saving, plotting)
+        raise _BenchmarkDone
+
+    AutoModelForCausalLM.from_pretrained = tiny_model
+    AutoTokenizer.from_pretrained = tokenizer
+    TrainingArguments.__init__ = training_arguments_init
+    Trainer.get_batch_samples = get_batch_samples
+    Trainer.train = train
+
+
+def apply_flags(source, overrides):
+    for name, value in overrides.items():
+        source, count = re.subn(rf"^{name}\s*=.*$", f"{name} = {value}", source, flags=re.MULTILINE)
+        if not count:
+            raise ValueError(f"{name} is not a module-level flag of the script")
+    return source
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=TRAIN_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline_file):
+    with open(baseline_file, 'r') as f:
+        baseline = json.load(f)
+    print(f"\ncompared with {baseline_file}:")
+    for key in ("step_time_mean", "data_wait_fraction", "effective_tokens_per_second", "tokens_per_second",
+                "padding_ratio", "peak_rss_mb"):
+        old, new = baseline["metrics"].get(key), result["metrics"][key]
+        change = f"{(new - old) / old:+.1%}" if old else "n/a"
+        print(f"  {key:30s} {old if old is not None else float('nan'):12.4f} -> {new:12.4f} ({change})")
+
+
+def main():
+    args = parse_args()
+    # The script runs in a scratch directory, so resolve user paths first
+    for name in ("output_file", "baseline", "tokenizer", "config"):
+        if getattr(args, name) and os.path.exists(getattr(args, name)):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    script_path = os.path.join(TRAIN_DIR, os.path.basename(args.script))
+    with open(script_path, 'r') as f:
+        source = f.read()
+
+    overrides = {name: value for name, value in BENCHMARK_FLAGS.items()
+                 if re.search(rf"^{name}\s*=", source, flags=re.MULTILINE)}
+    for item in args.set:
+        name, _, value = item.partition("=")
+        overrides[name.strip()] = value.strip()
+    source = apply_flags(source, overrides)
+
+    if args.num_threads:
+        torch.set_num_threads(args.num_threads)
+    rng = random.Random(args.seed)
+    work_dir = tempfile.mkdtemp(prefix="benchmark_data_")
+    data_files = sorted(set(re.findall(r"[\"']([\w\-]+\.jsonl)[\"']", source)))
+    write_data_files(data_files, args.data, args.num_examples, rng, work_dir)
+
+    callback = BenchmarkCallback(args.steps, args.warmup_steps)
+    model_info = {}
+    patch_transformers(args, callback, model_info)
+
+    sys.path.insert(0, TRAIN_DIR)
+    os.chdir(work_dir)
+    start_time = time.perf_counter()
+    try:
+        exec(compile(source, script_path, "exec"), {"__name__": "__main__", "__file__": script_path})
+    except _BenchmarkDone:
+        pass
+    wall_time = time.perf_counter() - start_time
+    os.chdir(TRAIN_DIR)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    metrics = callback.summary()
+    metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    metrics["peak_rss_children_mb"] = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    metrics["wall_time"] = wall_time
+    result = {
+        "script": os.path.basename(script_path),
+        "flags": overrides,
+        "data": args.data,
+        "num_examples": args.num_examples,
+        "steps": args.steps,
+        "warmup_steps": args.warmup_steps,
+        "model": model_info,
+        "metrics": metrics,
+        "environment": {
+            "git_revision": git_revision(),
+            "torch": torch.__version__,
+            "transformers": transformers.__version__,
+            "python": platform.python_version(),
+            "num_threads": torch.get_num_threads()
+        }
+    }
+
+    output_file = args.output_file or os.path.join(
+        TRAIN_DIR, f"benchmark_{os.path.splitext(os.path.basename(script_path))[0]}.json")
+    with open(output_file, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print(f"\n{result['script']} ({model_info.get('architecture')}, {model_info.get('num_parameters', 0) / 1e6:.2f}M "
+          f"params), {metrics['measured_steps']} measured steps:")
+    print(f"  step time        {1000 * metrics['step_time_mean']:.1f} ms (p90 {1000 * metrics['step_time_p90']:.1f} ms)")
+    print(f"  data wait        {1000 * metrics['data_wait_mean']:.1f} ms/step ({metrics['data_wait_fraction']:.1%})")
+    print(f"  throughput       {metrics['effective_tokens_per_second']:.0f} effective tokens/s "
+          f"({metrics['tokens_per_second']:.0f} total, padding ratio {metrics['padding_ratio']:.1%})")
+    print(f"  peak RSS         {metrics['peak_rss_mb']:.0f} MB")
+    print(f"results written to {output_file}")
+    if args.baseline:
+        compare(result, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
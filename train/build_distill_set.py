@@ -0,0 +1,92 @@
+import os
+import json
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from tqdm import tqdm
+
+from common.exec_eval import STEPS_DIR, _init_worker, clean_and_execute
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build a student training set from teacher generations that execute")
+    parser.add_argument('-i', '--input_file', type=str, default='data_train.jsonl',
+                        help='The JSONL file the teacher generated from (generate.py -i)')
+    parser.add_argument('-g', '--generations_dir', type=str, default='../inference/distill_deepseek',
+                        help='generate.py output directory with one {index}.txt per input line')
+    parser.add_argument('-o', '--output_file', type=str, default='data_train_distill.jsonl')
+    parser.add_argument('-r', '--report_file', type=str, default='distill_report.json')
+    parser.add_argument('--reference_fallback', action='store_true',
+                        help='Keep the reference code for inputs whose teacher output is missing or does not run, '
+                             'instead of dropping them')
+    parser.add_argument('--workers', type=int, default=8)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Numbered like generate.py's iter_jsonl: by line, blank lines included, so {index}.txt matches its input
+    with open(args.input_file, 'r') as f_in:
+        examples = {index: json.loads(line) for index, line in enumerate(f_in) if line.strip()}
+
+    generations = {}
+    for index in examples:
+        path = os.path.join(args.generations_dir, f"{index}.txt")
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                generations[index] = f.read()
+    print(f"{len(generations)}/{len(examples)} inputs have a teacher generation in {args.generations_dir}")
+
+    indices = sorted(generations)
+    with ProcessPoolExecutor(args.workers, initializer=_init_worker, initargs=(STEPS_DIR,)) as pool:
+        results = list(tqdm(pool.map(clean_and_execute, [generations[k] for k in indices], chunksize=4),
+                            total=len(indices), desc="execute"))
+    cleaned = {k: code for k, (code, _, _) in zip(indices, results)}
+    executed = {k: code for k, (code, success, _) in zip(indices, results) if success}
+
+    statuses = Counter()
+    num_written = 0
+    with open(args.output_file, 'w') as f_out:
+        for index, example in examples.items():
+            if index in executed:
+                status, target = "teacher", executed[index]
+            elif index not in generations:
+                status, target = "missing", None
+            else:
+                status, target = ("cleaning_failed" if cleaned[index] is None else "execution_failed"), None
+            statuses[status] += 1
+            if target is None and args.reference_fallback:
+                target = example["output"]
+            if target is not None:
+                f_out.write(json.dumps({**example, "output": target}, ensure_ascii=False) + "\n")
+                num_written += 1
+
+    report = {
+        "input_file": args.input_file,
+        "generations_dir": args.generations_dir,
+        "output_file": args.output_file,
+        "num_inputs": len(examples),
+        "num_generations": len(generations),
+        "statuses": dict(statuses),
+        "teacher_exec_rate": len(executed) / max(len(generations), 1),
+        "num_student_examples": num_written,
+        "reference_fallback": args.reference_fallback,
+        "mean_target_chars_teacher": sum(len(code) for code in executed.values()) / max(len(executed), 1),
+        "mean_target_chars_reference": sum(len(examples[k]["output"]) for k in executed) / max(len(executed), 1),
+        "exec_seconds_per_program": sum(seconds for _, _, seconds in results) / max(len(results), 1)
+    }
+    with open(args.report_file, 'w') as f_report:
+        json.dump(report, f_report, indent=2)
+
+    print(f"teacher outputs that run and export an STL: {len(executed)}/{len(generations)} "
+          f"({report['teacher_exec_rate']:.1%})")
+    print(f"{num_written} student examples written to {args.output_file} "
+          f"({statuses['missing']} missing, {statuses['cleaning_failed']} without CadQuery code, "
+          f"{statuses['execution_failed']} failed to run"
+          f"{', replaced by the reference code' if args.reference_fallback else ', dropped'})")
+    print(f"report written to {args.report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import json
+import random
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from tqdm import tqdm
+from transformers import AutoTokenizer
+
+from common.canonical import canonicalize, verify_equivalence
+
+# Tokenizers of the models trained in this directory
+DEFAULT_TOKENIZERS = [
+    "microsoft/CodeGPT-small-py",
+    "openai-community/gpt2-large",
+    "google/gemma-3-1b-it",
+    "Qwen/Qwen2.5-3B-Instruct",
+    "mistralai/Mistral-7B-Instruct-v0.3",
+    "deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct"
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Canonicalize CadQuery training targets and report token savings")
+    parser.add_argument('-i', '--input_file', type=str, default='data_train.jsonl')
+    parser.add_argument('-o', '--output_file', type=str, default='data_train_canonical.jsonl')
+    parser.add_argument('-r', '--report_file', type=str, default='canonical_report.json')
+    parser.add_argument('--tokenizers', type=str, default=','.join(DEFAULT_TOKENIZERS),
+                        help='Comma-separated tokenizers to measure token savings with')
+    parser.add_argument('--max_length', type=int, default=1024,
+                        help='Training length limit, to report how many examples fit before and after')
+    parser.add_argument('--verify_samples', type=int, default=-1,
+                        help='Examples whose original and canonical code are executed and whose meshes are compared '
+                             '(negative: all); only those found identical or equivalent get the canonical target')
+    parser.add_argument('--python', type=str, default='python', help='Interpreter with cadquery installed')
+    parser.add_argument('--timeout', type=int, default=60, help='Seconds per program')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def count_tokens(tokenizer, texts, batch_size=1000):
+    counts = []
+    for start in range(0, len(texts), batch_size):
+        encoded = tokenizer(texts[start:start + batch_size], add_special_tokens=False)
+        counts.extend(len(ids) for ids in encoded["input_ids"])
+    return counts
+
+
+def main():
+    args = parse_args()
+    with open(args.input_file, 'r') as f_in:
+        examples = [json.loads(line) for line in f_in if line.strip()]
+
+    canonical = []
+    for example in tqdm(examples, desc="canonicalize"):
+        try:
+            canonical.append(canonicalize(example["output"]))
+        except (SyntaxError, ValueError, RecursionError):
+            canonical.append(None)
+
+    candidates = [k for k, code in enumerate(canonical) if code is not None]
+    if args.verify_samples < 0:
+        verify = candidates
+    else:
+        verify = sorted(random.Random(args.seed).sample(candidates, min(args.verify_samples, len(candidates))))
+    with ThreadPoolExecutor(args.workers) as pool:
+        statuses = list(tqdm(pool.map(lambda k: verify_equivalence(examples[k]["output"], canonical[k], args.python,
+                                                                    args.timeout), verify),
+                             total=len(verify), desc="verify"))
+    verified = dict(zip(verify, statuses))
+
+    # Keep the original target unless the canonical code was run and produced the same mesh
+    targets = []
+    for k, example in enumerate(examples):
+        accepted = verified.get(k) in ("identical", "equivalent")
+        targets.append(canonical[k] if accepted else example["output"])
+    with open(args.output_file, 'w') as f_out:
+        for example, target in zip(examples, targets):
+            f_out.write(json.dumps({**example, "output": target}, ensure_ascii=False) + "\n")
+
+    originals = [example["output"] for example in examples]
+    prompts = [example["input"] for example in examples]
+    token_report = {}
+    for name in [t for t in args.tokenizers.split(',') if t]:
+        tokenizer = AutoTokenizer.from_pretrained(name, trust_remote_code=True)
+        before, after = count_tokens(tokenizer, originals), count_tokens(tokenizer, targets)
+        prompt_tokens = count_tokens(tokenizer, prompts)
+        token_report[name] = {
+            "target_tokens_before": sum(before),
+            "target_tokens_after": sum(after),
+            "saved_ratio": 1 - sum(after) / max(sum(before), 1),
+            "mean_target_tokens_before": sum(before) / max(len(before), 1),
+            "mean_target_tokens_after": sum(after) / max(len(after), 1),
+            "examples_within_max_length_before": sum(p + b <= args.max_length for p, b in zip(prompt_tokens, before)),
+            "examples_within_max_length_after": sum(p + a <= args.max_length for p, a in zip(prompt_tokens, after))
+        }
+        print(f"{name}: {sum(before)} -> {sum(after)} target tokens "
+              f"({token_report[name]['saved_ratio']:.1%} saved)")
+
+    status_counts = Counter(statuses)
+    report = {
+        "input_file": args.input_file,
+        "output_file": args.output_file,
+        "num_examples": len(examples),
+        "num_unparsable": sum(code is None for code in canonical),
+        "num_unverified": len(candidates) - len(verify),
+        "num_canonical_targets": sum(t != o for t, o in zip(targets, originals)),
+        "chars_before": sum(len(o) for o in originals),
+        "chars_after": sum(len(t) for t in targets),
+        "verification": {
+            "num_verified": len(verify),
+            "statuses": dict(status_counts),
+            "rejected_examples": [k for k, s in verified.items() if s in ("different", "canonical_failed")][:100]
+        },
+        "tokens": token_report
+    }
+    with open(args.report_file, 'w') as f_report:
+        json.dump(report, f_report, indent=2, ensure_ascii=False)
+
+    checked = status_counts["identical"] + status_counts["equivalent"]
+    print(f"{len(examples)} targets: {report['num_canonical_targets']} canonicalized, "
+          f"{report['num_unparsable']} unparsable and {report['num_unverified']} unverified (kept as is)")
+    print(f"mesh check: {checked}/{len(verify)} identical or equivalent, "
+          f"{status_counts['different'] + status_counts['canonical_failed']} rejected, "
+          f"{status_counts['original_failed']} originals do not run")
+    print(f"report written to {args.report_file}")
+
+
+if __name__ == "__main__":
+    main()
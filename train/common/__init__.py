@@ -0,0 +1,37 @@
+# Shared helpers for training scripts
+from .packing import pack_sequences, pack_dataset, PackedDataCollator, check_packed_attention
+from .callbacks import ThroughputCallback, SaveTokenizerCallback
+from .checkpointing import AsyncAdapterCheckpointCallback
+from .evaluation import SubsetEvalTrainer, stratified_subset
+from .exec_eval import ExecutableRateCallback, load_eval_prompts
+from .dataset_cache import load_tokenized_dataset
+from .token_store import TokenStore, MmapTokenDataset, load_token_store
+from .streaming import StreamingJsonlDataset, streaming_max_steps
+from .batching import DynamicPaddingCollator, LengthGroupedTrainer, length_grouping_kwargs, sort_by_length
+from .vocab import add_domain_tokens, init_new_embeddings
+
+__all__ = [
+    'pack_sequences',
+    'pack_dataset',
+    'PackedDataCollator',
+    'check_packed_attention',
+    'ThroughputCallback',
+    'SaveTokenizerCallback',
+    'AsyncAdapterCheckpointCallback',
+    'SubsetEvalTrainer',
+    'stratified_subset',
+    'ExecutableRateCallback',
+    'load_eval_prompts',
+    'load_tokenized_dataset',
+    'TokenStore',
+    'MmapTokenDataset',
+    'load_token_store',
+    'StreamingJsonlDataset',
+    'streaming_max_steps',
+    'DynamicPaddingCollator',
+    'LengthGroupedTrainer',
+    'length_grouping_kwargs',
+    'sort_by_length',
+    'add_domain_tokens',
+    'init_new_embeddings'
+]
@@ -0,0 +1,75 @@
+import numpy as np
+import torch
+from torch.utils.data import Subset
+from transformers import Trainer, TrainingArguments
+from transformers.trainer_pt_utils import LengthGroupedSampler
+
+from .token_store import MmapTokenDataset
+
+
+def length_grouping_kwargs(length_column_name="length"):
+    """TrainingArguments that make the Trainer batch training examples of similar length together.
+
+    Older transformers releases spell this ``group_by_length=True``; newer ones
+    use ``train_sampling_strategy="group_by_length"``.
+    """
+    if "train_sampling_strategy" in TrainingArguments.__dataclass_fields__:
+        return {"train_sampling_strategy": "group_by_length", "length_column_name": length_column_name}
+    return {"group_by_length": True, "length_column_name": length_column_name}
+
+
+class LengthGroupedTrainer(Trainer):
+    """Trainer whose length-grouped sampler takes an ``MmapTokenDataset``'s lengths from the store offsets.
+
+    The stock Trainer only reads lengths from a ``datasets.Dataset`` column
+    and otherwise loads every training example once just to measure it.
+    """
+
+    def _get_train_sampler(self, *args):
+        # Older transformers releases call this without the dataset argument
+        dataset = args[0] if args and args[0] is not None else self.train_dataset
+        grouped = (getattr(self.args, "train_sampling_strategy", None) == "group_by_length"
+                   or getattr(self.args, "group_by_length", False))
+        if grouped and isinstance(dataset, MmapTokenDataset):
+            return LengthGroupedSampler(self.args.train_batch_size * self.args.gradient_accumulation_steps,
+                                        lengths=dataset.lengths.tolist())
+        return super()._get_train_sampler(*args)
+
+
+def sort_by_length(dataset):
+    """Order an evaluation set by example length so consecutive eval batches need little padding."""
+    if isinstance(dataset, MmapTokenDataset):
+        if dataset.rows is not None:
+            return dataset
+        return Subset(dataset, np.argsort(dataset.lengths, kind="stable").tolist())
+    return dataset.sort("length")
+
+
+class DynamicPaddingCollator:
+    """Pad each batch only to its own longest example (rounded up to ``pad_to_multiple_of``).
+
+    Padding goes on the right and is excluded from attention and from the
+    loss. Because padding is tracked through ``attention_mask`` rather than by
+    token id, eos tokens inside examples keep their labels even when the pad
+    token is the eos token.
+    """
+
+    def __init__(self, pad_token_id, pad_to_multiple_of=8):
+        self.pad_token_id = pad_token_id
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        length = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            length = -(-length // self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        batch_size = len(features)
+        input_ids = torch.full((batch_size, length), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((batch_size, length), dtype=torch.long)
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[i, :n] = torch.as_tensor(f["input_ids"], dtype=torch.long)
+            attention_mask[i, :n] = 1
+
+        labels = input_ids.masked_fill(attention_mask == 0, -100)
+        return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
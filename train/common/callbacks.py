@@ -0,0 +1,97 @@
+import os
+import time
+
+from transformers import TrainerCallback
+
+
+class ThroughputCallback(TrainerCallback):
+    """Log effective (supervised, non-padding) tokens per second.
+
+    A forward pre-hook counts ``labels != -100`` on every training forward, so
+    padded and packed runs are measured in the same unit. Counts stay on the
+    device until a log step to avoid a sync per micro-batch. Time spent in
+    evaluation is excluded.
+    """
+
+    def __init__(self):
+        self.handle = None
+        self.effective_tokens = None
+        self.total_tokens = 0
+        self.window_effective = 0
+        self.window_total = 0
+        self.window_start = None
+        self.train_effective = 0
+        self.train_time = 0.0
+
+    def _count(self, module, args, kwargs):
+        if not module.training:
+            return
+        labels = kwargs.get("labels")
+        input_ids = kwargs.get("input_ids")
+        if labels is None or input_ids is None:
+            return
+        count = (labels != -100).sum()
+        self.effective_tokens = count if self.effective_tokens is None else self.effective_tokens + count
+        self.total_tokens += input_ids.numel()
+
+    def _flush(self):
+        if self.effective_tokens is not None:
+            self.window_effective += int(self.effective_tokens.item())
+            self.effective_tokens = None
+        self.window_total += self.total_tokens
+        self.total_tokens = 0
+
+    def on_train_begin(self, args, state, control, model=None, **kwargs):
+        self.handle = model.register_forward_pre_hook(self._count, with_kwargs=True)
+        self.window_start = time.perf_counter()
+
+    def on_evaluate(self, args, state, control, **kwargs):
+        # Restart the window so evaluation time is not counted as training time
+        self._flush()
+        self.window_effective = self.window_total = 0
+        self.window_start = time.perf_counter()
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if logs is None or "loss" not in logs:
+            return
+        self._flush()
+        elapsed = time.perf_counter() - self.window_start
+        if elapsed <= 0 or self.window_total == 0:
+            return
+        tokens_per_second = self.window_effective / elapsed
+        padding_ratio = 1 - self.window_effective / self.window_total
+        self.train_effective += self.window_effective
+        self.train_time += elapsed
+        state.log_history[-1].update(
+            effective_tokens_per_second=round(tokens_per_second, 1),
+            padding_ratio=round(padding_ratio, 4)
+        )
+        print(f"step {state.global_step}: {tokens_per_second:.1f} effective tokens/s, "
+              f"padding ratio {padding_ratio:.1%}")
+        self.window_effective = self.window_total = 0
+        self.window_start = time.perf_counter()
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self.handle is not None:
+            self.handle.remove()
+            self.handle = None
+        if self.train_time > 0:
+            print(f"training throughput: {self.train_effective / self.train_time:.1f} effective tokens/s "
+                  f"over {self.train_effective} supervised tokens")
+
+
+class SaveTokenizerCallback(TrainerCallback):
+    """Write the tokenizer into every checkpoint directory the Trainer saves.
+
+    Needed when the vocabulary was extended: a checkpoint's resized embeddings
+    can only be decoded with the tokenizer they were trained with. Does the
+    same as passing the tokenizer to the Trainer, without depending on that
+    keyword's name in the installed transformers version.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+
+    def on_save(self, args, state, control, **kwargs):
+        if state.is_world_process_zero:
+            self.tokenizer.save_pretrained(os.path.join(args.output_dir, f"checkpoint-{state.global_step}"))
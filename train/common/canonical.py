@@ -0,0 +1,253 @@
+import os
+import ast
+import subprocess
+import tempfile
+
+import numpy as np
+
+# Calls on these modules are treated as pure when inlining constants (math.radians(30), ...)
+PURE_MODULES = {"math"}
+
+
+def _names(tree):
+    """Per-name load and store counts (arguments and global/nonlocal declarations count as stores)."""
+    loads, stores = {}, {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name):
+            counts = loads if isinstance(node.ctx, ast.Load) else stores
+            counts[node.id] = counts.get(node.id, 0) + 1
+        elif isinstance(node, ast.arg):
+            stores[node.arg] = stores.get(node.arg, 0) + 1
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            for name in node.names:
+                stores[name] = stores.get(name, 0) + 2
+    return loads, stores
+
+
+def _imported_names(tree):
+    names = {}
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                names[alias.asname or alias.name.split(".")[0]] = alias.name
+    return names
+
+
+def _is_pure(node, stores, imports):
+    if isinstance(node, ast.Constant):
+        return True
+    if isinstance(node, ast.Name):
+        return stores.get(node.id, 0) == 1 or (node.id in imports and imports[node.id] in PURE_MODULES)
+    if isinstance(node, ast.UnaryOp):
+        return _is_pure(node.operand, stores, imports)
+    if isinstance(node, ast.BinOp):
+        return _is_pure(node.left, stores, imports) and _is_pure(node.right, stores, imports)
+    if isinstance(node, ast.Tuple):
+        return all(_is_pure(e, stores, imports) for e in node.elts)
+    if isinstance(node, ast.Attribute):
+        return isinstance(node.value, ast.Name) and imports.get(node.value.id) in PURE_MODULES
+    if isinstance(node, ast.Call):
+        return (isinstance(node.func, ast.Attribute) and _is_pure(node.func, stores, imports) and not node.keywords
+                and all(_is_pure(a, stores, imports) for a in node.args))
+    return False
+
+
+def _single_target(stmt):
+    if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+        return stmt.targets[0].id
+    return None
+
+
+def _chain_root(node):
+    """The innermost receiver of a method chain ``a.b(...).c(...)``, as (parent, field) so it can be replaced."""
+    parent, field = None, None
+    while True:
+        if isinstance(node, ast.Call):
+            parent, field, node = node, "func", node.func
+        elif isinstance(node, (ast.Attribute, ast.Subscript)):
+            parent, field, node = node, "value", node.value
+        else:
+            return parent, field, node
+
+
+class _Substitute(ast.NodeTransformer):
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+
+    def visit_Name(self, node):
+        if node.id == self.name and isinstance(node.ctx, ast.Load):
+            return ast.copy_location(self.value, node)
+        return node
+
+
+def inline_constants(tree):
+    """Replace module-level constants that are read once with their (pure) value; drop ones never read."""
+    loads, stores = _names(tree)
+    imports = _imported_names(tree)
+    body = []
+    for stmt in tree.body:
+        name = _single_target(stmt)
+        if name and stores.get(name) == 1 and loads.get(name, 0) <= 1 and _is_pure(stmt.value, stores, imports):
+            if loads.get(name, 0) == 0:
+                continue
+            later = ast.Module(body=tree.body[tree.body.index(stmt) + 1:], type_ignores=[])
+            if any(isinstance(n, ast.Name) and n.id == name for n in ast.walk(later)):
+                _Substitute(name, stmt.value).visit(later)
+                continue
+        body.append(stmt)
+    tree.body = body
+    return tree
+
+
+def merge_chains(tree):
+    """Fold ``x = <expr>`` followed by ``y = x.method(...)`` into ``y = <expr>.method(...)``.
+
+    Applies when the second statement reads ``x`` exactly once, as the root of
+    its method chain, and ``x`` is either rebound by it (``x = x.rotate(...)``)
+    or never read anywhere else. The root of a chain is evaluated first, so the
+    evaluation order is unchanged.
+    """
+    changed = True
+    while changed:
+        changed = False
+        loads, stores = _names(tree)
+        for k in range(len(tree.body) - 1):
+            first, second = tree.body[k], tree.body[k + 1]
+            name, target = _single_target(first), _single_target(second)
+            if not name or not target:
+                continue
+            parent, field, root = _chain_root(second.value)
+            if parent is None or not isinstance(root, ast.Name) or root.id != name:
+                continue
+            uses = sum(isinstance(n, ast.Name) and n.id == name for n in ast.walk(second.value))
+            if uses != 1 or not (target == name or (loads.get(name) == 1 and stores.get(name) == 1)):
+                continue
+            setattr(parent, field, first.value)
+            tree.body[k:k + 2] = [second]
+            changed = True
+            break
+    return tree
+
+
+def drop_unused_imports(tree):
+    loads, _ = _names(tree)
+    body = []
+    for stmt in tree.body:
+        if isinstance(stmt, (ast.Import, ast.ImportFrom)) and getattr(stmt, "module", None) != "__future__":
+            stmt.names = [a for a in stmt.names if a.name == "*" or loads.get(a.asname or a.name.split(".")[0])]
+            if not stmt.names:
+                continue
+        body.append(stmt)
+    tree.body = body
+    return tree
+
+
+def canonicalize(code):
+    """Shorter, equivalent CadQuery code: no comments, normalized layout, redundant assignments collapsed.
+
+    Float literals are kept exactly, since rounding would change the geometry.
+    Raises ``SyntaxError`` if ``code`` does not parse.
+    """
+    tree = ast.parse(code)
+    tree = inline_constants(tree)
+    tree = merge_chains(tree)
+    tree = drop_unused_imports(tree)
+    return ast.unparse(ast.fix_missing_locations(tree)) + "\n"
+
+
+class _RedirectExports(ast.NodeTransformer):
+    def __init__(self, filename):
+        self.filename = filename
+        self.count = 0
+
+    def visit_Call(self, node):
+        self.generic_visit(node)
+        name = node.func.attr if isinstance(node.func, ast.Attribute) else getattr(node.func, "id", None)
+        position = {"export": 1, "exportStl": 0}.get(name)
+        if position is not None and len(node.args) > position:
+            node.args[position] = ast.Constant(self.filename)
+            self.count += 1
+        return node
+
+
+def redirect_exports(code, filename):
+    """``code`` with every STL export writing to ``filename``; None if it exports nothing."""
+    transformer = _RedirectExports(filename)
+    tree = transformer.visit(ast.parse(code))
+    return ast.unparse(ast.fix_missing_locations(tree)) if transformer.count else None
+
+
+def read_stl(path):
+    """Triangles of a binary or ASCII STL file, shape (n, 3, 3)."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    count = int.from_bytes(data[80:84], "little") if len(data) >= 84 else 0
+    if len(data) == 84 + 50 * count:
+        record = np.dtype([("normal", "<f4", 3), ("vertices", "<f4", (3, 3)), ("attribute", "<u2")])
+        return np.frombuffer(data, dtype=record, count=count, offset=84)["vertices"].astype(np.float64)
+    values = [line.split()[1:] for line in data.decode("ascii", "replace").splitlines()
+              if line.strip().startswith("vertex")]
+    return np.array(values, dtype=np.float64).reshape(-1, 3, 3)
+
+
+def mesh_properties(triangles):
+    v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    cross = np.cross(v1 - v0, v2 - v0)
+    return {
+        "volume": float(np.einsum("ij,ij->i", v0, np.cross(v1, v2)).sum() / 6),
+        "area": float(np.linalg.norm(cross, axis=1).sum() / 2),
+        "bbox": np.concatenate([triangles.reshape(-1, 3).min(0), triangles.reshape(-1, 3).max(0)]).tolist()
+    }
+
+
+def compare_meshes(a, b, rtol=1e-5):
+    """'identical' if the triangle sets match, 'equivalent' if volume, area and bounds agree, else 'different'."""
+    if a.shape == b.shape:
+        order_a = np.lexsort(a.reshape(len(a), -1).T)
+        order_b = np.lexsort(b.reshape(len(b), -1).T)
+        if np.allclose(a[order_a], b[order_b], rtol=0, atol=1e-6):
+            return "identical"
+    pa, pb = mesh_properties(a), mesh_properties(b)
+    scale = max(np.ptp(np.array(pa["bbox"]).reshape(2, 3), axis=0).max(), 1e-9)
+    if (np.isclose(pa["volume"], pb["volume"], rtol=rtol, atol=rtol * scale ** 3)
+            and np.isclose(pa["area"], pb["area"], rtol=rtol, atol=rtol * scale ** 2)
+            and np.allclose(pa["bbox"], pb["bbox"], rtol=0, atol=rtol * scale)):
+        return "equivalent"
+    return "different"
+
+
+def _run(code, work_dir, name, python, timeout):
+    script = os.path.join(work_dir, f"{name}.py")
+    with open(script, 'w') as f:
+        f.write(code)
+    try:
+        result = subprocess.run([python, script], cwd=work_dir, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return None
+    stl_path = os.path.join(work_dir, f"{name}.stl")
+    if result.returncode != 0 or not os.path.exists(stl_path):
+        return None
+    return read_stl(stl_path)
+
+
+def verify_equivalence(original, canonical, python="python", timeout=60):
+    """Execute both programs and compare their exported meshes.
+
+    Returns one of 'identical', 'equivalent', 'different', 'canonical_failed'
+    or 'original_failed' (the original itself does not run or export).
+    """
+    original = redirect_exports(original, "original.stl")
+    canonical = redirect_exports(canonical, "canonical.stl")
+    if original is None:
+        return "original_failed"
+    if canonical is None:
+        return "canonical_failed"
+    with tempfile.TemporaryDirectory() as work_dir:
+        reference = _run(original, work_dir, "original", python, timeout)
+        if reference is None:
+            return "original_failed"
+        candidate = _run(canonical, work_dir, "canonical", python, timeout)
+        if candidate is None:
+            return "canonical_failed"
+        return compare_meshes(reference, candidate)
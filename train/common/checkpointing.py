@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import queue
+import shutil
+import threading
+
+import torch
+from safetensors.torch import save_file, load_file
+from transformers import TrainerCallback
+
+
+def _to_cpu(obj):
+    if isinstance(obj, torch.Tensor):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: _to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(_to_cpu(v) for v in obj)
+    return obj
+
+
+class AsyncAdapterCheckpointCallback(TrainerCallback):
+    """Checkpoint only the LoRA adapter, writing to disk from a background thread.
+
+    Use with ``save_strategy="no"`` so the Trainer itself never blocks on a
+    save. Every ``save_steps`` steps the adapter weights are copied into
+    pinned CPU buffers, which are allocated once and reused. The training
+    thread is blocked only for that device-to-host copy. A writer thread then
+    saves ``checkpoint-<step>/`` in the usual PEFT layout
+    (``adapter_model.safetensors`` + ``adapter_config.json``). Older
+    checkpoints beyond ``save_total_limit`` are removed.
+
+    Best-model tracking replaces ``load_best_model_at_end``: after each
+    evaluation where ``metric_for_best_model`` improves, the adapter is also
+    written to ``best/``, and at the end of training the best weights are
+    loaded back into the model.
+    """
+
+    def __init__(self, output_dir, save_steps=None, save_optimizer=False, metric_for_best_model="eval_loss",
+                 greater_is_better=False, save_total_limit=None):
+        self.output_dir = output_dir
+        self.save_steps = save_steps
+        self.save_optimizer = save_optimizer
+        self.metric_for_best_model = metric_for_best_model
+        self.greater_is_better = greater_is_better
+        self.save_total_limit = save_total_limit
+
+        self.buffers = None
+        self.optimizer_state = None
+        self.peft_config = None
+        self.snapshot_step = None
+        self.best_metric = None
+        self.best_step = None
+        self.saved_checkpoints = []
+        self.stall_times = []
+        self.write_times = []
+
+        self.jobs = queue.Queue()
+        self.writer = threading.Thread(target=self._write_loop, daemon=True)
+        self.writer.start()
+
+    def _snapshot(self, model, optimizer, step):
+        """Copy the adapter (and optionally optimizer state) to host memory; returns the time spent."""
+        if self.snapshot_step == step:
+            return 0.0
+        start_time = time.perf_counter()
+        # The writer may still be reading the previous snapshot from the buffers
+        self.jobs.join()
+        from peft import get_peft_model_state_dict
+
+        state_dict = get_peft_model_state_dict(model)
+        if self.buffers is None:
+            pin = torch.cuda.is_available()
+            self.buffers = {
+                name: torch.empty(t.shape, dtype=t.dtype, device="cpu", pin_memory=pin)
+                for name, t in state_dict.items()
+            }
+        for name, t in state_dict.items():
+            self.buffers[name].copy_(t.detach(), non_blocking=True)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        self.optimizer_state = _to_cpu(optimizer.state_dict()) if self.save_optimizer and optimizer else None
+        self.peft_config = model.peft_config[model.active_adapter]
+        self.snapshot_step = step
+
+        stall = time.perf_counter() - start_time
+        self.stall_times.append(stall)
+        return stall
+
+    def _enqueue(self, name, step, metrics=None):
+        self.jobs.put((name, step, metrics))
+
+    def _write_loop(self):
+        while True:
+            name, step, metrics = self.jobs.get()
+            try:
+                start_time = time.perf_counter()
+                path = os.path.join(self.output_dir, name)
+                tmp_path = f"{path}.tmp"
+                if os.path.exists(tmp_path):
+                    shutil.rmtree(tmp_path)
+                os.makedirs(tmp_path)
+                save_file({k: v.contiguous() for k, v in self.buffers.items()},
+                          os.path.join(tmp_path, "adapter_model.safetensors"))
+                self.peft_config.save_pretrained(tmp_path)
+                if self.optimizer_state is not None:
+                    torch.save(self.optimizer_state, os.path.join(tmp_path, "optimizer.pt"))
+                with open(os.path.join(tmp_path, "checkpoint_info.json"), "w") as f:
+                    json.dump({"global_step": step, "metrics": metrics}, f, indent=2)
+                if os.path.exists(path):
+                    shutil.rmtree(path)
+                os.replace(tmp_path, path)
+                self.write_times.append(time.perf_counter() - start_time)
+
+                if name.startswith("checkpoint-"):
+                    self.saved_checkpoints.append(path)
+                    while self.save_total_limit and len(self.saved_checkpoints) > self.save_total_limit:
+                        shutil.rmtree(self.saved_checkpoints.pop(0), ignore_errors=True)
+            except Exception as e:
+                print(f"async checkpoint {name} failed: {e}")
+            finally:
+                self.jobs.task_done()
+
+    def on_step_end(self, args, state, control, model=None, optimizer=None, **kwargs):
+        if self.save_steps and state.global_step % self.save_steps == 0:
+            self._snapshot(model, optimizer, state.global_step)
+            self._enqueue(f"checkpoint-{state.global_step}", state.global_step)
+
+    def on_evaluate(self, args, state, control, model=None, metrics=None, **kwargs):
+        if not metrics or self.metric_for_best_model not in metrics:
+            return
+        metric = metrics[self.metric_for_best_model]
+        improved = self.best_metric is None or (
+            metric > self.best_metric if self.greater_is_better else metric < self.best_metric
+        )
+        if not improved:
+            return
+        self.best_metric, self.best_step = metric, state.global_step
+        self._snapshot(model, kwargs.get("optimizer"), state.global_step)
+        self._enqueue("best", state.global_step, metrics)
+
+    def on_train_end(self, args, state, control, model=None, **kwargs):
+        self.jobs.join()
+        best_path = os.path.join(self.output_dir, "best", "adapter_model.safetensors")
+        if self.best_step is not None and os.path.exists(best_path):
+            from peft import set_peft_model_state_dict
+
+            set_peft_model_state_dict(model, load_file(best_path, device=str(model.device)))
+            print(f"loaded best adapter from step {self.best_step} "
+                  f"({self.metric_for_best_model}={self.best_metric:.4f})")
+        if self.stall_times:
+            print(f"async checkpoints: {len(self.write_times)} written, training thread blocked "
+                  f"{1000 * sum(self.stall_times) / len(self.stall_times):.1f} ms per snapshot vs "
+                  f"{1000 * sum(self.write_times) / max(len(self.write_times), 1):.1f} ms per write in the background")
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import shutil
+import hashlib
+
+from datasets import load_dataset, load_from_disk
+
+DEFAULT_CACHE_DIR = "./tokenized_cache"
+INFERENCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "inference")
+
+# Fixed text whose encoding captures tokenizer behaviour not visible in the vocab (bos/eos insertion, normalization)
+_PROBE = "import cadquery as cq\nresult = cq.Workplane(\"XY\").box(10, 10, 10)"
+
+
+def file_hash(path, chunk_size=1 << 20):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def tokenizer_hash(tokenizer):
+    """Identity of a tokenizer: class, vocab, special tokens and the encoding of a probe string."""
+    payload = json.dumps({
+        "class": type(tokenizer).__name__,
+        "vocab": sorted(tokenizer.get_vocab().items()),
+        "special_tokens": tokenizer.special_tokens_map,
+        "probe": tokenizer(_PROBE)["input_ids"],
+    }, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def number_normalizer():
+    """``normalize_numbers`` from inference/generation, so training prompts match what InferenceStep sends."""
+    if INFERENCE_DIR not in sys.path:
+        sys.path.insert(0, INFERENCE_DIR)
+    from generation.number_words import normalize_numbers
+    return normalize_numbers
+
+
+def dataset_key(data_file, tokenizer, template, max_length, normalize_numbers=False):
+    fields = {
+        "source": file_hash(data_file),
+        "tokenizer": tokenizer_hash(tokenizer),
+        "template": template,
+        "max_length": max_length,
+    }
+    if normalize_numbers:
+        fields["normalize_numbers"] = True
+    payload = json.dumps(fields, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def load_tokenized_dataset(data_file, tokenizer, template, max_length=1024, cache_dir=DEFAULT_CACHE_DIR,
+                           num_proc=None, normalize_numbers=False):
+    """Tokenize a prompt/completion JSONL file once and cache the result.
+
+    ``template`` is formatted with ``input``, ``output`` and ``eos``. Every
+    example is tokenized exactly once, without padding, in batched
+    multi-process mode. ``input_ids``, ``attention_mask`` and ``length`` are
+    stored together and examples longer than ``max_length`` are dropped. The
+    result is saved under a key derived from the source file contents, the
+    tokenizer identity, the template and ``max_length``, so every script with
+    the same tokenizer and template reuses it, and later launches memory-map it
+    from disk.
+
+    With ``normalize_numbers`` spelled-out numbers in the ``input``
+    descriptions ("zero point one one four nine") are replaced by numeric
+    literals before tokenizing. Set ``NORMALIZE_NUMBERS`` in the inference
+    config for models trained this way.
+    """
+    key = dataset_key(data_file, tokenizer, template, max_length, normalize_numbers)
+    path = os.path.join(cache_dir, key[:16])
+    if os.path.exists(os.path.join(path, "dataset_info.json")):
+        dataset = load_from_disk(path)
+        print(f"loaded tokenized {data_file} from {path}: {len(dataset)} samples")
+        return dataset
+
+    raw = load_dataset("json", data_files=data_file, split="train")
+    eos = tokenizer.eos_token
+    normalize = number_normalizer() if normalize_numbers else (lambda text: text)
+
+    def tokenize(batch):
+        prompts = [template.format(input=normalize(i), output=o, eos=eos)
+                   for i, o in zip(batch["input"], batch["output"])]
+        tokens = tokenizer(prompts, truncation=False)
+        tokens["length"] = [len(ids) for ids in tokens["input_ids"]]
+        return tokens
+
+    num_proc = num_proc or min(8, os.cpu_count() or 1)
+    dataset = raw.map(tokenize, batched=True, num_proc=num_proc, remove_columns=raw.column_names,
+                      desc=f"tokenizing {os.path.basename(data_file)}")
+    dataset = dataset.filter(lambda lengths: [n <= max_length for n in lengths], input_columns="length",
+                             batched=True, num_proc=num_proc)
+    print(f"tokenized {data_file}: {len(dataset)}/{len(raw)} samples within {max_length} tokens")
+
+    # Write next to the final location and rename, so an interrupted build is never loaded
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    dataset.save_to_disk(tmp_path)
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+    return load_from_disk(path)
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+
+import datasets
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Dataset, Subset
+from transformers import TrainerCallback
+
+from .batching import LengthGroupedTrainer
+from .packing import pack_dataset, block_causal_mask
+from .token_store import MmapTokenDataset
+
+
+def example_lengths(dataset):
+    """Token count of every item in a tokenized, packed or token-store dataset."""
+    if isinstance(dataset, Subset):
+        return np.asarray(example_lengths(dataset.dataset))[dataset.indices]
+    if isinstance(dataset, MmapTokenDataset):
+        return dataset.lengths
+    if "length" in dataset.column_names:
+        return np.asarray(dataset["length"])
+    return np.array([len(ids) for ids in dataset["input_ids"]])
+
+
+def stratified_subset(lengths, size, num_strata=8, seed=0):
+    """Sorted indices of a fixed random subset whose length distribution follows the full set.
+
+    Examples are split into ``num_strata`` equal-sized length quantiles and
+    each quantile contributes in proportion to its size, so the subset loss is
+    not skewed towards short or long examples.
+    """
+    lengths = np.asarray(lengths)
+    if size >= len(lengths):
+        return np.arange(len(lengths))
+    strata = np.array_split(np.argsort(lengths, kind="stable"), num_strata)
+    quotas = np.array([len(s) for s in strata]) * size / len(lengths)
+    counts = np.floor(quotas).astype(int)
+    counts[np.argsort(counts - quotas, kind="stable")[:size - counts.sum()]] += 1
+    rng = np.random.RandomState(seed)
+    return np.sort(np.concatenate([rng.choice(s, c, replace=False) for s, c in zip(strata, counts)]))
+
+
+def select_examples(dataset, indices):
+    if hasattr(dataset, "select"):
+        return dataset.select(indices)
+    return Subset(dataset, indices.tolist())
+
+
+def _unpack(dataset):
+    """The original examples of a ``pack_dataset`` row set, split where ``position_ids`` restart."""
+    sequences = []
+    for ids, positions in zip(dataset["input_ids"], dataset["position_ids"]):
+        starts = [k for k, position in enumerate(positions) if position == 0] + [len(ids)]
+        sequences.extend(ids[a:b] for a, b in zip(starts, starts[1:]))
+    return sequences
+
+
+def stratified_eval_subset(dataset, size, seed=0):
+    """``stratified_subset`` of a validation set, drawn over examples rather than packed rows.
+
+    Packed rows are almost all close to the pack length, so for a packed set
+    the examples are stratified before packing and the chosen ones packed
+    again. Returns the subset, the number of examples in it and the number of
+    examples in ``dataset``.
+    """
+    if isinstance(dataset, MmapTokenDataset) and dataset.rows is not None:
+        indices = stratified_subset(dataset.store.lengths[dataset.indices], size, seed=seed)
+        subset = MmapTokenDataset(dataset.store, dataset.pack_length, dataset.indices[indices])
+        return subset, len(indices), len(dataset.indices)
+    if isinstance(dataset, datasets.Dataset) and "position_ids" in dataset.column_names:
+        sequences = _unpack(dataset)
+        indices = stratified_subset([len(ids) for ids in sequences], size, seed=seed)
+        pack_length = max(len(ids) for ids in dataset["input_ids"])
+        subset = datasets.Dataset.from_dict({"input_ids": [sequences[k] for k in indices]})
+        return pack_dataset(subset, max_length=pack_length), len(indices), len(sequences)
+    indices = stratified_subset(example_lengths(dataset), size, seed=seed)
+    return select_examples(dataset, indices), len(indices), len(dataset)
+
+
+class _CachedBatches(Dataset):
+    """Example indices whose batches are served from collated eval batches cached in host memory.
+
+    Served through a regular batched ``DataLoader`` (prepared like the
+    Trainer's own) so the loss of a short last batch is weighted by its size.
+    A batch of indices that is not exactly one cached batch is collated from
+    ``dataset`` as usual.
+    """
+
+    def __init__(self, batches, batch_size, dataset, collate_fn, mask_dtype=None):
+        self.batches = batches
+        self.batch_size = batch_size
+        self.dataset = dataset
+        self.collate_fn = collate_fn
+        self.mask_dtype = mask_dtype
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        return index
+
+    def collate(self, indices):
+        start = indices[0]
+        if start % self.batch_size or list(indices) != list(range(start, min(start + self.batch_size, len(self)))):
+            return self.collate_fn([self.dataset[k] for k in indices])
+        batch = self.batches[start // self.batch_size]
+        if self.mask_dtype is not None:
+            batch = dict(batch, attention_mask=block_causal_mask(batch["position_ids"], self.mask_dtype))
+        return batch
+
+
+class _FullEvalAtEpochEnd(TrainerCallback):
+    def __init__(self, trainer):
+        self.trainer = trainer
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        self.trainer.full_eval_pending = True
+        control.should_evaluate = True
+
+
+class SubsetEvalTrainer(LengthGroupedTrainer):
+    """Trainer that evaluates on a small fixed validation subset during training.
+
+    Evaluations triggered by ``eval_strategy`` run on a deterministic,
+    length-stratified subset of ``eval_subset_size`` examples and report
+    ``eval_loss`` as usual, so best-model tracking sees one consistent series.
+    At every epoch end the full validation set is evaluated as well and logged
+    with the ``eval_full_`` prefix. Each pair of subset and full losses is
+    appended to ``<output_dir>/eval_subset_tracking.json``.
+
+    For a packed validation set the subset is stratified over the examples
+    and packed again (see ``stratified_eval_subset``).
+
+    Collated subset batches are cached in host memory the first time the
+    subset is evaluated and reused afterwards. A 4D attention mask is not
+    cached but rebuilt from ``position_ids`` for each batch; the full set is
+    collated anew at every epoch end. ``evaluate()`` outside of training, or
+    with an explicit dataset, behaves like the plain Trainer.
+    """
+
+    def __init__(self, *args, eval_subset_size=512, eval_subset_seed=0, cache_eval_batches=True, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.eval_subset, self.eval_subset_examples, self.eval_examples = stratified_eval_subset(
+            self.eval_dataset, eval_subset_size, eval_subset_seed
+        )
+        self.cache_eval_batches = cache_eval_batches
+        self.full_eval_pending = False
+        self.eval_tracking = []
+        self._eval_batch_cache = None
+        self._last_subset_eval = None
+        self.add_callback(_FullEvalAtEpochEnd(self))
+        print(f"evaluating on {self.eval_subset_examples} of {self.eval_examples} validation examples "
+              f"during training, full set at epoch ends")
+
+    def get_eval_dataloader(self, eval_dataset=None):
+        if not self.cache_eval_batches or eval_dataset is not self.eval_subset:
+            return super().get_eval_dataloader(eval_dataset)
+
+        batch_size = self.args.eval_batch_size
+        if self._eval_batch_cache is None:
+            start_time = time.perf_counter()
+            pin = self.args.dataloader_pin_memory and torch.cuda.is_available()
+            # The Trainer's loader has the unused columns removed; collate its dataset in order, unsharded
+            loader = super().get_eval_dataloader(eval_dataset)
+            batches, mask_dtype = [], None
+            for batch in DataLoader(loader.dataset, batch_size=batch_size, collate_fn=loader.collate_fn):
+                mask = batch.get("attention_mask")
+                if mask is not None and mask.dim() == 4 and "position_ids" in batch:
+                    # (B, 1, L, L) per batch; rebuilt from position_ids when the batch is used
+                    mask_dtype = mask.dtype
+                    batch = {k: v for k, v in batch.items() if k != "attention_mask"}
+                batches.append({k: (v.cpu().pin_memory() if pin else v.cpu()) if torch.is_tensor(v) else v
+                                for k, v in batch.items()})
+            self._eval_batch_cache = _CachedBatches(batches, batch_size, loader.dataset, loader.collate_fn, mask_dtype)
+            print(f"cached {len(batches)} collated eval batches ({len(eval_dataset)} items) "
+                  f"in {time.perf_counter() - start_time:.1f}s")
+        cached = self._eval_batch_cache
+        return self.accelerator.prepare(DataLoader(cached, batch_size=batch_size, collate_fn=cached.collate))
+
+    def evaluate(self, eval_dataset=None, ignore_keys=None, metric_key_prefix="eval"):
+        if eval_dataset is not None or not self.is_in_train:
+            return super().evaluate(eval_dataset, ignore_keys, metric_key_prefix)
+
+        step = self.state.global_step
+        if self._last_subset_eval is not None and self._last_subset_eval[0] == step:
+            # The epoch ended on an eval step; the subset has already been evaluated at this step
+            metrics = self._last_subset_eval[1]
+        else:
+            metrics = super().evaluate(self.eval_subset, ignore_keys, metric_key_prefix)
+            self._last_subset_eval = (step, metrics)
+
+        if self.full_eval_pending:
+            self.full_eval_pending = False
+            full_metrics = super().evaluate(self.eval_dataset, ignore_keys, f"{metric_key_prefix}_full")
+            self._track(metrics, full_metrics, metric_key_prefix)
+            metrics = {**metrics, **full_metrics}
+        return metrics
+
+    def _track(self, metrics, full_metrics, prefix):
+        subset_loss = metrics[f"{prefix}_loss"]
+        full_loss = full_metrics[f"{prefix}_full_loss"]
+        self.eval_tracking.append({
+            "step": self.state.global_step,
+            "epoch": self.state.epoch,
+            "subset_loss": subset_loss,
+            "full_loss": full_loss,
+            "relative_difference": (subset_loss - full_loss) / full_loss,
+            "subset_runtime": metrics.get(f"{prefix}_runtime"),
+            "full_runtime": full_metrics.get(f"{prefix}_full_runtime")
+        })
+        print(f"step {self.state.global_step}: subset {prefix}_loss {subset_loss:.4f} vs full {full_loss:.4f} "
+              f"({(subset_loss - full_loss) / full_loss:+.2%})")
+
+        # Fraction of pairs of evaluations that the subset and the full set order the same way
+        pairs = [(a, b) for i, a in enumerate(self.eval_tracking) for b in self.eval_tracking[i + 1:]]
+        concordant = sum((a["subset_loss"] - b["subset_loss"]) * (a["full_loss"] - b["full_loss"]) > 0 for a, b in pairs)
+        differences = [abs(r["relative_difference"]) for r in self.eval_tracking]
+        report = {
+            "subset_size": self.eval_subset_examples,
+            "full_size": self.eval_examples,
+            "mean_abs_relative_difference": float(np.mean(differences)),
+            "max_abs_relative_difference": float(np.max(differences)),
+            "rank_agreement": concordant / len(pairs) if pairs else None,
+            "evaluations": self.eval_tracking
+        }
+        os.makedirs(self.args.output_dir, exist_ok=True)
+        with open(os.path.join(self.args.output_dir, "eval_subset_tracking.json"), "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,163 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import tempfile
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import torch
+from transformers import TrainerCallback
+
+from .dataset_cache import number_normalizer
+
+STEPS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "inference", "steps")
+
+
+def load_eval_prompts(data_file, num_prompts=32, seed=0, normalize_numbers=False):
+    """A fixed random sample of ``input`` descriptions from a prompt/completion JSONL file."""
+    with open(data_file, 'r') as f:
+        inputs = [json.loads(line)["input"] for line in f if line.strip()]
+    inputs = random.Random(seed).sample(inputs, min(num_prompts, len(inputs)))
+    if normalize_numbers:
+        normalize = number_normalizer()
+        inputs = [normalize(text) for text in inputs]
+    return inputs
+
+
+def _init_worker(steps_dir):
+    # Import the two step modules directly; the steps package also pulls in inference/rendering dependencies
+    sys.path.insert(0, steps_dir)
+
+
+def clean_and_execute(completion):
+    """Clean and run one generated program the same way the inference pipeline does.
+
+    Needs ``inference/steps`` on ``sys.path`` (see ``_init_worker``).
+
+    Returns:
+        (cleaned code or None, whether it ran and exported an STL, seconds taken)
+    """
+    from code_cleaning_step import CodeCleaningStep
+    from code_execution_step import CodeExecutionStep
+
+    start_time = time.perf_counter()
+    with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(io.StringIO()):
+        code = CodeCleaningStep().run(completion, "output.stl")
+        success = code is not None and CodeExecutionStep(output_dir).run(code, "output.stl") is not None
+    return code, success, time.perf_counter() - start_time
+
+
+def _execute(completion):
+    _, success, seconds = clean_and_execute(completion)
+    return success, seconds
+
+
+class ExecutableRateCallback(TrainerCallback):
+    """Measure at evaluation time how many greedy generations run and export an STL.
+
+    At the first evaluation at least ``eval_steps`` steps after the previous
+    round, the model greedily generates code for the fixed ``prompts``,
+    ``batch_size`` prompts per ``generate`` call. Generation runs on the
+    trainer thread with the live weights, so training waits for it; the wait
+    is logged as ``exec_stall_seconds`` and the total is printed at the end of
+    training. Only execution is off the critical path: each completion goes
+    to a process pool that runs ``CodeCleaningStep`` and ``CodeExecutionStep``
+    from ``inference/steps`` while training continues. When all programs of
+    a round have finished, the next log step gets ``exec_success_rate``,
+    ``exec_seconds_per_program``, ``exec_stall_seconds`` and ``exec_step``
+    (the step whose weights were evaluated). A new round only starts once the
+    previous one has been logged. Lower ``max_new_tokens`` or the number of
+    prompts to shorten the stall.
+
+    ``template`` is the training template; the prompt is everything before
+    ``{output}``, so generations see the same prefix the model was trained on.
+
+    The pool forks all its workers when the callback is created, because the
+    training scripts have no ``__main__`` guard and spawned workers would run
+    them again. Create the callback before the model is loaded: forking a
+    process that already holds CUDA state or other threads (such as the
+    checkpoint writer) can deadlock the workers.
+    """
+
+    def __init__(self, tokenizer, prompts, template, eval_steps=200, batch_size=4, max_new_tokens=512,
+                 num_workers=4):
+        if torch.cuda.is_initialized():
+            raise RuntimeError("ExecutableRateCallback forks its worker pool and must be created before CUDA is "
+                               "initialized, i.e. before the model is loaded")
+        self.tokenizer = tokenizer
+        self.prompts = [template[:template.index("{output}")].format(input=p).rstrip() for p in prompts]
+        self.eval_steps = eval_steps
+        self.batch_size = batch_size
+        self.max_new_tokens = max_new_tokens
+
+        # With the fork context the pool starts every worker on the first submit
+        self.pool = ProcessPoolExecutor(num_workers, mp_context=multiprocessing.get_context("fork"),
+                                        initializer=_init_worker, initargs=(STEPS_DIR,))
+        self.pool.submit(os.getpid).result()
+        self.round = None
+        self.last_step = 0
+        self.history = []
+        self.stall_seconds = 0.0
+
+    @torch.no_grad()
+    def _generate(self, model):
+        was_training, padding_side = model.training, self.tokenizer.padding_side
+        model.eval()
+        # Batched generation needs left padding; the tokenizer's own setting is restored afterwards
+        self.tokenizer.padding_side = "left"
+        completions = []
+        for k in range(0, len(self.prompts), self.batch_size):
+            inputs = self.tokenizer(self.prompts[k:k + self.batch_size], return_tensors="pt",
+                                    padding=True).to(model.device)
+            outputs = model.generate(**inputs, max_new_tokens=self.max_new_tokens, do_sample=False,
+                                     pad_token_id=self.tokenizer.pad_token_id)
+            completions.extend(self.tokenizer.batch_decode(outputs[:, inputs["input_ids"].shape[1]:],
+                                                           skip_special_tokens=True))
+        self.tokenizer.padding_side = padding_side
+        if was_training:
+            model.train()
+        return completions
+
+    def on_evaluate(self, args, state, control, model=None, **kwargs):
+        if self.round is not None or state.global_step - self.last_step < self.eval_steps:
+            return
+        self.last_step = state.global_step
+        start_time = time.perf_counter()
+        completions = self._generate(model)
+        futures = [self.pool.submit(_execute, completion) for completion in completions]
+        stall = time.perf_counter() - start_time
+        self.stall_seconds += stall
+        self.round = {"step": state.global_step, "stall": stall, "futures": futures}
+
+    def _finish_round(self):
+        results = [future.result() for future in self.round["futures"]]
+        metrics = {
+            "exec_step": self.round["step"],
+            "exec_success_rate": round(sum(success for success, _ in results) / len(results), 4),
+            "exec_seconds_per_program": round(sum(seconds for _, seconds in results) / len(results), 3),
+            "exec_stall_seconds": round(self.round["stall"], 2)
+        }
+        self.history.append(metrics)
+        self.round = None
+        print(f"step {metrics['exec_step']}: {metrics['exec_success_rate']:.1%} of {len(results)} generated "
+              f"programs ran and exported an STL ({metrics['exec_seconds_per_program']:.2f}s per program, "
+              f"training stalled {metrics['exec_stall_seconds']:.1f}s for generation)")
+        return metrics
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        if self.round is None:
+            return
+        if all(future.done() for future in self.round["futures"]):
+            state.log_history[-1].update(self._finish_round())
+
+    def on_train_end(self, args, state, control, **kwargs):
+        if self.round is not None:
+            state.log_history.append(self._finish_round())
+        print(f"executable-rate evaluation stalled training for {self.stall_seconds:.1f}s over "
+              f"{len(self.history)} rounds")
+        self.pool.shutdown()
+        self.pool = None
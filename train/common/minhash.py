@@ -0,0 +1,118 @@
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+_NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+
+
+def shingles(text, ngram=5, mask_numbers=False):
+    """Hashed word n-grams of ``text``; with ``mask_numbers`` dimensions do not distinguish documents."""
+    if mask_numbers:
+        text = _NUMBER_PATTERN.sub("0", text)
+    tokens = _TOKEN_PATTERN.findall(text)
+    if len(tokens) < ngram:
+        tokens = tokens + [""] * (ngram - len(tokens))
+    grams = {" ".join(tokens[i:i + ngram]) for i in range(len(tokens) - ngram + 1)}
+    return np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64, count=len(grams))
+
+
+class MinHasher:
+    """MinHash signatures from universal hashing ``(a * x + b) mod p`` of 32-bit shingle hashes."""
+
+    def __init__(self, num_perm=128, seed=0):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, np.iinfo(np.int32).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+        self.b = rng.randint(0, np.iinfo(np.int32).max, size=num_perm, dtype=np.int64).astype(np.uint64)
+
+    def signature(self, hashed_shingles):
+        values = (np.outer(self.a, hashed_shingles) + self.b[:, None]) % _MERSENNE_PRIME
+        return (values & _MAX_HASH).min(axis=1).astype(np.uint32)
+
+
+def lsh_params(threshold, num_perm):
+    """Bands/rows whose S-curve threshold ``(1 / bands) ** (1 / rows)`` is closest to ``threshold``."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        error = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x, y):
+        x, y = self.find(x), self.find(y)
+        if x != y:
+            # The earlier document stays the root, so it becomes the cluster representative
+            self.parent[max(x, y)] = min(x, y)
+
+
+def cluster_near_duplicates(signatures, threshold=0.85):
+    """Group documents whose estimated Jaccard similarity reaches ``threshold``.
+
+    Candidate pairs come from LSH banding and are confirmed against the
+    signature agreement, so the banding only decides which pairs are compared.
+    Merging is transitive: in a chain A~B~C, A and C share a cluster even when
+    they are far apart, so use ``select_representatives`` to decide what to drop.
+
+    Returns:
+        list of clusters (lists of document indices, ascending), largest first
+    """
+    signatures = np.asarray(signatures)
+    num_docs, num_perm = signatures.shape
+    bands, rows = lsh_params(threshold, num_perm)
+    union_find = _UnionFind(num_docs)
+
+    for band in range(bands):
+        buckets = defaultdict(list)
+        block = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        for index in range(num_docs):
+            buckets[block[index].tobytes()].append(index)
+        for members in buckets.values():
+            if len(members) < 2:
+                continue
+            first = members[0]
+            for other in members[1:]:
+                if union_find.find(first) == union_find.find(other):
+                    continue
+                if np.mean(signatures[first] == signatures[other]) >= threshold:
+                    union_find.union(first, other)
+
+    clusters = defaultdict(list)
+    for index in range(num_docs):
+        clusters[union_find.find(index)].append(index)
+    return sorted(clusters.values(), key=lambda members: (-len(members), members[0]))
+
+
+def select_representatives(members, signatures, threshold=0.85, keep_per_cluster=1):
+    """The documents of one cluster to keep.
+
+    The first ``keep_per_cluster`` members are kept. A later member is dropped
+    only if its estimated Jaccard similarity to a kept member reaches
+    ``threshold``; members that only joined through a chain are kept.
+
+    Returns:
+        list of kept document indices, ascending
+    """
+    signatures = np.asarray(signatures)
+    kept = list(members[:keep_per_cluster])
+    for index in members[keep_per_cluster:]:
+        if np.mean(signatures[kept] == signatures[index], axis=1).max() < threshold:
+            kept.append(index)
+    return kept
@@ -0,0 +1,150 @@
+import bisect
+
+import torch
+from datasets import Dataset
+
+
+def pack_sequences(lengths, max_length=1024):
+    """Group sequence indices into rows of at most ``max_length`` tokens by best-fit decreasing."""
+    order = sorted(range(len(lengths)), key=lambda k: lengths[k], reverse=True)
+    rows = []
+    # (remaining capacity, row index), kept sorted for best-fit lookup
+    free = []
+    for k in order:
+        length = lengths[k]
+        slot = bisect.bisect_left(free, (length, -1))
+        if slot < len(free):
+            remaining, row = free.pop(slot)
+        else:
+            remaining, row = max_length, len(rows)
+            rows.append([])
+        rows[row].append(k)
+        remaining -= length
+        if remaining > 0:
+            bisect.insort(free, (remaining, row))
+    return rows
+
+
+def pack_dataset(dataset, max_length=1024):
+    """Concatenate tokenized examples into rows of at most ``max_length`` tokens.
+
+    Examples are assigned to rows by best-fit decreasing, so no example is split
+    across rows. ``position_ids`` restart at 0 for every example; they are the
+    only record of the boundaries and drive both the attention mask and the
+    labels built by ``PackedDataCollator``. Padded inputs (with an
+    ``attention_mask`` column) are unpadded first.
+    """
+    sequences = dataset["input_ids"]
+    if "attention_mask" in dataset.column_names:
+        sequences = [
+            [t for t, m in zip(ids, mask) if m] for ids, mask in zip(sequences, dataset["attention_mask"])
+        ]
+    sequences = [list(ids[:max_length]) for ids in sequences if len(ids)]
+
+    rows = pack_sequences([len(ids) for ids in sequences], max_length)
+
+    packed = {"input_ids": [], "position_ids": []}
+    for row in rows:
+        input_ids, position_ids = [], []
+        for k in row:
+            input_ids.extend(sequences[k])
+            position_ids.extend(range(len(sequences[k])))
+        packed["input_ids"].append(input_ids)
+        packed["position_ids"].append(position_ids)
+
+    num_tokens = sum(len(ids) for ids in sequences)
+    print(f"packed {len(sequences)} examples into {len(rows)} rows "
+          f"({num_tokens / (len(rows) * max_length):.1%} of {max_length}-token slots filled)")
+    return Dataset.from_dict(packed)
+
+
+def block_causal_mask(position_ids, dtype=torch.float32):
+    """(batch, 1, length, length) causal mask, 1 where a token may attend, that never crosses example boundaries."""
+    length = position_ids.shape[-1]
+    starts = (position_ids == 0).cumsum(-1)
+    same_segment = starts[:, :, None] == starts[:, None, :]
+    causal = torch.ones((length, length), dtype=torch.bool, device=position_ids.device).tril()
+    return (same_segment & causal)[:, None].to(dtype)
+
+
+class PackedDataCollator:
+    """Collate rows produced by ``pack_dataset``.
+
+    Labels are ``-100`` on padding and on the first token of every packed
+    example, so no example is trained to predict the start of the next one.
+
+    mask_format="position_ids" passes no attention mask; recent transformers
+    models then derive a block-diagonal causal mask from the restarting
+    position ids (sdpa, eager and flash attention alike). They only do so
+    without a KV cache, hence ``use_cache=False`` in every batch. Older
+    versions ignore the boundaries, so run ``check_packed_attention`` on the
+    model before training. mask_format="4d" builds the block-diagonal causal
+    mask explicitly, for remote-code models such as DeepSeek-V2 that only
+    understand a 4D ``attention_mask``.
+    """
+
+    def __init__(self, pad_token_id, mask_format="position_ids", mask_dtype=torch.float32, pad_to_multiple_of=None):
+        if mask_format not in ("position_ids", "4d"):
+            raise ValueError(f"unknown mask_format: {mask_format}")
+        self.pad_token_id = pad_token_id
+        self.mask_format = mask_format
+        self.mask_dtype = mask_dtype
+        self.pad_to_multiple_of = pad_to_multiple_of
+
+    def __call__(self, features):
+        length = max(len(f["input_ids"]) for f in features)
+        if self.pad_to_multiple_of:
+            length = -(-length // self.pad_to_multiple_of) * self.pad_to_multiple_of
+
+        batch_size = len(features)
+        input_ids = torch.full((batch_size, length), self.pad_token_id, dtype=torch.long)
+        # Every padding token is its own one-token segment at position 0
+        position_ids = torch.zeros((batch_size, length), dtype=torch.long)
+        for i, f in enumerate(features):
+            n = len(f["input_ids"])
+            input_ids[i, :n] = torch.as_tensor(f["input_ids"], dtype=torch.long)
+            position_ids[i, :n] = torch.as_tensor(f["position_ids"], dtype=torch.long)
+
+        labels = input_ids.masked_fill(position_ids == 0, -100)
+        batch = {"input_ids": input_ids, "position_ids": position_ids, "labels": labels, "use_cache": False}
+
+        if self.mask_format == "4d":
+            batch["attention_mask"] = block_causal_mask(position_ids, self.mask_dtype)
+        return batch
+
+
+@torch.no_grad()
+def check_packed_attention(model, collator, segment_length=8, tolerance=0.03):
+    """Raise if attention crosses example boundaries in batches built by ``collator``.
+
+    Runs a row packing two short examples through ``model``, then the second
+    example on its own, and compares the second example's logits. Whether
+    packed examples stay separate depends on the transformers version, the
+    attention implementation and the collator's ``mask_format``, so the
+    training scripts check the actual model before training on packed rows.
+    """
+    first = list(range(10, 10 + segment_length))
+    second = list(range(20, 20 + segment_length))
+    features = [
+        {"input_ids": first + second, "position_ids": list(range(segment_length)) * 2},
+        {"input_ids": second, "position_ids": list(range(segment_length))}
+    ]
+    was_training = model.training
+    model.eval()
+    logits = []
+    for feature in features:
+        batch = collator([feature])
+        batch.pop("labels")
+        batch = {k: v.to(model.device) if torch.is_tensor(v) else v for k, v in batch.items()}
+        logits.append(model(**batch).logits[0, -segment_length:].float())
+    model.train(was_training)
+
+    packed, alone = logits
+    difference = ((packed - alone).abs().max() / alone.abs().max()).item()
+    if difference > tolerance:
+        raise RuntimeError(
+            f"packed examples attend to each other (relative logit difference {difference:.3f}): this transformers "
+            f"version / attention implementation does not separate them by position_ids. Upgrade transformers, use "
+            f"PackedDataCollator(mask_format=\"4d\") if the model accepts a 4D mask, or set PACKING = False"
+        )
+    print(f"packed examples are attended separately (relative logit difference {difference:.1e})")
@@ -0,0 +1,161 @@
+import json
+import math
+import random
+
+from torch.utils.data import IterableDataset, get_worker_info
+
+from .dataset_cache import number_normalizer
+
+
+def count_lines(path, chunk_size=1 << 20):
+    """Number of lines in a file, counted in fixed-size chunks."""
+    count, last = 0, b"\n"
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            count += chunk.count(b"\n")
+            last = chunk[-1:]
+    return count + (last != b"\n")
+
+
+def shuffle_buffer(items, buffer_size, rng):
+    """Approximate shuffle of a stream, holding at most ``buffer_size`` items."""
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        k = rng.randrange(buffer_size)
+        yield buffer[k]
+        buffer[k] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def pack_stream(sequences, pack_length, window=64):
+    """Online version of ``pack_dataset``: best-fit into a window of open rows.
+
+    Each sequence goes to the open row with the least room that still fits it.
+    When more than ``window`` rows are open, the fullest one is emitted. Yields
+    dicts with ``input_ids`` and ``position_ids`` for ``PackedDataCollator``.
+    """
+    open_rows = []
+    for ids in sequences:
+        ids = ids[:pack_length]
+        fits = [row for row in open_rows if pack_length - len(row["input_ids"]) >= len(ids)]
+        if fits:
+            row = min(fits, key=lambda r: pack_length - len(r["input_ids"]))
+        else:
+            row = {"input_ids": [], "position_ids": []}
+            open_rows.append(row)
+        row["input_ids"].extend(ids)
+        row["position_ids"].extend(range(len(ids)))
+        if len(row["input_ids"]) == pack_length:
+            open_rows.remove(row)
+            yield row
+        elif len(open_rows) > window:
+            fullest = max(open_rows, key=lambda r: len(r["input_ids"]))
+            open_rows.remove(fullest)
+            yield fullest
+    yield from open_rows
+
+
+class StreamingJsonlDataset(IterableDataset):
+    """Training examples read, tokenized and packed on the fly from a prompt/completion JSONL file.
+
+    Memory stays flat in the corpus size: only ``shuffle_buffer_size`` raw
+    lines and ``pack_window`` open rows are held at a time. Lines are shuffled
+    through the buffer with a seed that changes every epoch (the Trainer calls
+    ``set_epoch``). They are formatted with ``template`` like
+    ``load_tokenized_dataset``, and examples longer than ``max_length`` are
+    dropped. Without ``pack_length`` items are single examples (``input_ids``).
+    With it they are packed rows (``input_ids`` and ``position_ids``). Each
+    dataloader worker reads every ``num_workers``-th line.
+
+    The dataset has no length, so the Trainer needs ``max_steps``; see
+    ``streaming_max_steps``.
+    """
+
+    def __init__(self, data_file, tokenizer, template, max_length=1024, pack_length=None, shuffle_buffer_size=10000,
+                 pack_window=64, tokenize_batch_size=256, seed=0, normalize_numbers=False):
+        self.data_file = data_file
+        self.tokenizer = tokenizer
+        self.template = template
+        self.max_length = max_length
+        self.pack_length = pack_length
+        self.shuffle_buffer_size = shuffle_buffer_size
+        self.pack_window = pack_window
+        self.tokenize_batch_size = tokenize_batch_size
+        self.seed = seed
+        self.normalize_numbers = normalize_numbers
+        self.epoch = 0
+
+    def set_epoch(self, epoch):
+        self.epoch = epoch
+
+    def _lines(self, worker_id, num_workers):
+        with open(self.data_file, 'r') as f:
+            for k, line in enumerate(f):
+                if k % num_workers == worker_id and line.strip():
+                    yield line
+
+    def _tokenized(self, lines):
+        normalize = number_normalizer() if self.normalize_numbers else (lambda text: text)
+        eos = self.tokenizer.eos_token
+        batch = []
+        for line in lines:
+            example = json.loads(line)
+            batch.append(self.template.format(input=normalize(example["input"]), output=example["output"], eos=eos))
+            if len(batch) == self.tokenize_batch_size:
+                yield from self._encode(batch)
+                batch = []
+        if batch:
+            yield from self._encode(batch)
+
+    def _encode(self, texts):
+        for ids in self.tokenizer(texts, truncation=False)["input_ids"]:
+            if len(ids) <= self.max_length:
+                yield ids
+
+    def __iter__(self):
+        worker = get_worker_info()
+        worker_id, num_workers = (worker.id, worker.num_workers) if worker else (0, 1)
+        rng = random.Random(f"{self.seed}-{self.epoch}-{worker_id}")
+        lines = shuffle_buffer(self._lines(worker_id, num_workers), self.shuffle_buffer_size, rng)
+        sequences = self._tokenized(lines)
+        if self.pack_length:
+            yield from pack_stream(sequences, self.pack_length, self.pack_window)
+        else:
+            for ids in sequences:
+                yield {"input_ids": ids}
+
+    def estimate_num_items(self, sample_size=2000):
+        """Items per epoch, from the line count and the first ``sample_size`` lines (kept and packed as in training)."""
+        num_lines = count_lines(self.data_file)
+        sample = []
+        with open(self.data_file, 'r') as f:
+            for line in f:
+                if line.strip():
+                    sample.append(line)
+                if len(sample) == sample_size:
+                    break
+        if not sample:
+            return 0
+        sequences = list(self._tokenized(sample))
+        items = len(sequences)
+        if self.pack_length and sequences:
+            items = sum(1 for _ in pack_stream(sequences, self.pack_length, self.pack_window))
+        return math.ceil(num_lines * items / len(sample))
+
+
+def streaming_max_steps(dataset, args):
+    """``max_steps`` covering ``args.num_train_epochs`` passes over a ``StreamingJsonlDataset``.
+
+    An explicit ``args.max_steps`` is kept as is.
+    """
+    if args.max_steps > 0:
+        return args.max_steps
+    items = dataset.estimate_num_items()
+    batch = args.per_device_train_batch_size * args.gradient_accumulation_steps * args.world_size
+    steps_per_epoch = max(1, items // batch)
+    print(f"streaming {dataset.data_file}: about {items} training items per epoch, {steps_per_epoch} steps")
+    return math.ceil(steps_per_epoch * args.num_train_epochs)
@@ -0,0 +1,121 @@
+import os
+import json
+import shutil
+
+import numpy as np
+from torch.utils.data import Dataset
+
+from .dataset_cache import DEFAULT_CACHE_DIR, dataset_key, load_tokenized_dataset
+from .packing import pack_sequences
+
+
+def _dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def write_token_store(dataset, path, vocab_size):
+    """Write the ``input_ids`` of a tokenized dataset as one flat token array plus offsets.
+
+    Tokens are stored as uint16 when the vocabulary fits, uint32 otherwise;
+    ``offsets[i]:offsets[i + 1]`` is the slice of sequence ``i``.
+    """
+    dtype = np.uint16 if vocab_size <= np.iinfo(np.uint16).max + 1 else np.uint32
+    lengths = np.asarray(dataset["length"], dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    os.makedirs(tmp_path, exist_ok=True)
+    tokens = np.lib.format.open_memmap(os.path.join(tmp_path, "tokens.npy"), mode="w+", dtype=dtype,
+                                       shape=(int(offsets[-1]),))
+    for start in range(0, len(dataset), 10000):
+        batch = dataset[start:start + 10000]["input_ids"]
+        flat = np.concatenate([np.asarray(ids, dtype=dtype) for ids in batch])
+        tokens[offsets[start]:offsets[start] + len(flat)] = flat
+    tokens.flush()
+    del tokens
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump({"dtype": np.dtype(dtype).name, "num_sequences": len(lengths),
+                   "num_tokens": int(offsets[-1]), "vocab_size": vocab_size}, f)
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp_path, path)
+
+
+class TokenStore:
+    """Read-only, memory-mapped view of a token store; sequences are zero-copy slices."""
+
+    def __init__(self, path):
+        self.path = path
+        self.tokens = np.load(os.path.join(path, "tokens.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"))
+        self.lengths = np.diff(self.offsets)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, index):
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def nbytes(self):
+        return self.tokens.nbytes + self.offsets.nbytes
+
+
+def load_token_store(data_file, tokenizer, template, max_length=1024, cache_dir=DEFAULT_CACHE_DIR, num_proc=None,
+                     normalize_numbers=False):
+    """Token store for a prompt/completion JSONL file, built from the tokenized dataset cache on first use."""
+    key = dataset_key(data_file, tokenizer, template, max_length, normalize_numbers)
+    path = os.path.join(cache_dir, f"{key[:16]}.tokens")
+    if not os.path.exists(os.path.join(path, "meta.json")):
+        dataset = load_tokenized_dataset(data_file, tokenizer, template, max_length, cache_dir, num_proc,
+                                         normalize_numbers)
+        write_token_store(dataset, path, len(tokenizer))
+        arrow_size = _dir_size(os.path.join(cache_dir, key[:16]))
+        print(f"token store for {data_file}: {_dir_size(path) / 2**20:.1f} MB "
+              f"(tokenized Arrow dataset: {arrow_size / 2**20:.1f} MB)")
+    return TokenStore(path)
+
+
+class MmapTokenDataset(Dataset):
+    """Training examples read straight from a ``TokenStore``.
+
+    Without ``pack_length`` each item is one example's ``input_ids``, for
+    ``DataCollatorForLanguageModeling``. With ``pack_length`` examples are
+    grouped into rows of up to that many tokens and items carry
+    ``position_ids`` for ``PackedDataCollator``. ``indices`` restricts the
+    dataset to those examples of the store.
+    """
+
+    def __init__(self, store, pack_length=None, indices=None):
+        self.store = store
+        self.pack_length = pack_length
+        self.indices = np.arange(len(store)) if indices is None else np.asarray(indices)
+        self.rows = None
+        if pack_length:
+            rows = pack_sequences(store.lengths[self.indices].tolist(), pack_length)
+            self.rows = [self.indices[row] for row in rows]
+            print(f"packed {len(self.indices)} examples into {len(self.rows)} rows "
+                  f"({store.lengths[self.indices].sum() / (len(self.rows) * pack_length):.1%} of "
+                  f"{pack_length}-token slots filled)")
+
+    @property
+    def lengths(self):
+        """Token count of every item, read from the store offsets without touching the tokens."""
+        if self.rows is None:
+            return self.store.lengths[self.indices]
+        return np.array([self.store.lengths[row].sum() for row in self.rows])
+
+    def __len__(self):
+        return len(self.rows) if self.rows is not None else len(self.indices)
+
+    def __getitem__(self, index):
+        if self.rows is None:
+            return {"input_ids": self.store[self.indices[index]].astype(np.int64)}
+        segments = [self.store[k] for k in self.rows[index]]
+        return {
+            "input_ids": np.concatenate(segments).astype(np.int64),
+            "position_ids": np.concatenate([np.arange(len(s)) for s in segments])
+        }
@@ -0,0 +1,100 @@
+import os
+import copy
+import json
+
+import numpy as np
+import torch
+
+_HASH_PRIME = np.uint64(1000003)
+
+
+def _count_ngrams(ids, n, min_count):
+    """Token n-grams of a flat id array (documents separated by -1) occurring at least ``min_count`` times."""
+    windows = np.lib.stride_tricks.sliding_window_view(ids, n)
+    valid = np.flatnonzero((windows >= 0).all(axis=1))
+    hashes = np.zeros(len(valid), dtype=np.uint64)
+    for j in range(n):
+        hashes = hashes * _HASH_PRIME + windows[valid, j].astype(np.uint64)
+    _, first, counts = np.unique(hashes, return_index=True, return_counts=True)
+    frequent = np.flatnonzero(counts >= min_count)
+    return [(tuple(windows[valid[first[k]]].tolist()), int(counts[k])) for k in frequent]
+
+
+def _candidates(texts, tokenizer, max_span, min_count):
+    encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+    ids = np.concatenate([np.append(np.asarray(seq, dtype=np.int64), -1) for seq in encoded])
+    candidates = []
+    for n in range(2, max_span + 1):
+        for span, count in _count_ngrams(ids, n, min_count):
+            text = tokenizer.decode(list(span))
+            if "\n" in text or "\ufffd" in text or text != text.rstrip() or not text.strip():
+                continue
+            candidates.append({"text": text, "count": count, "pieces": n})
+    candidates.sort(key=lambda c: c["count"] * (c["pieces"] - 1), reverse=True)
+    return candidates
+
+
+def mine_spans(texts, tokenizer, num_tokens=500, max_span=8, min_count=50, rounds=20):
+    """Frequent multi-token spans of ``texts`` that are worth adding as single tokens.
+
+    Candidates are token n-grams (2 to ``max_span`` tokens) within one line,
+    scored by the tokens they would save, ``count * (n - 1)``. Spans are
+    chosen over ``rounds`` rounds. After each round the chosen spans are added
+    to a copy of the tokenizer and the texts are re-tokenized, so overlapping
+    variants of one idiom do not all get picked. Within a round, a candidate is
+    skipped when it almost only occurs inside a span already picked.
+
+    Returns:
+        list of dicts with ``text``, ``count`` and ``pieces`` (tokens it replaced when picked), best first
+    """
+    tokenizer = copy.deepcopy(tokenizer)
+    per_round = -(-num_tokens // rounds)
+    chosen = []
+    while len(chosen) < num_tokens:
+        vocab = tokenizer.get_vocab()
+        picked = []
+        for candidate in _candidates(texts, tokenizer, max_span, min_count):
+            if candidate["text"] in vocab or any(c["text"] == candidate["text"] for c in picked):
+                continue
+            if any(candidate["text"] in c["text"] and candidate["count"] <= 1.2 * c["count"] for c in picked):
+                continue
+            picked.append(candidate)
+            if len(picked) == min(per_round, num_tokens - len(chosen)):
+                break
+        if not picked:
+            break
+        tokenizer.add_tokens([c["text"] for c in picked])
+        chosen.extend(picked)
+    return chosen
+
+
+def add_domain_tokens(tokenizer, tokens_file):
+    """Add the spans listed in ``tokens_file`` (written by ``extend_tokenizer.py``) to ``tokenizer``.
+
+    Returns:
+        dict mapping each new token id to the ids it was split into before, for ``init_new_embeddings``
+    """
+    if not os.path.exists(tokens_file):
+        raise FileNotFoundError(f"{tokens_file} not found; run extend_tokenizer.py to create it, "
+                                f"or set DOMAIN_TOKENS_FILE = None to keep the stock vocabulary")
+    with open(tokens_file, 'r') as f:
+        texts = [entry["text"] for entry in json.load(f)["tokens"]]
+    pieces = {text: tokenizer(text, add_special_tokens=False)["input_ids"] for text in texts}
+    tokenizer.add_tokens(texts)
+    new_pieces = {tokenizer.convert_tokens_to_ids(text): ids for text, ids in pieces.items() if len(ids) > 1}
+    print(f"added {len(new_pieces)} CadQuery tokens from {tokens_file}, vocabulary size {len(tokenizer)}")
+    return new_pieces
+
+
+@torch.no_grad()
+def init_new_embeddings(model, new_pieces):
+    """Start each added token at the mean embedding of the tokens it replaces (call after resize_token_embeddings)."""
+    if not new_pieces:
+        return
+    input_embeddings = model.get_input_embeddings().weight
+    output_embeddings = model.get_output_embeddings()
+    untied = output_embeddings is not None and output_embeddings.weight is not input_embeddings
+    for token_id, ids in new_pieces.items():
+        input_embeddings[token_id] = input_embeddings[ids].mean(dim=0)
+        if untied:
+            output_embeddings.weight[token_id] = output_embeddings.weight[ids].mean(dim=0)
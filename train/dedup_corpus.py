@@ -0,0 +1,84 @@
+import json
+import argparse
+from collections import Counter
+
+import numpy as np
+from tqdm import tqdm
+
+from common.minhash import MinHasher, shingles, cluster_near_duplicates, lsh_params, select_representatives
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Near-duplicate removal for prompt/CadQuery JSONL corpora (MinHash + LSH)")
+    parser.add_argument('-i', '--input_file', type=str, default='data_train.jsonl')
+    parser.add_argument('-o', '--output_file', type=str, default='data_train_dedup.jsonl')
+    parser.add_argument('-r', '--report_file', type=str, default='dedup_report.json')
+    parser.add_argument('-t', '--threshold', type=float, default=0.85,
+                        help='Estimated Jaccard similarity at which two (input, output) pairs count as duplicates')
+    parser.add_argument('--num_perm', type=int, default=128, help='MinHash signature length')
+    parser.add_argument('--ngram', type=int, default=5, help='Word n-gram size for shingles')
+    parser.add_argument('--fields', type=str, default='input,output',
+                        help='Comma-separated fields concatenated before shingling')
+    parser.add_argument('--mask_numbers', action='store_true',
+                        help='Ignore numeric values, so parts that differ only in dimensions are merged')
+    parser.add_argument('--keep_per_cluster', type=int, default=1,
+                        help='Examples kept from each cluster (the earliest ones in the file); later ones are kept '
+                             'too if they are below --threshold against every kept example')
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    fields = args.fields.split(',')
+    with open(args.input_file, 'r') as f_in:
+        examples = [json.loads(line) for line in f_in if line.strip()]
+
+    hasher = MinHasher(args.num_perm, args.seed)
+    signatures = np.stack([
+        hasher.signature(shingles("\n".join(str(example[field]) for field in fields), args.ngram, args.mask_numbers))
+        for example in tqdm(examples, desc="minhash")
+    ])
+    clusters = cluster_near_duplicates(signatures, args.threshold)
+
+    kept = [select_representatives(members, signatures, args.threshold, args.keep_per_cluster) for members in clusters]
+    keep = sorted(k for members in kept for k in members)
+    # Kept beyond --keep_per_cluster: joined the cluster only through a chain of near-duplicates
+    num_chain_kept = sum(len(members) - min(len(members), args.keep_per_cluster) for members in kept)
+    with open(args.output_file, 'w') as f_out:
+        for k in keep:
+            f_out.write(json.dumps(examples[k], ensure_ascii=False) + "\n")
+
+    sizes = Counter(len(members) for members in clusters)
+    bands, rows = lsh_params(args.threshold, args.num_perm)
+    report = {
+        "input_file": args.input_file,
+        "output_file": args.output_file,
+        "threshold": args.threshold,
+        "num_perm": args.num_perm,
+        "lsh_bands": bands,
+        "lsh_rows": rows,
+        "mask_numbers": args.mask_numbers,
+        "num_examples": len(examples),
+        "num_clusters": len(clusters),
+        "num_kept": len(keep),
+        "num_removed": len(examples) - len(keep),
+        "num_kept_chain_members": num_chain_kept,
+        "cluster_size_histogram": {str(size): count for size, count in sorted(sizes.items())},
+        "largest_clusters": [
+            {"size": len(members), "example_indices": members[:10], "input": examples[members[0]]["input"][:200]}
+            for members in clusters[:20] if len(members) > 1
+        ]
+    }
+    with open(args.report_file, 'w') as f_report:
+        json.dump(report, f_report, indent=2, ensure_ascii=False)
+
+    print(f"{len(examples)} examples -> {len(clusters)} clusters, kept {len(keep)} "
+          f"({report['num_removed']} removed, {report['num_removed'] / max(len(examples), 1):.1%}; "
+          f"{num_chain_kept} kept that were only chained to a kept example)")
+    print("cluster sizes: " + ", ".join(f"{size}: {count}" for size, count in sorted(sizes.items())[:10]))
+    print(f"report written to {args.report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+import json
+import random
+import argparse
+from collections import Counter
+
+import numpy as np
+from transformers import AutoTokenizer
+
+from common.vocab import mine_spans, add_domain_tokens
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mine frequent CadQuery spans and add them to a tokenizer")
+    parser.add_argument('-m', '--tokenizer', type=str, default='openai-community/gpt2-large')
+    parser.add_argument('-i', '--train_file', type=str, default='data_train.jsonl')
+    parser.add_argument('-t', '--test_file', type=str, default='data_test.jsonl')
+    parser.add_argument('-o', '--output_file', type=str, default='cadquery_tokens.json')
+    parser.add_argument('-r', '--report_file', type=str, default='tokenizer_report.json')
+    parser.add_argument('--num_tokens', type=int, default=500, help='Spans to add')
+    parser.add_argument('--max_span', type=int, default=8, help='Longest span, in base tokens')
+    parser.add_argument('--min_count', type=int, default=50, help='Minimum occurrences in the mined sample')
+    parser.add_argument('--sample', type=int, default=20000, help='Training targets mined (random sample)')
+    parser.add_argument('--template', type=str, default='{input}\n{output}',
+                        help='Training template, used to measure sequence lengths on the test set')
+    parser.add_argument('--max_length', type=int, default=1024)
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def load_jsonl(path):
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    args = parse_args()
+    tokenizer = AutoTokenizer.from_pretrained(args.tokenizer)
+    train = load_jsonl(args.train_file)
+    targets = [example["output"] for example in train]
+    targets = random.Random(args.seed).sample(targets, min(args.sample, len(targets)))
+
+    tokens = mine_spans(targets, tokenizer, args.num_tokens, args.max_span, args.min_count)
+    with open(args.output_file, 'w') as f_out:
+        json.dump({"base_tokenizer": args.tokenizer, "tokens": tokens}, f_out, indent=2, ensure_ascii=False)
+    print(f"mined {len(tokens)} spans from {len(targets)} targets, written to {args.output_file}")
+
+    extended = AutoTokenizer.from_pretrained(args.tokenizer)
+    new_pieces = add_domain_tokens(extended, args.output_file)
+    test = load_jsonl(args.test_file)
+    texts = [args.template.format(input=e["input"], output=e["output"], eos=tokenizer.eos_token) for e in test]
+    before = np.array([len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]])
+    after_ids = extended(texts, add_special_tokens=False)["input_ids"]
+    after = np.array([len(ids) for ids in after_ids])
+    usage = Counter(i for ids in after_ids for i in ids if i in new_pieces)
+
+    report = {
+        "tokenizer": args.tokenizer,
+        "num_added_tokens": len(new_pieces),
+        "test_file": args.test_file,
+        "num_test_examples": len(texts),
+        "mean_length_before": float(before.mean()),
+        "mean_length_after": float(after.mean()),
+        "mean_length_reduction": float(1 - after.mean() / before.mean()),
+        "median_length_before": float(np.median(before)),
+        "median_length_after": float(np.median(after)),
+        "within_max_length_before": int((before <= args.max_length).sum()),
+        "within_max_length_after": int((after <= args.max_length).sum()),
+        "unused_tokens": len(new_pieces) - len(usage),
+        "most_used_tokens": [
+            {"text": extended.convert_ids_to_tokens(i), "test_uses": n, "pieces": len(new_pieces[i])}
+            for i, n in usage.most_common(30)
+        ]
+    }
+    with open(args.report_file, 'w') as f_report:
+        json.dump(report, f_report, indent=2, ensure_ascii=False)
+
+    print(f"test set: {before.mean():.1f} -> {after.mean():.1f} tokens per example "
+          f"({report['mean_length_reduction']:.1%} shorter), "
+          f"{report['within_max_length_before']} -> {report['within_max_length_after']} of {len(texts)} "
+          f"within {args.max_length} tokens")
+    print(f"report written to {args.report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import os
+import re
+import json
+import time
+import argparse
+
+from transformers import AutoTokenizer
+
+from canonicalize_targets import DEFAULT_TOKENIZERS, count_tokens
+from common.dataset_cache import number_normalizer
+
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replace spelled-out numbers in the descriptions and report "
+                                                 "prompt token savings")
+    parser.add_argument('-i', '--input_files', type=str, default='data_train.jsonl,data_val.jsonl,data_test.jsonl',
+                        help='Comma-separated prompt/completion JSONL files')
+    parser.add_argument('-r', '--report_file', type=str, default='normalize_report.json')
+    parser.add_argument('--tokenizers', type=str, default=','.join(DEFAULT_TOKENIZERS),
+                        help='Comma-separated tokenizers to measure prompt lengths with')
+    parser.add_argument('--max_length', type=int, default=1024,
+                        help='Prompt plus code token limit used in training and by the step1 scripts')
+    parser.add_argument('--write', action='store_true',
+                        help='Also write <name>_normalized.jsonl next to each input file')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    normalize = number_normalizer()
+    tokenizers = {name: AutoTokenizer.from_pretrained(name, trust_remote_code=True)
+                  for name in args.tokenizers.split(',') if name}
+
+    report = {"max_length": args.max_length, "files": {}}
+    for path in [p for p in args.input_files.split(',') if p]:
+        with open(path, 'r') as f_in:
+            examples = [json.loads(line) for line in f_in if line.strip()]
+        before = [example["input"] for example in examples]
+        start_time = time.perf_counter()
+        after = [normalize(text) for text in before]
+        elapsed = time.perf_counter() - start_time
+
+        if args.write:
+            root, ext = os.path.splitext(path)
+            with open(f"{root}_normalized{ext}", 'w') as f_out:
+                for example, text in zip(examples, after):
+                    f_out.write(json.dumps({**example, "input": text}, ensure_ascii=False) + "\n")
+
+        file_report = {
+            "num_examples": len(examples),
+            "examples_changed": sum(a != b for a, b in zip(after, before)),
+            "numbers_written_as_literals": sum(len(NUMBER_RE.findall(a)) - len(NUMBER_RE.findall(b))
+                                               for a, b in zip(after, before)),
+            "chars_before": sum(len(text) for text in before),
+            "chars_after": sum(len(text) for text in after),
+            "normalize_ms_per_1k_prompts": 1000 * elapsed / max(len(examples), 1) * 1000,
+            "tokens": {}
+        }
+        targets = [example["output"] for example in examples]
+        for name, tokenizer in tokenizers.items():
+            prompt_before, prompt_after = count_tokens(tokenizer, before), count_tokens(tokenizer, after)
+            target_tokens = count_tokens(tokenizer, targets)
+            # Examples whose reference code no longer fits in what is left of max_length after the prompt:
+            # dropped from training, cut off by max_new_tokens at inference
+            truncated_before = sum(p + t > args.max_length for p, t in zip(prompt_before, target_tokens))
+            truncated_after = sum(p + t > args.max_length for p, t in zip(prompt_after, target_tokens))
+            file_report["tokens"][name] = {
+                "prompt_tokens_before": sum(prompt_before),
+                "prompt_tokens_after": sum(prompt_after),
+                "saved_ratio": 1 - sum(prompt_after) / max(sum(prompt_before), 1),
+                "mean_prompt_tokens_before": sum(prompt_before) / max(len(prompt_before), 1),
+                "mean_prompt_tokens_after": sum(prompt_after) / max(len(prompt_after), 1),
+                "max_prompt_tokens_before": max(prompt_before, default=0),
+                "max_prompt_tokens_after": max(prompt_after, default=0),
+                "truncated_before": truncated_before,
+                "truncated_after": truncated_after,
+                "no_longer_truncated": truncated_before - truncated_after
+            }
+            print(f"{path} / {name}: prompt tokens {sum(prompt_before)} -> {sum(prompt_after)} "
+                  f"({file_report['tokens'][name]['saved_ratio']:.1%} saved), "
+                  f"{truncated_before} -> {truncated_after} examples over {args.max_length} tokens")
+        report["files"][path] = file_report
+        print(f"{path}: {file_report['examples_changed']}/{len(examples)} descriptions changed, "
+              f"{file_report['normalize_ms_per_1k_prompts']:.1f} ms per 1k prompts")
+
+    with open(args.report_file, 'w') as f_report:
+        json.dump(report, f_report, indent=2, ensure_ascii=False)
+    print(f"report written to {args.report_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments, Trainer, DataCollatorForLanguageModeling
-from datasets import load_dataset
 import torch
 from collections import Counter
 import numpy as np
+from common import pack_dataset, PackedDataCollator, check_packed_attention, ThroughputCallback, load_tokenized_dataset
+from common import DynamicPaddingCollator, length_grouping_kwargs, sort_by_length
 
-# Load raw dataset
-train_dataset = load_dataset("json", data_files="data_train.jsonl", split="train")
-val_dataset = load_dataset("json", data_files="data_val.jsonl", split="train")
+# Concatenate examples into full 1024-token rows instead of padding each one to 1024
+# (checked on the loaded model: training stops if packed examples would attend to each other)
+PACKING = False
+# Without packing: batch examples of similar length and pad each batch only to its own longest example
+# (set True to enable)
+GROUP_BY_LENGTH = False
+# Replace spelled-out numbers in the descriptions ("zero point one one four nine") with numeric literals;
+# inference must then run with NORMALIZE_NUMBERS = True in inference/config.py
+NORMALIZE_NUMBERS = False
+# Train a student on deepseek-16B generations that execute (build_distill_set.py) instead of the reference code;
+# the final model is saved to DISTILL_MODEL_DIR, the "codegpt-small-distill" entry of the inference registry
+DISTILL = False
+DISTILL_MODEL_DIR = "./codegpt-small-distill"
 
 # Load tokenizer and model
 model_id = "microsoft/CodeGPT-small-py"
@@ -16,30 +27,34 @@ tokenizer.pad_token = tokenizer.eos_token
 model = AutoModelForCausalLM.from_pretrained(model_id)
 model.resize_token_embeddings(len(tokenizer))
 
-def count_length(example):
-    prompt = f"{example['input']}\n{example['output']}"
-    tokens = tokenizer(prompt, truncation=False)
-    example["length"] = len(tokens["input_ids"])
-    return example
+PROMPT_TEMPLATE = "{input}\n{output}"
+TRAIN_FILE = "data_train_distill.jsonl" if DISTILL else "data_train.jsonl"
 
-train_with_length = train_dataset.map(count_length)
-val_with_length = val_dataset.map(count_length)
+train_tokenized = load_tokenized_dataset(TRAIN_FILE, tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                         normalize_numbers=NORMALIZE_NUMBERS)
+val_tokenized = load_tokenized_dataset("data_val.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                       normalize_numbers=NORMALIZE_NUMBERS)
 
-train_filtered = train_with_length.filter(lambda x: x["length"] <= 1024)
-val_filtered = val_with_length.filter(lambda x: x["length"] <= 1024)
+print(f"filtered train samples: {len(train_tokenized)}")
+print(f"filtered val samples: {len(val_tokenized)}")
 
-print(f"filtered train samples: {len(train_filtered)}")
-print(f"filtered val samples: {len(val_filtered)}")
+if PACKING:
+    train_tokenized = pack_dataset(train_tokenized, max_length=1024)
+    val_tokenized = pack_dataset(val_tokenized, max_length=1024)
+    data_collator = PackedDataCollator(tokenizer.pad_token_id)
+elif GROUP_BY_LENGTH:
+    val_tokenized = sort_by_length(val_tokenized)
+    data_collator = DynamicPaddingCollator(tokenizer.pad_token_id)
+else:
+    data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
 
-def preprocess(example):
-    prompt = f"{example['input']}\n{example['output']}"
-    return tokenizer(prompt, truncation=True, padding="max_length", max_length=1024)
+length_grouping = length_grouping_kwargs() if GROUP_BY_LENGTH and not PACKING else {}
 
-train_tokenized = train_filtered.map(preprocess, remove_columns=train_filtered.column_names)
-val_tokenized = val_filtered.map(preprocess, remove_columns=val_filtered.column_names)
+if PACKING:
+    check_packed_attention(model, data_collator)
 
 training_args = TrainingArguments(
-    output_dir="./checkpoints-codegpt",
+    output_dir="./checkpoints-codegpt-distill" if DISTILL else "./checkpoints-codegpt",
     per_device_train_batch_size=16,
     per_device_eval_batch_size=16,
     save_strategy="epoch",
@@ -48,7 +63,8 @@ training_args = TrainingArguments(
     learning_rate=5e-5,
     num_train_epochs=2,
     fp16=True,
-    report_to="none"
+    report_to="none",
+    **length_grouping
 )
 
 trainer = Trainer(
@@ -56,7 +72,12 @@ trainer = Trainer(
     args=training_args,
     train_dataset=train_tokenized,
     eval_dataset=val_tokenized,
-    data_collator=DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    data_collator=data_collator,
+    callbacks=[ThroughputCallback()]
 )
 
-trainer.train()
\ No newline at end of file
+trainer.train()
+
+if DISTILL:
+    trainer.save_model(DISTILL_MODEL_DIR)
+    tokenizer.save_pretrained(DISTILL_MODEL_DIR)
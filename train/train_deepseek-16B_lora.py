@@ -1,8 +1,37 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments, Trainer
-from datasets import load_dataset, load_from_disk
+from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments
 from peft import get_peft_model, LoraConfig, TaskType
 from transformers import DataCollatorForLanguageModeling
 import torch
+from common import pack_dataset, PackedDataCollator, check_packed_attention, ThroughputCallback, load_tokenized_dataset
+from common import DynamicPaddingCollator, LengthGroupedTrainer, length_grouping_kwargs, sort_by_length
+from common import MmapTokenDataset, load_token_store
+from common import StreamingJsonlDataset, streaming_max_steps
+from common import AsyncAdapterCheckpointCallback, SubsetEvalTrainer
+from common import ExecutableRateCallback, load_eval_prompts
+
+# Concatenate examples into full 1024-token rows instead of padding each one to 1024
+# (checked on the loaded model: training stops if packed examples would attend to each other)
+PACKING = False
+# Without packing: batch examples of similar length and pad each batch only to its own longest example
+# (set True to enable)
+GROUP_BY_LENGTH = False
+# Replace spelled-out numbers in the descriptions ("zero point one one four nine") with numeric literals;
+# inference must then run with NORMALIZE_NUMBERS = True in inference/config.py
+NORMALIZE_NUMBERS = False
+# Read examples from a memory-mapped uint16/uint32 token store instead of Arrow rows (set True to enable)
+TOKEN_STORE = False
+# Read, shuffle (through a buffer), tokenize and pack data_train.jsonl on the fly instead of building a cached copy
+# first, so memory stays flat however large the corpus is; takes precedence over TOKEN_STORE for the train set
+STREAMING = False
+# At evaluations at least N steps apart, greedy-generate code for a fixed set of val prompts and log how much of it
+# runs and exports an STL; training pauses while generating (None disables it; e.g. 200)
+EXEC_EVAL_STEPS = None
+# Snapshot only the LoRA weights to pinned host memory and write checkpoints from a background thread
+# (set True to enable; the Trainer then saves no full checkpoints, so resume_from_checkpoint is unavailable)
+ASYNC_CHECKPOINT = False
+# Evaluate every 50 steps on a fixed length-stratified subset of the val set, the full set only at epoch ends
+# (None evaluates the full set every time; e.g. 512)
+EVAL_SUBSET_SIZE = None
 
 model_path = "deepseek-ai/DeepSeek-Coder-V2-Lite-Instruct"
 # model_path = "deepseek-ai/deepseek-llm-7b-base"
@@ -16,36 +45,48 @@ tokenizer = AutoTokenizer.from_pretrained(
 tokenizer.pad_token = tokenizer.eos_token
 tokenizer.padding_side = "left"
 
-# train_raw = load_dataset("json", data_files="/home/tc415/CAD4Protein/Text-to-CadQuery/dataset/data/data_train.jsonl", split="train")
-# val_raw = load_dataset("json", data_files="/home/tc415/CAD4Protein/Text-to-CadQuery/dataset/data/data_val.jsonl", split="train")
-
-# def format_mistral_prompt(example):
-#     prompt = f"<s>[INST] {example['input']} [/INST] {example['output']}</s>"
-#     return prompt
-
-# def count_length(example):
-#     prompt = format_mistral_prompt(example)
-#     tokens = tokenizer(prompt, truncation=False)
-#     example["length"] = len(tokens["input_ids"])
-#     return example
-
-# train_with_length = train_raw.map(count_length)
-# val_with_length = val_raw.map(count_length)
-# train_filtered = train_with_length.filter(lambda x: x["length"] <= 1024)
-# val_filtered = val_with_length.filter(lambda x: x["length"] <= 1024)
-
-# def preprocess(example):
-#     prompt = format_mistral_prompt(example)
-#     return tokenizer(prompt, truncation=True, padding="max_length", max_length=1024)
-
-# train_dataset = train_filtered.map(preprocess, remove_columns=train_filtered.column_names)
-# val_dataset = val_filtered.map(preprocess, remove_columns=val_filtered.column_names)
-
-# train_dataset.save_to_disk('/home/tc415/CAD4Protein/Text-to-CadQuery/dataset/processed/train')
-# val_dataset.save_to_disk('/home/tc415/CAD4Protein/Text-to-CadQuery/dataset/processed/val')
-# print("Saved to disk!")
-train_dataset = load_from_disk("/home/tc415/CAD4Protein/Text-to-CadQuery/dataset/processed/train")
-val_dataset   = load_from_disk("/home/tc415/CAD4Protein/Text-to-CadQuery/dataset/processed/val")
+PROMPT_TEMPLATE = "<s>[INST] {input} [/INST] {output}</s>"
+
+if STREAMING:
+    train_dataset = StreamingJsonlDataset("data_train.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                          pack_length=1024 if PACKING else None,
+                                          normalize_numbers=NORMALIZE_NUMBERS)
+    val_dataset = load_tokenized_dataset("data_val.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                         normalize_numbers=NORMALIZE_NUMBERS)
+    if PACKING:
+        val_dataset = pack_dataset(val_dataset, max_length=1024)
+elif TOKEN_STORE:
+    pack_length = 1024 if PACKING else None
+    train_dataset = MmapTokenDataset(load_token_store("data_train.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                                    normalize_numbers=NORMALIZE_NUMBERS), pack_length)
+    val_dataset = MmapTokenDataset(load_token_store("data_val.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                                    normalize_numbers=NORMALIZE_NUMBERS), pack_length)
+else:
+    train_dataset = load_tokenized_dataset("data_train.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                           normalize_numbers=NORMALIZE_NUMBERS)
+    val_dataset = load_tokenized_dataset("data_val.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                         normalize_numbers=NORMALIZE_NUMBERS)
+    if PACKING:
+        train_dataset = pack_dataset(train_dataset, max_length=1024)
+        val_dataset = pack_dataset(val_dataset, max_length=1024)
+
+if PACKING:
+    # DeepSeek-V2 remote code ignores position_ids when masking, so pass an explicit 4D block mask.
+    data_collator = PackedDataCollator(tokenizer.pad_token_id, mask_format="4d", mask_dtype=torch.bfloat16)
+elif GROUP_BY_LENGTH:
+    val_dataset = sort_by_length(val_dataset)
+    data_collator = DynamicPaddingCollator(tokenizer.pad_token_id)
+else:
+    data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+
+# Length grouping needs random access to the train set, which a stream does not have
+length_grouping = length_grouping_kwargs() if GROUP_BY_LENGTH and not PACKING and not STREAMING else {}
+
+callbacks = [ThroughputCallback()]
+if EXEC_EVAL_STEPS:
+    # Created before the model is loaded: the callback forks its execution workers
+    eval_prompts = load_eval_prompts("data_val.jsonl", 32, normalize_numbers=NORMALIZE_NUMBERS)
+    callbacks.append(ExecutableRateCallback(tokenizer, eval_prompts, PROMPT_TEMPLATE, eval_steps=EXEC_EVAL_STEPS))
 
 from transformers import BitsAndBytesConfig
 from peft import prepare_model_for_kbit_training
@@ -79,6 +120,34 @@ lora_config = LoraConfig(
 model = get_peft_model(model, lora_config)
 model.print_trainable_parameters()
 
+if PACKING:
+    check_packed_attention(model, data_collator)
+
+if ASYNC_CHECKPOINT:
+    # The callback saves every 50 steps and keeps the best adapter by eval loss itself,
+    # so the Trainer's blocking checkpoint saves are switched off.
+    checkpoint_callback = AsyncAdapterCheckpointCallback(
+        "./checkpoints_deepseek16b_lora",
+        save_steps=50,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        save_total_limit=1
+    )
+    checkpointing = dict(save_strategy="no")
+else:
+    checkpoint_callback = None
+    checkpointing = dict(
+        # 2. Save a checkpoint every N steps
+        save_strategy="steps",
+        save_steps=50,
+
+        # 3. Only keep the best model (lowest eval loss)
+        load_best_model_at_end=True,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        save_total_limit=1,
+    )
+
 training_args = TrainingArguments(
     output_dir="./checkpoints_deepseek16b_lora",
     # per_device_train_batch_size=64,
@@ -89,22 +158,15 @@ training_args = TrainingArguments(
     gradient_accumulation_steps=2,
     num_train_epochs=4,
     learning_rate=5e-5,
-    bf16=True,d
+    bf16=True,
     
     # ────────────────────────────────────────────────────────────────────
     # 1. Evaluate every N steps (match your logging_steps)
     evaluation_strategy="steps",
     eval_steps=50,
 
-    # 2. Save a checkpoint every N steps
-    save_strategy="steps",
-    save_steps=50,
-
-    # 3. Only keep the best model (lowest eval loss)
-    load_best_model_at_end=True,
-    metric_for_best_model="eval_loss",
-    greater_is_better=False,
-    save_total_limit=1,
+    # 2./3. Checkpoint every N steps and keep the best model (see ASYNC_CHECKPOINT)
+    **checkpointing,
     # ────────────────────────────────────────────────────────────────────
 
     logging_steps=50,
@@ -114,14 +176,26 @@ training_args = TrainingArguments(
     report_to="none",
     dataloader_num_workers=4,
     dataloader_prefetch_factor=2,
+    **length_grouping
 )
 
-trainer = Trainer(
+if EVAL_SUBSET_SIZE:
+    trainer_class, eval_subset = SubsetEvalTrainer, dict(eval_subset_size=EVAL_SUBSET_SIZE)
+else:
+    trainer_class, eval_subset = LengthGroupedTrainer, {}
+
+if STREAMING:
+    # A stream has no length: run as many steps as num_train_epochs passes take
+    training_args.max_steps = streaming_max_steps(train_dataset, training_args)
+
+trainer = trainer_class(
     model=model,
     args=training_args,
     train_dataset=train_dataset,
     eval_dataset=val_dataset,
-    data_collator=DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    data_collator=data_collator,
+    callbacks=callbacks + ([checkpoint_callback] if checkpoint_callback else []),
+    **eval_subset
 )
 
 trainer.train()
@@ -1,40 +1,57 @@
 from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments, Trainer, DataCollatorForLanguageModeling
-from datasets import load_dataset
 import matplotlib.pyplot as plt
 from collections import Counter
 import numpy as np
+from common import pack_dataset, PackedDataCollator, check_packed_attention, ThroughputCallback, load_tokenized_dataset
+from common import DynamicPaddingCollator, length_grouping_kwargs, sort_by_length
+from common import add_domain_tokens, init_new_embeddings, SaveTokenizerCallback
 
-train_dataset = load_dataset("json", data_files="data_train.jsonl", split="train")
-val_dataset = load_dataset("json", data_files="data_val.jsonl", split="train")
+# Concatenate examples into full 1024-token rows instead of padding each one to 1024
+# (checked on the loaded model: training stops if packed examples would attend to each other)
+PACKING = False
+# Without packing: batch examples of similar length and pad each batch only to its own longest example
+# (set True to enable)
+GROUP_BY_LENGTH = False
+# Replace spelled-out numbers in the descriptions ("zero point one one four nine") with numeric literals;
+# inference must then run with NORMALIZE_NUMBERS = True in inference/config.py
+NORMALIZE_NUMBERS = False
+# Frequent CadQuery spans added as single tokens, from the file written by extend_tokenizer.py
+# (None keeps the stock vocabulary; e.g. "cadquery_tokens.json")
+DOMAIN_TOKENS_FILE = None
 
 model_id = "openai-community/gpt2-large"
 tokenizer = AutoTokenizer.from_pretrained(model_id)
 tokenizer.pad_token = tokenizer.eos_token
+new_token_pieces = add_domain_tokens(tokenizer, DOMAIN_TOKENS_FILE) if DOMAIN_TOKENS_FILE else {}
 
 model = AutoModelForCausalLM.from_pretrained(model_id)
 model.resize_token_embeddings(len(tokenizer))
+init_new_embeddings(model, new_token_pieces)
 
-def count_length(example):
-    prompt = f"{example['input']}\n{example['output']}"
-    tokens = tokenizer(prompt, truncation=False)
-    example["length"] = len(tokens["input_ids"])
-    return example
+PROMPT_TEMPLATE = "{input}\n{output}"
 
-train_with_length = train_dataset.map(count_length)
-val_with_length = val_dataset.map(count_length)
+train_tokenized = load_tokenized_dataset("data_train.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                         normalize_numbers=NORMALIZE_NUMBERS)
+val_tokenized = load_tokenized_dataset("data_val.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                       normalize_numbers=NORMALIZE_NUMBERS)
 
-train_filtered = train_with_length.filter(lambda x: x["length"] <= 1024)
-val_filtered = val_with_length.filter(lambda x: x["length"] <= 1024)
+print(f"filtered train samples: {len(train_tokenized)}")
+print(f"filtered val samples: {len(val_tokenized)}")
 
-print(f"filtered train samples: {len(train_filtered)}")
-print(f"filtered val samples: {len(val_filtered)}")
+if PACKING:
+    train_tokenized = pack_dataset(train_tokenized, max_length=1024)
+    val_tokenized = pack_dataset(val_tokenized, max_length=1024)
+    data_collator = PackedDataCollator(tokenizer.pad_token_id)
+elif GROUP_BY_LENGTH:
+    val_tokenized = sort_by_length(val_tokenized)
+    data_collator = DynamicPaddingCollator(tokenizer.pad_token_id)
+else:
+    data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
 
-def preprocess(example):
-    prompt = f"{example['input']}\n{example['output']}"
-    return tokenizer(prompt, truncation=True, padding="max_length", max_length=1024)
+length_grouping = length_grouping_kwargs() if GROUP_BY_LENGTH and not PACKING else {}
 
-train_tokenized = train_filtered.map(preprocess, remove_columns=train_filtered.column_names)
-val_tokenized = val_filtered.map(preprocess, remove_columns=val_filtered.column_names)
+if PACKING:
+    check_packed_attention(model, data_collator)
 
 training_args = TrainingArguments(
     output_dir="./checkpoints-gpt2large",
@@ -47,7 +64,8 @@ training_args = TrainingArguments(
     learning_rate=5e-5,
     num_train_epochs=2,
     fp16=True,
-    report_to="none"
+    report_to="none",
+    **length_grouping
 )
 
 trainer = Trainer(
@@ -55,7 +73,9 @@ trainer = Trainer(
     args=training_args,
     train_dataset=train_tokenized,
     eval_dataset=val_tokenized,
-    data_collator=DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    data_collator=data_collator,
+    # The resized vocabulary needs its tokenizer next to every checkpoint
+    callbacks=[ThroughputCallback(), SaveTokenizerCallback(tokenizer)]
 )
 
 trainer.train()
\ No newline at end of file
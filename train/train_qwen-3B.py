@@ -1,6 +1,17 @@
 from transformers import AutoTokenizer, AutoModelForCausalLM, TrainingArguments, Trainer, DataCollatorForLanguageModeling
-from datasets import load_dataset
 import torch
+from common import pack_dataset, PackedDataCollator, check_packed_attention, ThroughputCallback, load_tokenized_dataset
+from common import DynamicPaddingCollator, length_grouping_kwargs, sort_by_length
+
+# Concatenate examples into full 1024-token rows instead of padding each one to 1024
+# (checked on the loaded model: training stops if packed examples would attend to each other)
+PACKING = False
+# Without packing: batch examples of similar length and pad each batch only to its own longest example
+# (set True to enable)
+GROUP_BY_LENGTH = False
+# Replace spelled-out numbers in the descriptions ("zero point one one four nine") with numeric literals;
+# inference must then run with NORMALIZE_NUMBERS = True in inference/config.py
+NORMALIZE_NUMBERS = False
 
 model_path = "Qwen/Qwen2.5-3B-Instruct"
 
@@ -13,33 +24,27 @@ tokenizer = AutoTokenizer.from_pretrained(
 tokenizer.pad_token = tokenizer.eos_token
 tokenizer.padding_side = "left" 
 
-train_raw = load_dataset("json", data_files="data_train_save_file.jsonl", split="train")
-val_raw = load_dataset("json", data_files="data_val_save_file.jsonl", split="train")
-
-
-print(f"Train raw count: {len(train_raw)}")
-print(f"Val raw count:   {len(val_raw)}")
+PROMPT_TEMPLATE = "### Instruction:\n{input}\n\n### Response:\n{output}{eos}"
 
-def count_length(example):
-    prompt = f"### Instruction:\n{example['input']}\n\n### Response:\n{example['output']}{tokenizer.eos_token}"
-    tokens = tokenizer(prompt, truncation=False)
-    example["length"] = len(tokens["input_ids"])
-    return example
+train_dataset = load_tokenized_dataset("data_train_save_file.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                       normalize_numbers=NORMALIZE_NUMBERS)
+val_dataset = load_tokenized_dataset("data_val_save_file.jsonl", tokenizer, PROMPT_TEMPLATE, max_length=1024,
+                                     normalize_numbers=NORMALIZE_NUMBERS)
 
-train_with_length = train_raw.map(count_length)
-val_with_length = val_raw.map(count_length)
+print(f"Train filtered count: {len(train_dataset)}")
+print(f"Val filtered count:   {len(val_dataset)}")
 
-train_filtered = train_with_length.filter(lambda x: x["length"] <= 1024)
-val_filtered = val_with_length.filter(lambda x: x["length"] <= 1024)
-print(f"Train filtered count: {len(train_filtered)}")
-print(f"Val filtered count:   {len(val_filtered)}")
+if PACKING:
+    train_dataset = pack_dataset(train_dataset, max_length=1024)
+    val_dataset = pack_dataset(val_dataset, max_length=1024)
+    data_collator = PackedDataCollator(tokenizer.pad_token_id)
+elif GROUP_BY_LENGTH:
+    val_dataset = sort_by_length(val_dataset)
+    data_collator = DynamicPaddingCollator(tokenizer.pad_token_id)
+else:
+    data_collator = DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
 
-def preprocess(example):
-    prompt = f"### Instruction:\n{example['input']}\n\n### Response:\n{example['output']}{tokenizer.eos_token}"
-    return tokenizer(prompt, truncation=True, padding="max_length", max_length=1024)
-
-train_dataset = train_filtered.map(preprocess, remove_columns=train_filtered.column_names)
-val_dataset = val_filtered.map(preprocess, remove_columns=val_filtered.column_names)
+length_grouping = length_grouping_kwargs() if GROUP_BY_LENGTH and not PACKING else {}
 
 model = AutoModelForCausalLM.from_pretrained(
     model_path,
@@ -48,6 +53,9 @@ model = AutoModelForCausalLM.from_pretrained(
     device_map="auto"
 )
 
+if PACKING:
+    check_packed_attention(model, data_collator)
+
 training_args = TrainingArguments(
     output_dir="./checkpoints_qwen3b",
     per_device_train_batch_size=6,
@@ -62,7 +70,8 @@ training_args = TrainingArguments(
     logging_dir="./logs_qwen3b",
     save_strategy="epoch",
     save_total_limit=2,
-    report_to="none"
+    report_to="none",
+    **length_grouping
 )
 
 trainer = Trainer(
@@ -70,7 +79,8 @@ trainer = Trainer(
     args=training_args,
     train_dataset=train_dataset,
     eval_dataset=val_dataset,
-    data_collator=DataCollatorForLanguageModeling(tokenizer=tokenizer, mlm=False)
+    data_collator=data_collator,
+    callbacks=[ThroughputCallback()]
 )
 
 trainer.train()